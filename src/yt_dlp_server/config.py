@@ -1,8 +1,19 @@
-"""Configuration for yt-dlp-server."""
+"""
+Configuration for yt-dlp-server.
 
-from typing import Literal
+The global settings are read from the environment on first access to
+:data:`SETTINGS` (or :func:`get_settings`), not when this module is imported,
+and can be replaced at runtime with :func:`reload_settings`.
+"""
 
-from pydantic import Field
+import collections
+import hashlib
+import json
+import threading
+from collections.abc import Mapping
+from typing import Any, Literal
+
+from pydantic import Field, PrivateAttr
 from pydantic_settings import BaseSettings
 
 
@@ -10,7 +21,9 @@ class YtDlpSettings(BaseSettings):
     """
     Settings for yt-dlp.
     This class is generated from the options in `yt_dlp.options.create_parser`.
-    It is intended to be used to configure a `yt_dlp.YoutubeDL` instance.
+    It is intended to be used to configure a `yt_dlp.YoutubeDL` instance; see
+    :meth:`to_ytdl_params`. Instances are immutable; use ``model_copy(update=...)``
+    to derive changed settings.
     """
 
     # General Options
@@ -605,11 +618,141 @@ class YtDlpSettings(BaseSettings):
         description="Include HLS manifest in YouTube formats.",
     )
 
+    _content_hash: str | None = PrivateAttr(default=None)
+
+    def content_hash(self) -> str:
+        """Return a stable hash of the effective values, computed once per instance."""
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.model_dump_json().encode()).hexdigest()
+        return self._content_hash
+
+    def with_overrides(self, overrides: Mapping[str, Any]) -> "YtDlpSettings":
+        """
+        Return a copy of these settings with `overrides` applied.
+
+        Only the overridden fields are validated; the others are carried over
+        as they are. Prefer :func:`derive_settings`, which also interns the
+        result.
+
+        :raises pydantic.ValidationError: If a field is unknown or a value is invalid.
+        """
+        settings = self.model_copy()
+        for name, value in overrides.items():
+            type(self).__pydantic_validator__.validate_assignment(settings, name, value)
+        # The copy inherits this instance's cached hash, which no longer applies.
+        settings._content_hash = None
+        return settings
+
+    def to_ytdl_params(self, overrides: Mapping[str, Any] | None = None) -> collections.ChainMap[str, Any]:
+        """
+        Return the `yt_dlp.YoutubeDL` params for these settings.
+
+        See :func:`yt_dlp_server.params.ytdl_params`.
+
+        :param overrides: Params to apply on top, such as per-task ``paths``.
+        """
+        from yt_dlp_server.params import ytdl_params
+
+        return ytdl_params(self, overrides)
+
     class Config:
         """Pydantic configuration."""
 
         env_prefix = "YT_DLP_"
         use_enum_values = True
+        frozen = True
+
+
+SETTINGS: YtDlpSettings
+
+_settings: YtDlpSettings | None = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> YtDlpSettings:
+    """
+    Return the global settings, reading them from the environment on the first call.
+
+    The global settings can be replaced by :func:`reload_settings`, so callers
+    that should pick up a reload call this for each unit of work rather than
+    keeping the result.
+    """
+    global _settings
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = YtDlpSettings()
+            settings = _settings
+    return settings
+
+
+def reload_settings(settings: YtDlpSettings | None = None) -> YtDlpSettings | None:
+    """
+    Replace the global settings with `settings`, by default re-reading them from the environment.
+
+    The replacement is atomic: every later :func:`get_settings` returns the new
+    settings, while work that already holds the old settings keeps them.
+    Settings derived from the old ones by :func:`derive_settings` are dropped.
+
+    :return: The previous global settings, or None if they had not been read yet.
+    """
+    global _settings
+    if settings is None:
+        settings = YtDlpSettings()
+    with _settings_lock:
+        previous = _settings
+        _settings = settings
+    if previous is not None and previous.content_hash() != settings.content_hash():
+        clear_derived_settings()
+    return previous
+
+
+# The number of distinct (base settings, overrides) pairs kept by derive_settings().
+DERIVED_SETTINGS_CACHE_SIZE = 1024
+
+_derived_settings: collections.OrderedDict[tuple[str, str], YtDlpSettings] = collections.OrderedDict()
+_derived_settings_lock = threading.Lock()
+
+
+def derive_settings(overrides: Mapping[str, Any] | None, base: YtDlpSettings | None = None) -> YtDlpSettings:
+    """
+    Return `base` (by default the global settings) with the per-job `overrides` applied.
+
+    Results are interned by the content of `base` and `overrides`: jobs with
+    the same overrides share one settings object, so the overrides are only
+    validated once (see :meth:`YtDlpSettings.with_overrides`), and the yt-dlp
+    params are only built once for all of them.
+
+    :raises pydantic.ValidationError: If a field is unknown or a value is invalid.
+    """
+    if base is None:
+        base = get_settings()
+    if not overrides:
+        return base
+    key = (base.content_hash(), json.dumps(overrides, sort_keys=True, separators=(",", ":"), default=repr))
+    with _derived_settings_lock:
+        settings = _derived_settings.get(key)
+        if settings is not None:
+            _derived_settings.move_to_end(key)
+            return settings
+    settings = base.with_overrides(overrides)
+    with _derived_settings_lock:
+        # Keep the first result if another thread derived the same settings meanwhile.
+        settings = _derived_settings.setdefault(key, settings)
+        _derived_settings.move_to_end(key)
+        while len(_derived_settings) > DERIVED_SETTINGS_CACHE_SIZE:
+            _derived_settings.popitem(last=False)
+    return settings
+
+
+def clear_derived_settings() -> None:
+    """Forget every settings object interned by :func:`derive_settings`."""
+    with _derived_settings_lock:
+        _derived_settings.clear()
 
 
-SETTINGS = YtDlpSettings()
+def __getattr__(name: str) -> Any:
+    if name == "SETTINGS":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,14 @@
 import abc
+from collections.abc import Iterable
 from typing import TypeVar
 
-from yt_dlp_server.db.models import Task, TaskRecord, TaskStatus
+from yt_dlp_server.db.models import Task, TaskProgress, TaskRecord, TaskStatus
 
 ConnectionParameters = TypeVar("ConnectionParameters")
 
+# The claimed_by of tasks that no worker has claimed yet, which any worker can claim.
+UNCLAIMED = 0
+
 
 class BaseDB[ConnectionParameters](abc.ABC):
     @abc.abstractmethod
@@ -19,6 +23,23 @@ class BaseDB[ConnectionParameters](abc.ABC):
     def add_task(self, task: Task, claimed_by: int) -> TaskRecord:
         raise NotImplementedError
 
+    def add_tasks(self, tasks: Iterable[Task], claimed_by: int = UNCLAIMED) -> list[Task]:
+        """
+        Add several tasks at once, skipping any that already exist.
+
+        By default the tasks are added unclaimed, so that any worker can claim them.
+
+        Implementations should override this to insert in a single transaction.
+
+        :return: The tasks that were newly added, in order.
+        """
+        added = []
+        for task in tasks:
+            if self.get_task(task) is None:
+                self.add_task(task, claimed_by)
+                added.append(task)
+        return added
+
     @abc.abstractmethod
     def get_task(self, task: Task) -> TaskRecord | None:
         raise NotImplementedError
@@ -27,6 +48,15 @@ class BaseDB[ConnectionParameters](abc.ABC):
     def update_task(self, task: Task, status: TaskStatus) -> None:
         raise NotImplementedError
 
+    def update_progress(self, progress: Iterable[tuple[Task, TaskProgress]]) -> None:
+        """
+        Record the latest progress of several tasks at once.
+
+        Called periodically with coalesced snapshots. Progress is not recorded
+        by default; implementations that can store it should override this to
+        write the snapshots in a single transaction. Tasks that do not exist are ignored.
+        """
+
     @abc.abstractmethod
     def claim_task(
         self, task: Task, claimed_by: int, timeout_seconds: int = 1800
@@ -1,9 +1,10 @@
 import sqlite3
+from collections.abc import Iterable
 from datetime import UTC, datetime
 
-from yt_dlp_server.db.base import BaseDB
+from yt_dlp_server.db.base import UNCLAIMED, BaseDB
 from yt_dlp_server.db.errors import TaskNotFoundError
-from yt_dlp_server.db.models import Task, TaskRecord, TaskStatus
+from yt_dlp_server.db.models import Task, TaskProgress, TaskRecord, TaskStatus
 
 
 class SQLiteDB(BaseDB[str]):
@@ -29,10 +30,15 @@ class SQLiteDB(BaseDB[str]):
                 claimed_by INTEGER NOT NULL,
                 claimed_at TEXT NOT NULL,
                 updated_at TEXT NOT NULL DEFAULT (datetime('now', 'utc')),
+                progress TEXT,
                 UNIQUE(job_id, url)
             )
         """
         )
+        # Tables created before the progress column existed
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(task)")}
+        if "progress" not in columns:
+            self.connection.execute("ALTER TABLE task ADD COLUMN progress TEXT")
         self.connection.execute(
             """
             CREATE TRIGGER IF NOT EXISTS set_updated_at
@@ -71,11 +77,36 @@ class SQLiteDB(BaseDB[str]):
             raise TaskNotFoundError(task)
         return task_record
 
+    def add_tasks(self, tasks: Iterable[Task], claimed_by: int = UNCLAIMED) -> list[Task]:
+        # Use second-granularity to match SQLite's datetime('now','utc') trigger/defaults
+        now_utc = datetime.now(UTC).replace(microsecond=0).isoformat()
+        if self.connection is None:
+            raise RuntimeError("Database is not connected")
+        added = []
+        with self.connection:
+            for task in tasks:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO task (job_id, url, status, created_at, claimed_by, claimed_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        task.job_id,
+                        task.url,
+                        TaskStatus.PENDING.value,
+                        now_utc,
+                        claimed_by,
+                        now_utc,
+                        now_utc,
+                    ),
+                )
+                if cursor.rowcount > 0:
+                    added.append(task)
+        return added
+
     def get_task(self, task: Task) -> TaskRecord | None:
         if self.connection is None:
             raise RuntimeError("Database is not connected")
         cursor = self.connection.execute(
-            "SELECT job_id, url, status, created_at, claimed_by, claimed_at, updated_at "
+            "SELECT job_id, url, status, created_at, claimed_by, claimed_at, updated_at, progress "
             "FROM task WHERE job_id = ? AND url = ?",
             (task.job_id, task.url),
         )
@@ -97,13 +128,22 @@ class SQLiteDB(BaseDB[str]):
         )
         self.connection.commit()
 
+    def update_progress(self, progress: Iterable[tuple[Task, TaskProgress]]) -> None:
+        if self.connection is None:
+            raise RuntimeError("Database is not connected")
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE task SET progress = ? WHERE job_id = ? AND url = ?",
+                ((task_progress.model_dump_json(), task.job_id, task.url) for task, task_progress in progress),
+            )
+
     def claim_task(
         self, task: Task, claimed_by: int, timeout_seconds: int = 1800
     ) -> TaskRecord | None:
         # Use second-granularity to match SQLite's datetime('now','utc') trigger/defaults
         now_utc = datetime.now(UTC).replace(microsecond=0).isoformat()
 
-        # Perform atomic update: only update if claimed_by matches or timeout has expired
+        # Perform atomic update: only update if claimed_by matches, the task is unclaimed or timeout has expired
         if self.connection is None:
             raise RuntimeError("Database is not connected")
         cursor = self.connection.execute(
@@ -113,6 +153,7 @@ class SQLiteDB(BaseDB[str]):
             WHERE job_id = ? AND url = ?
               AND (
                 claimed_by = ?
+                OR claimed_by = ?
                 OR (
                     claimed_at IS NOT NULL
                     AND strftime('%s', ?) - strftime('%s', claimed_at) > ?
@@ -126,6 +167,7 @@ class SQLiteDB(BaseDB[str]):
                 task.job_id,
                 task.url,
                 claimed_by,
+                UNCLAIMED,
                 now_utc,
                 timeout_seconds,
             ),
@@ -17,6 +17,16 @@ class Task(BaseModel):
     url: str
 
 
+class TaskProgress(BaseModel):
+    """The latest download progress of a task, as reported by yt-dlp's progress hooks."""
+
+    status: str
+    downloaded_bytes: int | None = None
+    total_bytes: int | None = None
+    speed: float | None = None
+    eta: float | None = None
+
+
 class TaskRecord(BaseModel):
     task: Task
     status: TaskStatus
@@ -24,6 +34,7 @@ class TaskRecord(BaseModel):
     claimed_by: int
     claimed_at: datetime
     updated_at: datetime
+    progress: TaskProgress | None = None
 
     @field_validator("created_at", "updated_at", "claimed_at", mode="before")
     @classmethod
@@ -42,6 +53,13 @@ class TaskRecord(BaseModel):
             return TaskStatus(v)
         return v
 
+    @field_validator("progress", mode="before")
+    @classmethod
+    def parse_progress(cls, v: Any) -> Any:
+        if isinstance(v, str):
+            return TaskProgress.model_validate_json(v)
+        return v
+
     @model_validator(mode="before")
     @classmethod
     def build_task(cls, data: Any) -> Any:
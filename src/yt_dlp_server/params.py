@@ -0,0 +1,334 @@
+"""Translation from :class:`YtDlpSettings` to `yt_dlp.YoutubeDL` params."""
+
+from __future__ import annotations
+
+import collections
+import threading
+import types
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+# Settings whose names and values are identical to the YoutubeDL params.
+PASSTHROUGH = (
+    "ignoreerrors",
+    "default_search",
+    "live_from_start",
+    "mark_watched",
+    "proxy",
+    "socket_timeout",
+    "enable_file_urls",
+    "geo_verification_proxy",
+    "geo_bypass",
+    "geo_bypass_country",
+    "geo_bypass_ip_block",
+    "min_filesize",
+    "max_filesize",
+    "skip_playlist_after_errors",
+    "ratelimit",
+    "skip_unavailable_fragments",
+    "buffersize",
+    "noresizebuffer",
+    "http_chunk_size",
+    "paths",
+    "outtmpl_na_placeholder",
+    "restrictfilenames",
+    "windowsfilenames",
+    "continuedl",
+    "nopart",
+    "updatetime",
+    "writedescription",
+    "writeinfojson",
+    "allow_playlist_files",
+    "cookiefile",
+    "cachedir",
+    "writethumbnail",
+    "write_all_thumbnails",
+    "quiet",
+    "no_warnings",
+    "simulate",
+    "verbose",
+    "dump_single_json",
+    "forceprint",
+    "dump_intermediate_pages",
+    "debug_printtraffic",
+    "encoding",
+    "prefer_insecure",
+    "bidi_workaround",
+    "sleep_interval",
+    "max_sleep_interval",
+    "format",
+    "format_sort",
+    "format_sort_force",
+    "prefer_free_formats",
+    "merge_output_format",
+    "writesubtitles",
+    "writeautomaticsub",
+    "allsubtitles",
+    "subtitlesformat",
+    "subtitleslangs",
+    "username",
+    "password",
+    "twofactor",
+    "usenetrc",
+    "netrc_location",
+    "videopassword",
+    "ap_mso",
+    "ap_username",
+    "ap_password",
+    "client_certificate",
+    "client_certificate_key",
+    "client_certificate_password",
+    "postprocessor_args",
+    "keepvideo",
+    "fixup",
+    "ffmpeg_location",
+)
+
+# Settings that map one-to-one onto a differently named YoutubeDL param.
+RENAMED = {
+    "flat_playlist": "extract_flat",
+    "compat_options": "compat_opts",
+    "playlist_reverse": "playlistreverse",
+    "playlist_random": "playlistrandom",
+    "keepfragments": "keep_fragments",
+    "concurrentfragments": "concurrent_fragment_downloads",
+    "write_intermediate_pages": "write_pages",
+    "no_check_certificate": "nocheckcertificate",
+    "sleep_requests": "sleep_interval_requests",
+    "video_multistreams": "allow_multiple_video_streams",
+    "audio_multistreams": "allow_multiple_audio_streams",
+}
+
+# Settings that only make sense for the command line.
+IGNORED = ("batchfile", "load_info_json", "call_home", "writeannotations")
+
+
+def _retries(value: int | str) -> float:
+    return float("inf") if value == "infinite" else float(value)
+
+
+def _optional_range(value: tuple[float | None, float | None]) -> tuple[float | None, float | None] | None:
+    return None if value == (None, None) else value
+
+
+def _postprocessors(settings: YtDlpSettings) -> list[dict[str, Any]]:
+    """Mirror of `yt_dlp.get_postprocessors`, driven by settings rather than parsed options."""
+    from yt_dlp.postprocessor.metadataparser import MetadataFromFieldPP, MetadataParserPP
+
+    postprocessors: list[dict[str, Any]] = []
+    actions: list[tuple[Any, ...]] = [MetadataFromFieldPP.to_action(f) for f in settings.parse_metadata]
+    for replacement in settings.replace_in_metadata:
+        fields, regex, replace = replacement.split(maxsplit=2)
+        actions.extend((MetadataParserPP.Actions.REPLACE, field, regex, replace) for field in fields.split(","))
+    if actions:
+        postprocessors.append({"key": "MetadataParser", "actions": actions, "when": "pre_process"})
+    sponsorblock_query = (
+        set()
+        if settings.no_sponsorblock
+        else {
+            *settings.sponsorblock_mark,
+            *settings.sponsorblock_remove,
+        }
+    )
+    if sponsorblock_query:
+        postprocessors.append(
+            {
+                "key": "SponsorBlock",
+                "categories": sponsorblock_query,
+                "api": settings.sponsorblock_api,
+                "when": "after_filter",
+            }
+        )
+    if settings.convertsubtitles:
+        postprocessors.append(
+            {
+                "key": "FFmpegSubtitlesConvertor",
+                "format": settings.convertsubtitles,
+                "when": "before_dl",
+            }
+        )
+    if settings.extractaudio:
+        postprocessors.append(
+            {
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": settings.audioformat,
+                "preferredquality": str(settings.audioquality),
+                "nopostoverwrites": settings.nopostoverwrites,
+            }
+        )
+    if settings.remuxvideo:
+        postprocessors.append({"key": "FFmpegVideoRemuxer", "preferedformat": settings.remuxvideo})
+    if settings.recodevideo:
+        postprocessors.append({"key": "FFmpegVideoConvertor", "preferedformat": settings.recodevideo})
+    if settings.embedsubtitles:
+        postprocessors.append({"key": "FFmpegEmbedSubtitle", "already_have_subtitle": settings.writesubtitles})
+    if sponsorblock_query:
+        postprocessors.append(
+            {
+                "key": "ModifyChapters",
+                "remove_chapters_patterns": [],
+                "remove_sponsor_segments": set() if settings.no_sponsorblock else set(settings.sponsorblock_remove),
+                "remove_ranges": [],
+                "sponsorblock_chapter_title": settings.sponsorblock_chapter_title,
+                "force_keyframes": False,
+            }
+        )
+    if settings.addmetadata or settings.addchapters or settings.embedinfojson:
+        postprocessors.append(
+            {
+                "key": "FFmpegMetadata",
+                "add_chapters": settings.addchapters,
+                "add_metadata": settings.addmetadata,
+                "add_infojson": settings.embedinfojson,
+            }
+        )
+    if settings.embedthumbnail:
+        postprocessors.append({"key": "EmbedThumbnail", "already_have_thumbnail": settings.writethumbnail})
+    if settings.xattrs:
+        postprocessors.append({"key": "XAttrMetadata"})
+    if settings.concat_playlist != "never":
+        postprocessors.append(
+            {
+                "key": "FFmpegConcat",
+                "only_multi_video": settings.concat_playlist != "always",
+                "when": "playlist",
+            }
+        )
+    postprocessors.extend({"key": "Exec", "exec_cmd": [command], "when": "after_move"} for command in settings.exec)
+    return postprocessors
+
+
+def build_ytdl_params(settings: YtDlpSettings) -> dict[str, Any]:
+    """
+    Build the params for a `yt_dlp.YoutubeDL` instance from `settings`.
+
+    :param settings: The settings to translate.
+    :return: A new dict of YoutubeDL params.
+    """
+    # yt-dlp is only imported once params are needed, to keep this module cheap to import.
+    from yt_dlp.utils import DateRange, download_range_func, match_filter_func
+
+    params: dict[str, Any] = {name: getattr(settings, name) for name in PASSTHROUGH}
+    params.update({param: getattr(settings, name) for name, param in RENAMED.items()})
+
+    params["allowed_extractors"] = settings.use_extractors or ["default"]
+    params["wait_for_video"] = _optional_range(settings.wait_for_video)
+    if settings.no_colors:
+        params["color"] = "no_color"
+    elif settings.force_colors:
+        params["color"] = "always"
+    if settings.source_address is None and settings.force_ip is not None:
+        params["source_address"] = "0.0.0.0" if settings.force_ip == "4" else "::"
+    else:
+        params["source_address"] = settings.source_address
+
+    # "0" is the settings' way of spelling "every item".
+    params["playlist_items"] = None if settings.playlist_items in ("", "0") else settings.playlist_items
+    if settings.date is not None:
+        params["daterange"] = DateRange(settings.date, settings.date)
+    elif settings.dateafter is not None or settings.datebefore is not None:
+        params["daterange"] = DateRange(settings.dateafter, settings.datebefore)
+    if settings.match_filters:
+        params["match_filter"] = match_filter_func(
+            settings.match_filters, settings.match_filters if settings.break_on_match else None
+        )
+    subpart = _optional_range(settings.subpart)
+    if subpart is not None:
+        params["download_ranges"] = download_range_func(None, [subpart])
+
+    params["retries"] = _retries(settings.retries)
+    params["fragment_retries"] = _retries(settings.fragment_retries)
+    params["extractor_retries"] = _retries(settings.extractor_retries)
+    if settings.external_downloader:
+        params["external_downloader"] = {"default": settings.external_downloader}
+    if settings.external_downloader_args:
+        params["external_downloader_args"] = {"default": settings.external_downloader_args.split()}
+
+    if settings.outtmpl:
+        # A string rather than {"default": ...}: YoutubeDL fills in the other
+        # templates by updating a dict template in place, which would modify
+        # params shared through ytdl_params().
+        params["outtmpl"] = settings.outtmpl
+    if settings.trim_file_name:
+        params["trim_file_name"] = settings.trim_file_name
+    params["overwrites"] = False if settings.nooverwrites else None
+    if settings.cookiesfrombrowser:
+        params["cookiesfrombrowser"] = (settings.cookiesfrombrowser, None, None, None)
+
+    params["forcejson"] = settings.dumpjson or settings.print_json
+    params["print_to_file"] = (
+        {"video": [(template, filename) for filename, template in settings.print_to_file.items()]}
+        if settings.print_to_file
+        else {}
+    )
+    params["noprogress"] = settings.quiet
+
+    http_headers = dict(settings.http_headers)
+    if settings.user_agent:
+        http_headers["User-Agent"] = settings.user_agent
+    if settings.referer:
+        http_headers["Referer"] = settings.referer
+    params["http_headers"] = http_headers
+
+    extractor_args: dict[str, dict[str, list[str]]] = {
+        extractor: {key: value.split(",") for key, value in args.items()}
+        for extractor, args in settings.extractor_args.items()
+    }
+    skip = [
+        name
+        for name, include in (
+            ("dash", settings.youtube_include_dash_manifest),
+            ("hls", settings.youtube_include_hls_manifest),
+        )
+        if not include
+    ]
+    if skip:
+        extractor_args.setdefault("youtube", {}).setdefault("skip", []).extend(skip)
+    params["extractor_args"] = extractor_args
+
+    params["postprocessors"] = _postprocessors(settings)
+    return params
+
+
+# The number of distinct settings whose params are kept by ytdl_params().
+PARAMS_CACHE_SIZE = 64
+
+_params_cache: collections.OrderedDict[str, Mapping[str, Any]] = collections.OrderedDict()
+_params_cache_lock = threading.Lock()
+
+
+def ytdl_params(settings: YtDlpSettings, overrides: Mapping[str, Any] | None = None) -> collections.ChainMap[str, Any]:
+    """
+    Return the params for a `yt_dlp.YoutubeDL` instance configured from
+    `settings`, with `overrides` on top.
+
+    The params are built by :func:`build_ytdl_params` once per distinct
+    :meth:`YtDlpSettings.content_hash` and kept as a read-only mapping. Each
+    call returns a copy-on-write overlay of them: a `ChainMap` whose first map
+    holds `overrides`, and receives every later write, such as those YoutubeDL
+    makes while initializing. Nested values (``http_headers``,
+    ``postprocessor_args`` and so on) are shared rather than copied, so they
+    must be replaced rather than modified.
+    """
+    key = settings.content_hash()
+    with _params_cache_lock:
+        base = _params_cache.get(key)
+        if base is not None:
+            _params_cache.move_to_end(key)
+    if base is None:
+        base = types.MappingProxyType(build_ytdl_params(settings))
+        with _params_cache_lock:
+            _params_cache[key] = base
+            while len(_params_cache) > PARAMS_CACHE_SIZE:
+                _params_cache.popitem(last=False)
+    # ChainMap only ever writes to its first map, so the read-only base is safe.
+    return collections.ChainMap(dict(overrides or {}), base)  # type: ignore[arg-type]
+
+
+def clear_params_cache() -> None:
+    """Forget the params memoized by :func:`ytdl_params`. Overlays already handed out keep working."""
+    with _params_cache_lock:
+        _params_cache.clear()
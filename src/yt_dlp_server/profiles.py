@@ -0,0 +1,160 @@
+"""
+Settings profiles: tuned settings for the downloads of particular sites.
+
+The best ``concurrentfragments``, ``http_chunk_size``, ``buffersize`` or
+``sleep_requests`` differ between sites that serve HLS or DASH fragments and
+those that serve one progressive file. A :class:`ProfileRule` names the sites
+it applies to, by URL host or by yt-dlp extractor key, and the settings to
+overlay for them. A :class:`ProfileMatcher` compiles a list of rules into a
+lookup that a worker pool consults for every task.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import pathlib
+import urllib.parse
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+# How many URLs' extractor keys are remembered (see extractor_key).
+EXTRACTOR_CACHE_SIZE = 4096
+
+
+class ProfileRule(BaseModel):
+    """Settings to overlay for the URLs of some hosts or extractors."""
+
+    hosts: list[str] = Field(
+        default_factory=list,
+        description="Host names the rule applies to, including their subdomains, such as 'googlevideo.com'.",
+    )
+    extractors: list[str] = Field(
+        default_factory=list,
+        description="yt-dlp extractor keys the rule applies to, such as 'Youtube'. Matched case-insensitively.",
+    )
+    settings: dict[str, Any] = Field(
+        default_factory=dict,
+        description="The YtDlpSettings fields to overlay, by name.",
+    )
+
+
+def _labels(host: str) -> list[str]:
+    """Return the labels of `host`, from the top-level domain down."""
+    return host.lower().strip(".").split(".")[::-1]
+
+
+@functools.cache
+def _extractor_classes() -> tuple[Any, ...]:
+    """Return yt-dlp's extractors, in the order YoutubeDL tries them, importing them on first use."""
+    from yt_dlp.extractor import gen_extractor_classes
+
+    return tuple(gen_extractor_classes())
+
+
+@functools.lru_cache(maxsize=EXTRACTOR_CACHE_SIZE)
+def extractor_key(url: str) -> str:
+    """
+    Return the key of the first yt-dlp extractor that claims `url`, as YoutubeDL would pick it.
+
+    Finding it means trying every extractor in turn, so the keys of recent URLs are cached.
+    """
+    for ie in _extractor_classes():
+        if ie.suitable(url):
+            key: str = ie.ie_key()
+            return key
+    return "Generic"
+
+
+class _TrieNode:
+    __slots__ = ("children", "rules")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.rules: list[int] = []
+
+
+class ProfileMatcher:
+    """
+    Finds the settings overlay for a URL from a list of :class:`ProfileRule`.
+
+    Host names are compiled into a trie keyed by label from the top-level
+    domain down, so a lookup costs one dictionary access per label of the
+    URL's host however many rules there are. Extractor keys are compiled into
+    a dictionary. A URL's extractor is only determined (see
+    :func:`extractor_key`) if some rule matches by extractor; yt-dlp's
+    extractors are then imported when the matcher is created, rather than
+    when the first task is claimed.
+
+    When several rules match, their settings are merged: host rules from the
+    least to the most specific host, then extractor rules, with later rules
+    winning. Rules that match equally specifically apply in list order.
+    """
+
+    def __init__(self, rules: Sequence[ProfileRule], base: YtDlpSettings | None = None) -> None:
+        """
+        :param rules: The rules, in order of increasing precedence among equally specific matches.
+        :param base: Settings to validate the rules' settings against. Defaults to the global settings.
+        :raises pydantic.ValidationError: If a rule names an unknown setting or an invalid value.
+        """
+        from yt_dlp_server.config import get_settings
+
+        base = base if base is not None else get_settings()
+        self._rules = list(rules)
+        self._root = _TrieNode()
+        self._extractors: dict[str, list[int]] = {}
+        for index, rule in enumerate(self._rules):
+            base.with_overrides(rule.settings)
+            for host in rule.hosts:
+                node = self._root
+                for label in _labels(host):
+                    node = node.children.setdefault(label, _TrieNode())
+                node.rules.append(index)
+            for key in rule.extractors:
+                self._extractors.setdefault(key.lower(), []).append(index)
+        if self._extractors:
+            _extractor_classes()
+
+    @classmethod
+    def from_file(cls, path: os.PathLike[str] | str, base: YtDlpSettings | None = None) -> ProfileMatcher:
+        """Load the rules from a JSON file holding a list of :class:`ProfileRule` objects."""
+        rules = json.loads(pathlib.Path(path).read_text())
+        return cls([ProfileRule.model_validate(rule) for rule in rules], base)
+
+    @property
+    def rules(self) -> list[ProfileRule]:
+        return list(self._rules)
+
+    def match(self, url: str, extractor: str | None = None) -> list[ProfileRule]:
+        """
+        Return the rules that apply to `url`, in the order their settings are applied.
+
+        :param url: The URL to be downloaded.
+        :param extractor: The key of the extractor that handles `url`, if known.
+            Otherwise it is determined only if some rule matches by extractor.
+        """
+        indices: list[int] = []
+        node = self._root
+        for label in _labels(urllib.parse.urlsplit(url).hostname or ""):
+            child = node.children.get(label)
+            if child is None:
+                break
+            node = child
+            indices.extend(node.rules)
+        if self._extractors:
+            key = extractor if extractor is not None else extractor_key(url)
+            indices.extend(self._extractors.get(key.lower(), ()))
+        return [self._rules[index] for index in indices]
+
+    def overrides_for(self, url: str, extractor: str | None = None) -> dict[str, Any]:
+        """Return the merged settings of every rule that applies to `url`. See :meth:`match`."""
+        overrides: dict[str, Any] = {}
+        for rule in self.match(url, extractor):
+            overrides.update(rule.settings)
+        return overrides
@@ -0,0 +1,190 @@
+"""
+Hot reload of the global :class:`YtDlpSettings`.
+
+A :class:`SettingsReloader` re-reads the settings when a dotenv file changes or
+when the process receives a signal, and swaps them in with
+:func:`reload_settings`. Tasks that start afterwards use the new settings,
+while downloads in flight finish with the settings they started with.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pathlib
+import signal
+import threading
+import time
+from collections.abc import Callable
+from types import FrameType
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+logger = logging.getLogger(__name__)
+
+SettingsLoader = Callable[[], "YtDlpSettings"]
+ReloadCallback = Callable[["YtDlpSettings | None", "YtDlpSettings"], None]
+
+
+def invalidate_derived_state(previous: YtDlpSettings | None, settings: YtDlpSettings) -> None:
+    """
+    Drop the state that was derived from `previous`, now that `settings` replaced it.
+
+    Memoized YoutubeDL params are dropped, and pooled YoutubeDL instances are
+    retired once their current lease ends. Cached info dicts are only dropped
+    if a setting that affects extraction changed.
+    """
+    from yt_dlp_server.params import clear_params_cache
+    from yt_dlp_server.workers.download import INFO_CACHE, YTDL_POOL
+    from yt_dlp_server.workers.info_cache import EXTRACTION_FIELDS
+
+    clear_params_cache()
+    YTDL_POOL.invalidate()
+    fields = set(EXTRACTION_FIELDS)
+    if previous is None or previous.model_dump(include=fields) != settings.model_dump(include=fields):
+        INFO_CACHE.clear()
+
+
+def _file_state(path: pathlib.Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SettingsReloader:
+    """
+    Reloads the global settings when a file changes or a signal arrives.
+
+    The reloader runs a watcher thread. Every `interval` seconds it checks
+    whether `path` was modified, and a signal handler installed with
+    :meth:`install_signal_handler` wakes it straight away. Reloading happens on
+    the watcher thread rather than in the signal handler, so it never runs
+    while the interrupted thread holds a lock it needs.
+
+    If the new settings fail to load (for example because the file is
+    invalid), the error is logged and the current settings stay in effect.
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike[str] | str | None = None,
+        interval: float = 1.0,
+        loader: SettingsLoader | None = None,
+        on_reload: ReloadCallback = invalidate_derived_state,
+    ) -> None:
+        """
+        :param path: A dotenv file of ``YT_DLP_*`` settings to watch. Settings
+            in the environment take precedence over it.
+        :param interval: How often, in seconds, `path` is checked for changes.
+        :param loader: Builds the new settings. Defaults to reading the
+            environment and `path`.
+        :param on_reload: Called with the previous and the new settings after every reload.
+        """
+        self._path = pathlib.Path(path) if path is not None else None
+        self._interval = interval
+        self._loader = loader if loader is not None else self._load
+        self._on_reload = on_reload
+        self._file_state = _file_state(self._path) if self._path is not None else None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._previous_handler: Any = None
+        self._signum: int | None = None
+
+    def _load(self) -> YtDlpSettings:
+        from yt_dlp_server.config import YtDlpSettings
+
+        if self._path is None:
+            return YtDlpSettings()
+        return YtDlpSettings(_env_file=self._path)  # type: ignore[call-arg]
+
+    def reload(self) -> YtDlpSettings | None:
+        """
+        Load the settings and make them the global settings now.
+
+        :return: The new settings, or None if they could not be loaded.
+        """
+        from yt_dlp_server.config import reload_settings
+
+        try:
+            settings = self._loader()
+        except Exception:
+            logger.exception("Failed to reload settings; keeping the current settings")
+            return None
+        previous = reload_settings(settings)
+        if previous is not None and previous.content_hash() == settings.content_hash():
+            logger.info("Settings reloaded without changes")
+            return settings
+        logger.info("Settings reloaded")
+        try:
+            self._on_reload(previous, settings)
+        except Exception:
+            logger.exception("Failed to invalidate state derived from the previous settings")
+        return settings
+
+    def check(self) -> bool:
+        """
+        Reload the settings if the watched file changed since it was last checked.
+
+        :return: Whether the settings were reloaded.
+        """
+        if self._path is None:
+            return False
+        state = _file_state(self._path)
+        if state == self._file_state:
+            return False
+        self._file_state = state
+        return self.reload() is not None
+
+    def request_reload(self) -> None:
+        """Ask the watcher thread to reload the settings. Safe to call from a signal handler."""
+        self._wakeup.set()
+
+    def install_signal_handler(self, signum: int = signal.SIGHUP) -> None:
+        """
+        Reload the settings whenever the process receives `signum`.
+
+        Must be called from the main thread.
+        """
+        self._previous_handler = signal.signal(signum, self._handle_signal)
+        self._signum = signum
+
+    def _handle_signal(self, signum: int, frame: FrameType | None) -> None:
+        self.request_reload()
+
+    def start(self) -> None:
+        """Start the watcher thread."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._watch, name="yt-dlp-server-settings-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the watcher thread and restore the signal handler it replaced, if any."""
+        if self._signum is not None:
+            signal.signal(self._signum, self._previous_handler)
+            self._signum = None
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self) -> None:
+        next_check = time.monotonic()
+        while not self._stopping.is_set():
+            requested = self._wakeup.wait(max(0.0, next_check - time.monotonic()))
+            if self._stopping.is_set():
+                break
+            if requested:
+                self._wakeup.clear()
+                self._file_state = _file_state(self._path) if self._path is not None else None
+                self.reload()
+            else:
+                self.check()
+                next_check = time.monotonic() + self._interval
@@ -0,0 +1,97 @@
+import abc
+import pathlib
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from typing import TypeVar
+
+from yt_dlp_server.storage.base import DEFAULT_CHUNK_SIZE
+from yt_dlp_server.storage.digest import WriteResult
+
+PathType = TypeVar("PathType")
+
+
+class AsyncBaseStorageEngine[PathType](abc.ABC):
+    """
+    The asyncio counterpart of :class:`BaseStorageEngine`, for serving and
+    receiving files from an event loop without blocking it on disk I/O.
+    """
+
+    @property
+    @abc.abstractmethod
+    def repository(self) -> PathType:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def write_bytes_to_path(self, path: pathlib.Path, data: bytes) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def write_stream_with_digest(
+        self,
+        path: pathlib.Path,
+        chunks: Iterable[bytes] | AsyncIterable[bytes],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        algorithm: str | None = None,
+    ) -> WriteResult:
+        """
+        Write `chunks` to `path`, computing and recording a digest of them as
+        they are written.
+
+        The data becomes visible at `path` only once all of `chunks` has been
+        written; if iterating over them raises, nothing is written.
+
+        :param chunk_size: Small chunks are gathered into writes of about this size.
+        :param algorithm: The digest algorithm (see :func:`new_hasher`). Defaults to the engine's.
+        """
+        raise NotImplementedError
+
+    async def write_stream_to_path(
+        self,
+        path: pathlib.Path,
+        chunks: Iterable[bytes] | AsyncIterable[bytes],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> int:
+        """
+        Write `chunks` to `path` without holding all of the data in memory.
+
+        :return: The number of bytes written.
+        """
+        return (await self.write_stream_with_digest(path, chunks, chunk_size)).size
+
+    async def write_text_to_path(
+        self,
+        path: pathlib.Path,
+        data: str,
+        encoding: str = "utf-8",
+        errors: str = "strict",
+    ) -> int:
+        return await self.write_bytes_to_path(path, data.encode(encoding, errors))
+
+    @abc.abstractmethod
+    async def read_bytes_from_path(self, path: pathlib.Path) -> bytes:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_range(self, path: pathlib.Path, offset: int, length: int) -> memoryview:
+        """Read at most `length` bytes of `path`, starting at `offset`."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_path(self, path: pathlib.Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Iterate over the contents of `path`, `chunk_size` bytes at a time."""
+        raise NotImplementedError
+
+    async def read_text_from_path(
+        self,
+        path: pathlib.Path,
+        encoding: str = "utf-8",
+        errors: str = "strict",
+    ) -> str:
+        return (await self.read_bytes_from_path(path)).decode(encoding, errors)
+
+    @abc.abstractmethod
+    async def exists(self, path: pathlib.Path) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete_path(self, path: pathlib.Path) -> None:
+        raise NotImplementedError
@@ -1,9 +1,25 @@
 import abc
+import contextlib
 import pathlib
-from typing import TypeVar
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO, TypeVar
+
+from yt_dlp_server.storage.digest import DEFAULT_DIGEST_ALGORITHM, WriteResult, new_hasher
 
 PathType = TypeVar("PathType")
 
+# The size of the chunks streamed by write_stream_to_path() from a file object.
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_chunks(chunks: Iterable[bytes] | BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Iterate over `chunks`, reading a binary file object `chunk_size` bytes at a time."""
+    if hasattr(chunks, "read"):
+        while chunk := chunks.read(chunk_size):
+            yield chunk
+    else:
+        yield from chunks
+
 
 class BaseStorageEngine[PathType](abc.ABC):
     @property
@@ -11,6 +27,11 @@ class BaseStorageEngine[PathType](abc.ABC):
     def repository(self) -> PathType:
         raise NotImplementedError
 
+    @property
+    def digest_algorithm(self) -> str:
+        """The digest :meth:`write_stream_with_digest` computes by default."""
+        return DEFAULT_DIGEST_ALGORITHM
+
     @abc.abstractmethod
     def canonicalize_path(self, path: pathlib.Path) -> PathType:
         raise NotImplementedError
@@ -19,6 +40,80 @@ class BaseStorageEngine[PathType](abc.ABC):
     def write_bytes_to_path(self, path: pathlib.Path, data: bytes) -> int:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def open_writer(self, path: pathlib.Path) -> contextlib.AbstractContextManager[BinaryIO]:
+        """
+        Open `path` for writing, as a context manager yielding a binary file object.
+
+        The data becomes visible at `path` only once the block exits normally,
+        replacing any existing file; if the block raises, nothing is written.
+        """
+        raise NotImplementedError
+
+    def write_stream_to_path(
+        self,
+        path: pathlib.Path,
+        chunks: Iterable[bytes] | BinaryIO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> int:
+        """
+        Write `chunks` to `path` without holding all of the data in memory.
+
+        :param chunks: The data, as an iterable of byte strings or a binary file object.
+        :param chunk_size: How many bytes are read from a file object at a time.
+        :return: The number of bytes written.
+        """
+        return self.write_stream_with_digest(path, chunks, chunk_size).size
+
+    def write_stream_with_digest(
+        self,
+        path: pathlib.Path,
+        chunks: Iterable[bytes] | BinaryIO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        algorithm: str | None = None,
+    ) -> WriteResult:
+        """
+        Like :meth:`write_stream_to_path`, but also compute a digest of the
+        data as it is written and record it with :meth:`record_digest`, so
+        checking the file later needs no extra pass over it.
+
+        :param algorithm: The digest algorithm (see :func:`new_hasher`). Defaults to :attr:`digest_algorithm`.
+        """
+        algorithm = algorithm if algorithm is not None else self.digest_algorithm
+        hasher = new_hasher(algorithm)
+        written = 0
+        with self.open_writer(path) as writer:
+            for chunk in iter_chunks(chunks, chunk_size):
+                hasher.update(chunk)
+                written += writer.write(chunk)
+        result = WriteResult(written, algorithm, hasher.hexdigest())
+        self.record_digest(path, result)
+        return result
+
+    def record_digest(self, path: pathlib.Path, result: WriteResult) -> None:
+        """Remember the digest of what was just written to `path`. Engines that cannot store it ignore it."""
+
+    def get_digest(self, path: pathlib.Path) -> WriteResult | None:
+        """Return the recorded digest of `path`, or None if there is none or it is out of date."""
+        return None
+
+    def verify_path(self, path: pathlib.Path) -> bool:
+        """
+        Read `path` back and check it against its recorded digest.
+
+        :raises LookupError: If no digest is recorded for `path`.
+        """
+        expected = self.get_digest(path)
+        if expected is None:
+            raise LookupError(f"No digest is recorded for {path}")
+        hasher = new_hasher(expected.algorithm)
+        size = 0
+        with self.open_reader(path) as reader:
+            for chunk in iter_chunks(reader):
+                hasher.update(chunk)
+                size += len(chunk)
+        return size == expected.size and hasher.hexdigest() == expected.digest
+
     def write_text_to_path(
         self,
         path: pathlib.Path,
@@ -32,6 +127,24 @@ class BaseStorageEngine[PathType](abc.ABC):
     def read_bytes_from_path(self, path: pathlib.Path) -> bytes:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def open_reader(self, path: pathlib.Path) -> contextlib.AbstractContextManager[BinaryIO]:
+        """Open `path` for reading, as a context manager yielding a seekable binary file object."""
+        raise NotImplementedError
+
+    def read_range(self, path: pathlib.Path, offset: int, length: int) -> memoryview:
+        """
+        Read at most `length` bytes of `path`, starting at `offset`.
+
+        Only the requested bytes are read. The result is shorter than `length`
+        if the file ends first, and empty if `offset` is past its end.
+        """
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must not be negative")
+        with self.open_reader(path) as reader:
+            reader.seek(offset)
+            return memoryview(reader.read(length))
+
     def read_text_from_path(
         self,
         path: pathlib.Path,
@@ -40,6 +153,14 @@ class BaseStorageEngine[PathType](abc.ABC):
     ) -> str:
         return self.read_bytes_from_path(path).decode(encoding, errors)
 
+    def exists(self, path: pathlib.Path) -> bool:
+        """Return whether a file is stored at `path`."""
+        try:
+            with self.open_reader(path):
+                return True
+        except (FileNotFoundError, IsADirectoryError):
+            return False
+
     @abc.abstractmethod
     def delete_path(self, path: pathlib.Path) -> None:
         raise NotImplementedError
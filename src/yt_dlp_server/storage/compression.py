@@ -0,0 +1,103 @@
+import gzip
+import importlib
+import mimetypes
+import pathlib
+import zlib
+from collections.abc import Callable
+from types import ModuleType
+from typing import Any, Literal, Protocol
+
+type Codec = Literal["gzip", "zstd"]
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Files compressed whatever their content type: the sidecars yt-dlp writes
+# next to a video (info.json, descriptions, subtitles, intermediate pages).
+TEXT_SUFFIXES = frozenset(
+    {
+        ".json",
+        ".description",
+        ".txt",
+        ".dump",
+        ".html",
+        ".xml",
+        ".vtt",
+        ".srt",
+        ".ass",
+        ".ssa",
+        ".lrc",
+        ".ttml",
+        ".srv1",
+        ".srv2",
+        ".srv3",
+        ".json3",
+    }
+)
+
+# Content types compressed whatever their suffix, besides text/*.
+TEXT_CONTENT_TYPES = frozenset({"application/json", "application/xml", "application/javascript"})
+
+
+def is_text_path(path: pathlib.PurePath, suffixes: frozenset[str] = TEXT_SUFFIXES) -> bool:
+    """Return whether `path` holds text, judging by its suffix or the content type guessed from it."""
+    if path.suffix.lower() in suffixes:
+        return True
+    content_type, _ = mimetypes.guess_type(path.name)
+    return content_type is not None and (content_type.startswith("text/") or content_type in TEXT_CONTENT_TYPES)
+
+
+def is_compressed(data: bytes | memoryview) -> bool:
+    """
+    Return whether `data` starts like a gzip member or a zstd frame.
+
+    Text never does: neither start is valid UTF-8.
+    """
+    return bytes(data[:2]) == GZIP_MAGIC or bytes(data[:4]) == ZSTD_MAGIC
+
+
+def zstandard() -> ModuleType:
+    """
+    Return the optional ``zstandard`` module.
+
+    :raises ValueError: If it is not installed.
+    """
+    try:
+        return importlib.import_module("zstandard")
+    except ImportError as e:
+        raise ValueError("zstd compression needs the zstandard package") from e
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes, /) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+def new_compressor(codec: Codec, level: int, dictionary: Any = None) -> Compressor:
+    """
+    Return an incremental compressor producing a single gzip member or zstd frame.
+
+    :param dictionary: A ``zstandard.ZstdCompressionDict``, for zstd only.
+    """
+    if codec == "gzip":
+        # wbits=31 makes zlib write a gzip header and trailer.
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    compressor: Compressor = zstandard().ZstdCompressor(level=level, dict_data=dictionary).compressobj()
+    return compressor
+
+
+def decompress(data: bytes, load_dictionary: Callable[[int], Any]) -> bytes:
+    """
+    Decompress a gzip member or zstd frame.
+
+    :param load_dictionary: Returns the ``zstandard.ZstdCompressionDict`` with the given ID,
+        for frames compressed with a dictionary.
+    """
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    zstd = zstandard()
+    dictionary_id = zstd.get_frame_parameters(data).dict_id
+    dictionary = load_dictionary(dictionary_id) if dictionary_id else None
+    result: bytes = zstd.ZstdDecompressor(dict_data=dictionary).decompressobj().decompress(data)
+    return result
@@ -0,0 +1,47 @@
+import hashlib
+import importlib
+from dataclasses import dataclass
+from typing import Protocol
+
+DEFAULT_DIGEST_ALGORITHM = "sha256"
+
+# Algorithms provided by the optional xxhash package, by name.
+XXHASH_ALGORITHMS = ("xxh32", "xxh64", "xxh3_64", "xxh3_128", "xxh128")
+
+
+class Hasher(Protocol):
+    def update(self, data: bytes, /) -> None: ...
+
+    def hexdigest(self) -> str: ...
+
+
+def new_hasher(algorithm: str) -> Hasher:
+    """
+    Return an incremental hasher for `algorithm`.
+
+    `algorithm` is any name accepted by `hashlib.new`, such as ``sha256`` or
+    ``blake2b``, or one of :data:`XXHASH_ALGORITHMS`, which need the ``xxhash``
+    package.
+
+    :raises ValueError: If the algorithm is unknown or its package is not installed.
+    """
+    if algorithm in XXHASH_ALGORITHMS:
+        try:
+            xxhash = importlib.import_module("xxhash")
+        except ImportError as e:
+            raise ValueError(f"The {algorithm} digest needs the xxhash package") from e
+        hasher: Hasher = getattr(xxhash, algorithm)()
+        return hasher
+    try:
+        return hashlib.new(algorithm)
+    except ValueError as e:
+        raise ValueError(f"Unknown digest algorithm: {algorithm}") from e
+
+
+@dataclass(frozen=True)
+class WriteResult:
+    """What was written to a path: its size and a digest of its contents."""
+
+    size: int
+    algorithm: str
+    digest: str
@@ -0,0 +1,279 @@
+import contextlib
+import fcntl
+import hashlib
+import os
+import pathlib
+import secrets
+import threading
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from pydantic import PrivateAttr
+
+from yt_dlp_server.storage.base import DEFAULT_CHUNK_SIZE, iter_chunks
+from yt_dlp_server.storage.digest import WriteResult, new_hasher
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.storage.layout import CAS_DIR
+
+
+@dataclass
+class CASStats:
+    objects: int = 0
+    object_bytes: int = 0
+    references: int = 0
+
+
+@dataclass
+class CASCollected:
+    """What :meth:`ContentAddressedStorageEngine.gc` removed."""
+
+    objects: int = 0
+    inode_links: int = 0
+
+
+class ContentAddressedStorageEngine(LocalStorageEngine):
+    """
+    A local storage engine that keeps each distinct file only once.
+
+    Every file is stored once as an object named after the SHA-256 of its
+    contents, under ``.cas/objects/`` in the repository. The paths that are
+    written to are hardlinks to their object, so storing a file that is
+    already present (such as the same video downloaded for another job) costs
+    only a directory entry. An object's link count is its reference count:
+    :meth:`delete_path` removes the path, and the object too once no path
+    refers to it. Reads are those of :class:`LocalStorageEngine`.
+
+    Stored files are shared between paths, so they must not be modified in
+    place, only replaced by writing to their path. Paths outside the
+    repository are stored as plain files.
+
+    Several processes can share a repository: objects are linked and released
+    under a file lock (see :meth:`_object_lock`). A process that dies while
+    writing or deleting can leave an object that nothing refers to, or a stale
+    entry under ``.cas/inodes/``; :meth:`gc` removes them.
+    """
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def cas_dir(self) -> pathlib.Path:
+        return self.repository / CAS_DIR
+
+    def object_path(self, digest: str) -> pathlib.Path:
+        """Return where the object with the hex SHA-256 `digest` is stored."""
+        return self.cas_dir / "objects" / digest[:2] / digest
+
+    def _inode_path(self, inode: int) -> pathlib.Path:
+        # Maps the inode of an object (and so of every path linked to it) back to the object.
+        return self.cas_dir / "inodes" / str(inode)
+
+    @contextlib.contextmanager
+    def _object_lock(self, digest: str) -> Iterator[None]:
+        """
+        Hold the lock that orders linking, releasing and collecting the object
+        `digest`, across processes as well as threads. Objects share one lock
+        per leading byte of their digest, kept under ``.cas/locks/``.
+        """
+        lock_path = self.cas_dir / "locks" / digest[:2]
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            # flock() locks belong to the open file, so threads of one process exclude each other too.
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _link_inode(self, inode: int, object_path: pathlib.Path) -> None:
+        """Point the entry for `inode` at `object_path`, replacing a stale one left for a reused inode."""
+        inode_path = self._inode_path(inode)
+        target = os.path.relpath(object_path, inode_path.parent)
+        with contextlib.suppress(FileNotFoundError):
+            if os.readlink(inode_path) == target:
+                return
+        inode_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = inode_path.with_name(f".{inode}.{secrets.token_hex(8)}.tmp")
+        temp_path.symlink_to(target)
+        os.replace(temp_path, inode_path)
+
+    def _is_managed(self, canonical_path: pathlib.Path) -> bool:
+        return canonical_path.is_relative_to(self.repository) and not canonical_path.is_relative_to(self.cas_dir)
+
+    def _temp_path(self) -> pathlib.Path:
+        temp_dir = self.cas_dir / "tmp"
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        return temp_dir / secrets.token_hex(16)
+
+    @contextlib.contextmanager
+    def open_writer(self, path: pathlib.Path) -> Iterator[BinaryIO]:
+        """
+        Write to a temporary file, then store it as an object (unless an
+        identical one exists) and link `path` to it once the block exits
+        normally.
+        """
+        canonical_path = self.canonicalize_path(path)
+        if not self._is_managed(canonical_path):
+            with super().open_writer(path) as f:
+                yield f
+            return
+        temp_path = self._temp_path()
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with open(fd, "w+b") as f:
+                yield f
+                f.flush()
+                f.seek(0)
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            self._commit(temp_path, digest, canonical_path)
+            self._index_written(path, canonical_path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    def write_stream_with_digest(
+        self,
+        path: pathlib.Path,
+        chunks: Iterable[bytes] | BinaryIO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        algorithm: str | None = None,
+    ) -> WriteResult:
+        """
+        Like :meth:`BaseStorageEngine.write_stream_with_digest`. The SHA-256
+        that addresses the object is computed in the same pass, so it is
+        reused when `algorithm` is ``sha256``.
+        """
+        canonical_path = self.canonicalize_path(path)
+        if not self._is_managed(canonical_path):
+            return super().write_stream_with_digest(path, chunks, chunk_size, algorithm)
+        algorithm = algorithm if algorithm is not None else self.digest_algorithm
+        address = hashlib.sha256()
+        hasher = address if algorithm == "sha256" else new_hasher(algorithm)
+        written = 0
+        temp_path = self._temp_path()
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with open(fd, "wb") as f:
+                for chunk in iter_chunks(chunks, chunk_size):
+                    address.update(chunk)
+                    if hasher is not address:
+                        hasher.update(chunk)
+                    written += f.write(chunk)
+            self._commit(temp_path, address.hexdigest(), canonical_path)
+            self._index_written(path, canonical_path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+        result = WriteResult(written, algorithm, hasher.hexdigest())
+        self.record_digest(path, result)
+        return result
+
+    def _commit(self, temp_path: pathlib.Path, digest: str, canonical_path: pathlib.Path) -> None:
+        """Store `temp_path` as the object `digest`, unless it exists, and link `canonical_path` to it."""
+        object_path = self.object_path(digest)
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        canonical_path.parent.mkdir(parents=True, exist_ok=True)
+        link_path = canonical_path.with_name(f".{canonical_path.name}.{secrets.token_hex(8)}.tmp")
+        with self._lock:
+            with self._object_lock(digest):
+                with contextlib.suppress(FileExistsError):
+                    os.link(temp_path, object_path)
+                inode = object_path.stat().st_ino
+                self._link_inode(inode, object_path)
+                try:
+                    replaced = canonical_path.stat()
+                except FileNotFoundError:
+                    replaced = None
+                if replaced is not None and replaced.st_ino == inode:
+                    # Already linked to the object; renaming one link over another of the same file does nothing.
+                    return
+                os.link(object_path, link_path)
+                os.replace(link_path, canonical_path)
+            self._forget_digest(canonical_path)
+            # Outside the object's lock, as the replaced object can share it or have another.
+            if replaced is not None:
+                self._release(replaced)
+
+    def _release(self, stat: os.stat_result) -> None:
+        """Delete the object with the given `stat` if no path refers to it any more."""
+        inode_path = self._inode_path(stat.st_ino)
+        try:
+            object_path = inode_path.parent / os.readlink(inode_path)
+        except FileNotFoundError:
+            # Not an object, such as a file written before the engine was used.
+            return
+        with self._object_lock(object_path.name):
+            try:
+                object_stat = object_path.stat()
+            except FileNotFoundError:
+                inode_path.unlink(missing_ok=True)
+                return
+            if object_stat.st_ino == stat.st_ino and object_stat.st_nlink <= 1:
+                # The object first, so that an interruption leaves a stale inode entry for gc() rather than a leak.
+                object_path.unlink()
+                inode_path.unlink(missing_ok=True)
+
+    def delete_path(self, path: pathlib.Path) -> None:
+        canonical_path = self.canonicalize_path(path)
+        if not self._is_managed(canonical_path):
+            super().delete_path(path)
+            return
+        with self._lock:
+            try:
+                stat = canonical_path.stat()
+            except FileNotFoundError:
+                stat = None
+            if stat is not None:
+                canonical_path.unlink()
+                self._release(stat)
+        self._forget_digest(canonical_path)
+        self._index_deleted(path)
+
+    def gc(self) -> CASCollected:
+        """
+        Remove the objects that no path refers to, and the entries under
+        ``.cas/inodes/`` whose object is gone, such as those left by a process
+        that died while writing or deleting. Safe to run while the repository
+        is in use.
+        """
+        collected = CASCollected()
+        objects_dir = self.cas_dir / "objects"
+        for object_path in objects_dir.glob("*/*") if objects_dir.is_dir() else []:
+            with self._object_lock(object_path.name):
+                try:
+                    object_stat = object_path.stat()
+                except FileNotFoundError:
+                    continue
+                if object_stat.st_nlink > 1:
+                    continue
+                object_path.unlink()
+                collected.objects += 1
+        inodes_dir = self.cas_dir / "inodes"
+        for inode_path in inodes_dir.iterdir() if inodes_dir.is_dir() else []:
+            try:
+                target = os.readlink(inode_path)
+            except OSError:
+                # Removed meanwhile, or not a link the engine made.
+                continue
+            object_path = inode_path.parent / target
+            with self._object_lock(object_path.name):
+                with contextlib.suppress(FileNotFoundError):
+                    if os.readlink(inode_path) != target:
+                        # Repointed while waiting for the lock.
+                        continue
+                    if str(object_path.stat().st_ino) == inode_path.name:
+                        continue
+                inode_path.unlink(missing_ok=True)
+                collected.inode_links += 1
+        return collected
+
+    def stats(self) -> CASStats:
+        """Count the stored objects, their total size and the paths that refer to them."""
+        stats = CASStats()
+        objects_dir = self.cas_dir / "objects"
+        if not objects_dir.is_dir():
+            return stats
+        for object_path in objects_dir.glob("*/*"):
+            object_stat = object_path.stat()
+            stats.objects += 1
+            stats.object_bytes += object_stat.st_size
+            stats.references += object_stat.st_nlink - 1
+        return stats
@@ -0,0 +1,271 @@
+import contextlib
+import io
+import logging
+import pathlib
+import threading
+from collections.abc import Iterable, Iterator
+from typing import Any, BinaryIO, cast
+
+from yt_dlp_server.storage.base import DEFAULT_CHUNK_SIZE, BaseStorageEngine, iter_chunks
+from yt_dlp_server.storage.compression import (
+    TEXT_SUFFIXES,
+    Codec,
+    Compressor,
+    decompress,
+    is_compressed,
+    is_text_path,
+    new_compressor,
+    zstandard,
+)
+from yt_dlp_server.storage.digest import Hasher, WriteResult, new_hasher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVELS: dict[Codec, int] = {"gzip": 6, "zstd": 3}
+
+# Where trained zstd dictionaries are kept, named after their ID, with the ID of the one in use in "current".
+DICTIONARIES_DIR = pathlib.Path(".dictionaries")
+
+# Dictionaries are trained on the start of the first info.json files written.
+DICTIONARY_SUFFIX = ".info.json"
+DICTIONARY_SAMPLES = 100
+DICTIONARY_SAMPLE_SIZE = 64 * 1024
+DICTIONARY_SIZE = 112 * 1024
+MIN_DICTIONARY_SIZE = 1024
+
+
+class _CompressingWriter:
+    """Compresses what is written to it into `writer`."""
+
+    def __init__(self, writer: BinaryIO, compressor: Compressor, hasher: Hasher | None, sample: bool) -> None:
+        self._writer = writer
+        self._compressor = compressor
+        # Hashes what is stored, that is the compressed data.
+        self._hasher = hasher
+        self.written = 0
+        self.stored = 0
+        self.sample = bytearray() if sample else None
+
+    def _store(self, data: bytes) -> None:
+        if data:
+            if self._hasher is not None:
+                self._hasher.update(data)
+            self.stored += self._writer.write(data)
+
+    def write(self, data: bytes) -> int:
+        if self.sample is not None and len(self.sample) < DICTIONARY_SAMPLE_SIZE:
+            self.sample += data[: DICTIONARY_SAMPLE_SIZE - len(self.sample)]
+        self._store(self._compressor.compress(data))
+        self.written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.written
+
+    def finish(self) -> None:
+        self._store(self._compressor.flush())
+
+
+class CompressedStorageEngine[PathType](BaseStorageEngine[PathType]):
+    """
+    Compresses text files, such as the info.json, description, subtitle and
+    intermediate page files yt-dlp writes next to a video, in front of any
+    storage engine.
+
+    Which files are text is judged by their suffix, or else by the content
+    type guessed from it. They are compressed as they are written, to the same
+    path, and decompressed as they are read, so callers see the original
+    data; files stored uncompressed, such as those written before compression
+    was enabled, are read as they are.
+
+    With zstd, a dictionary is trained on the first info.json files written
+    and used for the ones after, which compresses small files far better. It
+    is kept under ``.dictionaries/`` through the wrapped engine, and found by
+    the ID recorded in each file, so older files stay readable.
+
+    The digests recorded for compressed files are of what is stored, so
+    :meth:`verify_path` checks the compressed data.
+    """
+
+    def __init__(
+        self,
+        engine: BaseStorageEngine[PathType],
+        codec: Codec = "gzip",
+        level: int | None = None,
+        suffixes: frozenset[str] = TEXT_SUFFIXES,
+        train_dictionary: bool = True,
+    ) -> None:
+        """
+        :param engine: Where the files are stored.
+        :param codec: ``gzip``, or ``zstd``, which needs the ``zstandard`` package.
+        :param level: The compression level. Defaults to a level that favours speed.
+        :param suffixes: The suffixes of the files that are compressed, besides text content types.
+        :param train_dictionary: Whether to train a dictionary for info.json files, for zstd only.
+        """
+        if codec not in DEFAULT_LEVELS:
+            raise ValueError(f"Unknown codec: {codec}")
+        if codec == "zstd":
+            zstandard()
+        self.engine = engine
+        self.codec = codec
+        self.level = level if level is not None else DEFAULT_LEVELS[codec]
+        self.suffixes = frozenset(suffix.lower() for suffix in suffixes)
+        self.train_dictionary = train_dictionary and codec == "zstd"
+        self._lock = threading.Lock()
+        self._dictionaries: dict[int, Any] = {}
+        # None until the current dictionary has been looked up, then 0 if there is none.
+        self._dictionary_id: int | None = None
+        self._samples: list[bytes] = []
+
+    @property
+    def repository(self) -> PathType:
+        return self.engine.repository
+
+    @property
+    def digest_algorithm(self) -> str:
+        return self.engine.digest_algorithm
+
+    def canonicalize_path(self, path: pathlib.Path) -> PathType:
+        return self.engine.canonicalize_path(path)
+
+    def is_compressible(self, path: pathlib.Path) -> bool:
+        return path.parts[:1] != DICTIONARIES_DIR.parts and is_text_path(path, self.suffixes)
+
+    def _load_dictionary(self, dictionary_id: int) -> Any:
+        with self._lock:
+            dictionary = self._dictionaries.get(dictionary_id)
+        if dictionary is None:
+            data = self.engine.read_bytes_from_path(DICTIONARIES_DIR / f"{dictionary_id}.zdict")
+            dictionary = zstandard().ZstdCompressionDict(data)
+            with self._lock:
+                self._dictionaries[dictionary_id] = dictionary
+        return dictionary
+
+    def _current_dictionary(self) -> Any:
+        """Return the dictionary new info.json files are compressed with, if one has been trained."""
+        if self._dictionary_id is None:
+            try:
+                current = int(self.engine.read_text_from_path(DICTIONARIES_DIR / "current"))
+            except (FileNotFoundError, ValueError):
+                current = 0
+            self._dictionary_id = current
+        return self._load_dictionary(self._dictionary_id) if self._dictionary_id else None
+
+    def _add_sample(self, sample: bytes) -> None:
+        """Keep `sample` for training, and train a dictionary once there are enough."""
+        with self._lock:
+            if self._dictionary_id or len(self._samples) >= DICTIONARY_SAMPLES:
+                return
+            self._samples.append(sample)
+            if len(self._samples) < DICTIONARY_SAMPLES:
+                return
+            samples, self._samples = self._samples, []
+        zstd = zstandard()
+        try:
+            # zstd recommends a dictionary of about a tenth of the samples it is trained on.
+            size = min(DICTIONARY_SIZE, max(MIN_DICTIONARY_SIZE, sum(map(len, samples)) // 10))
+            dictionary = zstd.train_dictionary(size, samples, level=self.level)
+        except zstd.ZstdError:
+            logger.exception("Failed to train a compression dictionary; compressing without one")
+            return
+        dictionary_id = dictionary.dict_id()
+        self.engine.write_bytes_to_path(DICTIONARIES_DIR / f"{dictionary_id}.zdict", dictionary.as_bytes())
+        self.engine.write_text_to_path(DICTIONARIES_DIR / "current", str(dictionary_id))
+        with self._lock:
+            self._dictionaries[dictionary_id] = dictionary
+            self._dictionary_id = dictionary_id
+        logger.info("Trained compression dictionary %d on %d info.json files", dictionary_id, len(samples))
+
+    @contextlib.contextmanager
+    def _open_compressing(self, path: pathlib.Path, hasher: Hasher | None) -> Iterator[_CompressingWriter]:
+        info_json = self.train_dictionary and path.name.endswith(DICTIONARY_SUFFIX)
+        dictionary = self._current_dictionary() if info_json else None
+        with self.engine.open_writer(path) as f:
+            writer = _CompressingWriter(
+                f, new_compressor(self.codec, self.level, dictionary), hasher, info_json and dictionary is None
+            )
+            yield writer
+            writer.finish()
+        if writer.sample:
+            self._add_sample(bytes(writer.sample))
+
+    @contextlib.contextmanager
+    def open_writer(self, path: pathlib.Path) -> Iterator[BinaryIO]:
+        if not self.is_compressible(path):
+            with self.engine.open_writer(path) as f:
+                yield f
+            return
+        with self._open_compressing(path, None) as writer:
+            yield cast(BinaryIO, writer)
+
+    def write_bytes_to_path(self, path: pathlib.Path, data: bytes) -> int:
+        return self.write_stream_with_digest(path, [data]).size
+
+    def write_stream_with_digest(
+        self,
+        path: pathlib.Path,
+        chunks: Iterable[bytes] | BinaryIO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        algorithm: str | None = None,
+    ) -> WriteResult:
+        """
+        Like :meth:`BaseStorageEngine.write_stream_with_digest`. The result
+        describes the data as it was given, and the recorded digest the data
+        as it is stored.
+        """
+        if not self.is_compressible(path):
+            return self.engine.write_stream_with_digest(path, chunks, chunk_size, algorithm)
+        algorithm = algorithm if algorithm is not None else self.digest_algorithm
+        hasher = new_hasher(algorithm)
+        stored_hasher = new_hasher(algorithm)
+        with self._open_compressing(path, stored_hasher) as writer:
+            for chunk in iter_chunks(chunks, chunk_size):
+                hasher.update(chunk)
+                writer.write(chunk)
+        self.engine.record_digest(path, WriteResult(writer.stored, algorithm, stored_hasher.hexdigest()))
+        return WriteResult(writer.written, algorithm, hasher.hexdigest())
+
+    def record_digest(self, path: pathlib.Path, result: WriteResult) -> None:
+        """
+        Record the digest of what is stored at `path`. For compressed files,
+        `result` describes the data as it was given, so the stored data is
+        read back and hashed instead; text files are small.
+        """
+        if not self.is_compressible(path):
+            self.engine.record_digest(path, result)
+            return
+        stored = self.engine.read_bytes_from_path(path)
+        hasher = new_hasher(result.algorithm)
+        hasher.update(stored)
+        self.engine.record_digest(path, WriteResult(len(stored), result.algorithm, hasher.hexdigest()))
+
+    def get_digest(self, path: pathlib.Path) -> WriteResult | None:
+        return self.engine.get_digest(path)
+
+    def verify_path(self, path: pathlib.Path) -> bool:
+        return self.engine.verify_path(path)
+
+    def read_bytes_from_path(self, path: pathlib.Path) -> bytes:
+        data = self.engine.read_bytes_from_path(path)
+        if self.is_compressible(path) and is_compressed(data):
+            return decompress(data, self._load_dictionary)
+        return data
+
+    def open_reader(self, path: pathlib.Path) -> contextlib.AbstractContextManager[BinaryIO]:
+        if not self.is_compressible(path):
+            return self.engine.open_reader(path)
+        # Text files are small, and a decompressed copy can seek anywhere.
+        return io.BytesIO(self.read_bytes_from_path(path))
+
+    def read_range(self, path: pathlib.Path, offset: int, length: int) -> memoryview:
+        if not self.is_compressible(path):
+            return self.engine.read_range(path, offset, length)
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must not be negative")
+        return memoryview(self.read_bytes_from_path(path))[offset : offset + length]
+
+    def exists(self, path: pathlib.Path) -> bool:
+        return self.engine.exists(path)
+
+    def delete_path(self, path: pathlib.Path) -> None:
+        self.engine.delete_path(path)
@@ -1,9 +1,19 @@
+import contextlib
+import json
+import mmap
+import os
 import pathlib
+import secrets
 import tempfile
+from collections.abc import Iterator
+from typing import BinaryIO
 
 from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 from yt_dlp_server.storage.base import BaseStorageEngine
+from yt_dlp_server.storage.digest import DEFAULT_DIGEST_ALGORITHM, WriteResult, new_hasher
+from yt_dlp_server.storage.index import MetadataIndex
+from yt_dlp_server.storage.layout import DIGESTS_DIR, INDEX_DIR, FlatLayout, Layout, stored_files
 
 
 class LocalStorageEngine(BaseModel, BaseStorageEngine[pathlib.Path]):
@@ -12,31 +22,310 @@ class LocalStorageEngine(BaseModel, BaseStorageEngine[pathlib.Path]):
     _repository: pathlib.Path = PrivateAttr(
         default_factory=lambda: pathlib.Path(tempfile.mkdtemp(prefix="yt-dlp-server-"))
     )
+    _digest_algorithm: str = PrivateAttr(default=DEFAULT_DIGEST_ALGORITHM)
+    _layout: Layout = PrivateAttr(default_factory=FlatLayout)
+    _previous_layout: Layout | None = PrivateAttr(default=None)
+    _index: MetadataIndex | None = PrivateAttr(default=None)
+    _digest_sidecars: bool = PrivateAttr(default=False)
 
-    def __init__(self, repository: pathlib.Path | None = None, **data: object) -> None:
+    def __init__(
+        self,
+        repository: pathlib.Path | None = None,
+        digest_algorithm: str = DEFAULT_DIGEST_ALGORITHM,
+        layout: Layout | None = None,
+        previous_layout: Layout | None = None,
+        index: bool = False,
+        digest_sidecars: bool = False,
+        **data: object,
+    ) -> None:
+        """
+        :param repository: Where files are stored. Defaults to a new temporary directory.
+        :param digest_algorithm: The digest computed while writing (see :func:`new_hasher`).
+        :param layout: Where files are kept in the repository. Defaults to their paths as they are.
+        :param previous_layout: While a repository is moved to `layout` with
+            :func:`migrate_layout`, its previous layout: files that have not
+            been moved yet are found there.
+        :param index: Whether to keep an index of the stored files under
+            ``.index/`` in the repository, so that :meth:`exists`,
+            :meth:`list_paths` and :meth:`total_size` need no filesystem
+            access. It is built from the repository when it is first created.
+            The index also keeps the digests of the files in it.
+        :param digest_sidecars: Without an index, whether to keep the digest
+            of each file in a file of its own under ``.digests/``, so that
+            :meth:`verify_path` can check it. Off by default, as it doubles the
+            files written; without either, no digests are kept.
+        """
         super().__init__(**data)
         if repository is not None:
             self._repository = repository
+        new_hasher(digest_algorithm)
+        self._digest_algorithm = digest_algorithm
+        if layout is not None:
+            self._layout = layout
+        self._previous_layout = previous_layout
+        self._digest_sidecars = digest_sidecars
+        if index:
+            database = self.repository / INDEX_DIR / "metadata.sqlite3"
+            created = not database.exists()
+            database.parent.mkdir(parents=True, exist_ok=True)
+            self._index = MetadataIndex(database)
+            if created:
+                self.rebuild_index()
 
     @property
     def repository(self) -> pathlib.Path:
         return self._repository
 
+    @property
+    def digest_algorithm(self) -> str:
+        return self._digest_algorithm
+
+    @property
+    def layout(self) -> Layout:
+        return self._layout
+
+    @property
+    def index(self) -> MetadataIndex | None:
+        return self._index
+
     def canonicalize_path(self, path: pathlib.Path) -> pathlib.Path:
-        return self.repository / path
+        """
+        Return where `path` is kept, according to the layout. Absolute paths are returned as they are.
+
+        During a migration, a file that is only found in its previous location
+        is reported there, so reads, overwrites and deletes all find it.
+        """
+        if path.is_absolute():
+            return path
+        canonical_path = self.repository / self._layout.physical(path)
+        if self._previous_layout is None or canonical_path.exists():
+            return canonical_path
+        previous_path = self.repository / self._previous_layout.physical(path)
+        return previous_path if previous_path.exists() else canonical_path
 
     def write_bytes_to_path(self, path: pathlib.Path, data: bytes) -> int:
+        return self.write_stream_with_digest(path, [data]).size
+
+    @contextlib.contextmanager
+    def open_writer(self, path: pathlib.Path) -> Iterator[BinaryIO]:
+        """
+        Write to a temporary file next to `path`, and rename it to `path` once
+        the block exits normally. Readers never see a partially written file.
+        """
         canonical_path = self.canonicalize_path(path)
         canonical_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(canonical_path, "wb") as f:
-            return f.write(data)
+        temp_path = canonical_path.with_name(f".{canonical_path.name}.{secrets.token_hex(8)}.tmp")
+        # Unlike mkstemp, os.open() with 0o666 gives the file the usual permissions for the umask.
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with open(fd, "wb") as f:
+                yield f
+            os.replace(temp_path, canonical_path)
+            self._forget_digest(canonical_path)
+            self._index_written(path, canonical_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    def _digest_path(self, canonical_path: pathlib.Path) -> pathlib.Path | None:
+        """Return where the digest of `canonical_path` is kept, or None for paths outside the repository."""
+        if not canonical_path.is_relative_to(self.repository):
+            return None
+        return self.repository / DIGESTS_DIR / f"{canonical_path.relative_to(self.repository)}.json"
+
+    def _forget_digest(self, canonical_path: pathlib.Path) -> None:
+        if not self._digest_sidecars:
+            return
+        digest_path = self._digest_path(canonical_path)
+        if digest_path is not None:
+            digest_path.unlink(missing_ok=True)
+
+    def record_digest(self, path: pathlib.Path, result: WriteResult) -> None:
+        """
+        Keep the digest in the index, if the engine keeps one. Otherwise, with
+        `digest_sidecars`, keep it in a file under ``.digests/`` in the
+        repository, which mirrors the layout of the repository.
+        """
+        if self._index is not None and not path.is_absolute():
+            self._index_digest(path, result)
+            return
+        if not self._digest_sidecars:
+            return
+        digest_path = self._digest_path(self.canonicalize_path(path))
+        if digest_path is None:
+            return
+        digest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = digest_path.with_name(f".{digest_path.name}.{secrets.token_hex(8)}.tmp")
+        temp_path.write_text(json.dumps({"size": result.size, "algorithm": result.algorithm, "digest": result.digest}))
+        os.replace(temp_path, digest_path)
+
+    def _read_digest(self, canonical_path: pathlib.Path) -> WriteResult | None:
+        """Return the digest kept under ``.digests/`` for `canonical_path`, or None if there is none."""
+        digest_path = self._digest_path(canonical_path)
+        if digest_path is None:
+            return None
+        try:
+            return WriteResult(**json.loads(digest_path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _index_written(self, path: pathlib.Path, canonical_path: pathlib.Path) -> None:
+        """Record the file just written at `path` in the index. Only relative paths are indexed."""
+        if self._index is None or path.is_absolute():
+            return
+        stat = canonical_path.stat()
+        self._index.put(path, stat.st_size, stat.st_mtime)
+
+    def _index_digest(self, path: pathlib.Path, result: WriteResult) -> None:
+        """Add the digest of `path` to its record in the index, indexing the file too if it is missing."""
+        if self._index is None or path.is_absolute():
+            return
+        if not self._index.set_digest(path, result):
+            stat = self.canonicalize_path(path).stat()
+            self._index.put(path, stat.st_size, stat.st_mtime, result if result.size == stat.st_size else None)
+
+    def _index_deleted(self, path: pathlib.Path) -> None:
+        if self._index is not None and not path.is_absolute():
+            self._index.remove(path)
+
+    def _stored_paths(self) -> Iterator[tuple[pathlib.PurePath, pathlib.PurePath]]:
+        """Walk the repository, yielding the logical and physical path of each stored file."""
+        for physical in stored_files(self.repository):
+            for layout in (self._layout, self._previous_layout):
+                if layout is not None and layout.contains(physical):
+                    logical = layout.logical(physical)
+                    if logical is not None:
+                        yield logical, physical
+                    break
+
+    def rebuild_index(self) -> None:
+        """
+        Replace the contents of the index with the files found in the
+        repository. Their digests are kept, and those found under
+        ``.digests/`` are moved into the index.
+        """
+        if self._index is None:
+            raise RuntimeError("The engine keeps no index")
+        records = []
+        for logical, physical in self._stored_paths():
+            canonical_path = self.repository / physical
+            stat = canonical_path.stat()
+            digest = self._read_digest(canonical_path)
+            if digest is None and (metadata := self._index.get(logical)) is not None:
+                digest = metadata.digest
+            if digest is not None and digest.size != stat.st_size:
+                digest = None
+            records.append((logical, canonical_path, stat, digest))
+        self._index.clear()
+        for logical, canonical_path, stat, digest in records:
+            self._index.put(logical, stat.st_size, stat.st_mtime, digest)
+            digest_path = self._digest_path(canonical_path)
+            if digest_path is not None:
+                digest_path.unlink(missing_ok=True)
+
+    def exists(self, path: pathlib.Path) -> bool:
+        if self._index is None or path.is_absolute():
+            return self.canonicalize_path(path).is_file()
+        return self._index.exists(path)
+
+    def list_paths(self, prefix: pathlib.Path = pathlib.Path()) -> list[pathlib.Path]:
+        """
+        Return the relative paths of the stored files that are `prefix` or
+        under it, in order, such as the files of a job. An empty `prefix` lists
+        every file.
+
+        With an index, this is a single lookup; otherwise the repository is walked.
+        """
+        if self._index is not None:
+            return [pathlib.Path(path) for path in self._index.list_paths(prefix)]
+        paths = [logical.as_posix() for logical, _ in self._stored_paths() if _is_under(logical, prefix)]
+        return [pathlib.Path(path) for path in sorted(paths)]
+
+    def total_size(self, prefix: pathlib.Path = pathlib.Path()) -> int:
+        """Return the total size of the stored files that are `prefix` or under it, such as a job's output."""
+        if self._index is not None:
+            return self._index.total_size(prefix)
+        return sum(
+            (self.repository / physical).stat().st_size
+            for logical, physical in self._stored_paths()
+            if _is_under(logical, prefix)
+        )
+
+    def get_digest(self, path: pathlib.Path) -> WriteResult | None:
+        canonical_path = self.canonicalize_path(path)
+        if self._index is not None and not path.is_absolute():
+            metadata = self._index.get(path)
+            result = metadata.digest if metadata is not None else None
+        else:
+            result = self._read_digest(canonical_path) if self._digest_sidecars else None
+        if result is None:
+            return None
+        try:
+            size = canonical_path.stat().st_size
+        except OSError:
+            return None
+        return result if result.size == size else None
 
     def read_bytes_from_path(self, path: pathlib.Path) -> bytes:
         canonical_path = self.canonicalize_path(path)
         with open(canonical_path, "rb") as f:
             return f.read()
 
+    def open_reader(self, path: pathlib.Path) -> contextlib.AbstractContextManager[BinaryIO]:
+        return open(self.canonicalize_path(path), "rb")
+
+    def read_range(self, path: pathlib.Path, offset: int, length: int) -> memoryview:
+        """
+        Read at most `length` bytes of `path`, starting at `offset`.
+
+        The bytes are read straight into the returned buffer with a single
+        positioned read, without going through a file object's buffer.
+        """
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must not be negative")
+        fd = os.open(self.canonicalize_path(path), os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            buffer = bytearray(max(0, min(length, size - offset)))
+            read = 0
+            while read < len(buffer):
+                count = os.preadv(fd, [memoryview(buffer)[read:]], offset + read)
+                if count == 0:
+                    break
+                read += count
+        finally:
+            os.close(fd)
+        return memoryview(buffer)[:read]
+
+    @contextlib.contextmanager
+    def map_path(self, path: pathlib.Path) -> Iterator[memoryview]:
+        """
+        Map `path` into memory, as a context manager yielding a read-only view of it.
+
+        Slicing the view copies nothing, and only the pages that are touched are
+        read from disk. Slices must be released before the block exits (for
+        example by using them as context managers), or closing the mapping
+        raises `BufferError`.
+        """
+        with open(self.canonicalize_path(path), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap cannot map an empty file.
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
     def delete_path(self, path: pathlib.Path) -> None:
         canonical_path = self.canonicalize_path(path)
         if canonical_path.exists():
             canonical_path.unlink()
+        self._forget_digest(canonical_path)
+        self._index_deleted(path)
+
+
+def _is_under(path: pathlib.PurePath, prefix: pathlib.PurePath) -> bool:
+    return prefix.parts == path.parts[: len(prefix.parts)]
@@ -0,0 +1,508 @@
+"""
+A storage engine for S3 and S3-compatible object stores (such as MinIO).
+
+Only the standard library is used: requests are signed with AWS Signature
+Version 4 and sent over a pool of persistent ``http.client`` connections.
+"""
+
+import concurrent.futures
+import contextlib
+import datetime
+import hashlib
+import hmac
+import http.client
+import io
+import json
+import logging
+import os
+import pathlib
+import queue
+import threading
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+from collections.abc import Iterator, Mapping
+from typing import BinaryIO, cast
+
+from yt_dlp_server.storage.base import BaseStorageEngine
+from yt_dlp_server.storage.digest import WriteResult
+from yt_dlp_server.storage.layout import DIGESTS_DIR
+
+logger = logging.getLogger(__name__)
+
+# S3 needs every part of a multipart upload but the last to be at least 5 MiB.
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 3
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+# Responses that are worth retrying: throttling and server errors.
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class S3Error(OSError):
+    def __init__(self, status: int, code: str, message: str) -> None:
+        super().__init__(f"{status} {code}: {message}")
+        self.status = status
+        self.code = code
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return urllib.parse.quote(value, safe=safe)
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def sign_request(
+    method: str,
+    uri: str,
+    query: Mapping[str, str],
+    headers: Mapping[str, str],
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: datetime.datetime,
+) -> str:
+    """
+    Return the ``Authorization`` header that signs a request with AWS Signature Version 4.
+
+    :param uri: The path of the request, already percent-encoded.
+    :param headers: The headers to sign, which must include ``host`` and ``x-amz-date``.
+    :param payload_hash: The hex SHA-256 of the body.
+    """
+    canonical_query = "&".join(f"{_quote(key)}={_quote(value)}" for key, value in sorted(query.items()))
+    signed = {name.lower(): " ".join(value.split()) for name, value in headers.items()}
+    canonical_headers = "".join(f"{name}:{signed[name]}\n" for name in sorted(signed))
+    signed_headers = ";".join(sorted(signed))
+    canonical_request = "\n".join([method, uri, canonical_query, canonical_headers, signed_headers, payload_hash])
+    date = now.strftime("%Y%m%d")
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            now.strftime("%Y%m%dT%H%M%SZ"),
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+    key = _hmac(_hmac(_hmac(_hmac(f"AWS4{secret_key}".encode(), date), region), "s3"), "aws4_request")
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={signed_headers}, Signature={signature}"
+
+
+def _find_text(element: ET.Element, tag: str) -> str | None:
+    """Return the text of the first descendant named `tag`, whatever its namespace."""
+    for child in element.iter():
+        if child.tag == tag or child.tag.endswith(f"}}{tag}"):
+            return child.text
+    return None
+
+
+class _ConnectionPool:
+    """Keeps idle connections to one server for reuse, creating new ones when none are idle."""
+
+    def __init__(self, endpoint: urllib.parse.SplitResult, size: int, timeout: float) -> None:
+        self._endpoint = endpoint
+        self._timeout = timeout
+        self._idle: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue(maxsize=size)
+
+    def acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self._endpoint.scheme == "https":
+            connection_class: type[http.client.HTTPConnection] = http.client.HTTPSConnection
+        else:
+            connection_class = http.client.HTTPConnection
+        return connection_class(cast(str, self._endpoint.hostname), self._endpoint.port, timeout=self._timeout)
+
+    def release(self, connection: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class S3StorageEngine(BaseStorageEngine[str]):
+    """
+    Stores files as objects in a bucket, under an optional key prefix.
+
+    Files larger than `part_size` are uploaded with a multipart upload, with
+    up to `max_concurrency` parts in flight while the rest of the file is
+    still being written; a failed part is retried on its own. Large reads are
+    split into ranged GETs that run in parallel, and reading a file object
+    from :meth:`open_reader` fetches the next parts ahead of the reader.
+    Every request is retried with exponential backoff on connection errors,
+    throttling and server errors.
+
+    Paths are reported as ``s3://<bucket>/<key>`` URLs. Digests are kept as
+    small JSON objects under ``<prefix>.digests/``.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        prefix: str = "",
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_backoff: float = 0.5,
+        timeout: float = 60.0,
+        allow_small_parts: bool = False,
+    ) -> None:
+        """
+        :param endpoint: The URL of the server, such as ``https://s3.us-east-1.amazonaws.com``.
+            Buckets are addressed by path, which S3-compatible servers support too.
+        :param prefix: Prepended to every key, such as ``downloads/``.
+        :param part_size: The size of the parts of uploads and ranged reads. At least :data:`MIN_PART_SIZE`.
+        :param max_concurrency: The most parts of a file that are transferred at once, which bounds
+            the memory used by an upload to about ``max_concurrency * part_size``.
+        :param max_retries: How many times a failed request is retried.
+        :param retry_backoff: How long to wait before the first retry, in seconds. It doubles with every retry.
+        :param timeout: The socket timeout of a request, in seconds.
+        :param allow_small_parts: Accept any positive `part_size`, for servers that do not enforce the minimum,
+            such as test doubles.
+        """
+        if part_size < 1 or max_concurrency < 1 or max_retries < 0:
+            raise ValueError("part_size and max_concurrency must be positive, and max_retries not negative")
+        if part_size < MIN_PART_SIZE and not allow_small_parts:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE}, as S3 rejects smaller parts")
+        parsed = urllib.parse.urlsplit(endpoint)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError(f"Invalid endpoint: {endpoint}")
+        self.endpoint = parsed
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # Every transfer thread can hold a connection, and so can the callers' threads.
+        self._connections = _ConnectionPool(parsed, max_concurrency * 2, timeout)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_concurrency, thread_name_prefix="s3")
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._connections.close()
+
+    @property
+    def repository(self) -> str:
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def _key(self, path: pathlib.Path) -> str:
+        relative = pathlib.PurePosixPath(path.as_posix().lstrip("/"))
+        if ".." in relative.parts or str(relative) == ".":
+            raise ValueError(f"Invalid path: {path}")
+        return f"{self.prefix}{relative}"
+
+    def canonicalize_path(self, path: pathlib.Path) -> str:
+        return f"s3://{self.bucket}/{self._key(path)}"
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        query: Mapping[str, str] | None = None,
+        headers: Mapping[str, str] | None = None,
+        body: bytes | memoryview = b"",
+    ) -> tuple[http.client.HTTPResponse, bytes]:
+        """
+        Send a request for `key`, retrying it as needed, and return the response and its body.
+
+        :raises FileNotFoundError: If there is no such object.
+        :raises S3Error: If the request failed.
+        """
+        query = dict(query or {})
+        uri = f"/{_quote(self.bucket)}/{_quote(key, safe='/-_.~')}"
+        url = f"{uri}?{urllib.parse.urlencode(query, quote_via=urllib.parse.quote)}" if query else uri
+        payload_hash = hashlib.sha256(body).hexdigest() if body else EMPTY_SHA256
+        attempt = 0
+        while True:
+            if attempt:
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            attempt += 1
+            retries_left = attempt <= self.max_retries
+            now = datetime.datetime.now(datetime.UTC)
+            signed = {
+                "host": cast(str, self.endpoint.netloc),
+                "x-amz-content-sha256": payload_hash,
+                "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+            }
+            request_headers = {**(headers or {}), **signed, "Content-Length": str(len(body))}
+            request_headers["Authorization"] = sign_request(
+                method, uri, query, signed, payload_hash, self.access_key, self.secret_key, self.region, now
+            )
+            connection = self._connections.acquire()
+            try:
+                connection.request(method, url, body=body, headers=request_headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if not retries_left:
+                    raise
+                logger.warning("Retrying %s %s after %s", method, key, e)
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self._connections.release(connection)
+            if response.status in RETRYABLE_STATUSES and retries_left:
+                logger.warning("Retrying %s %s after a %d response", method, key, response.status)
+                continue
+            if response.status == 404:
+                raise FileNotFoundError(f"No such object: {key}")
+            if response.status >= 300 and not (response.status == 416 and method == "GET"):
+                code = message = ""
+                with contextlib.suppress(ET.ParseError):
+                    error = ET.fromstring(data)
+                    code, message = _find_text(error, "Code") or "", _find_text(error, "Message") or ""
+                raise S3Error(response.status, code or response.reason, message)
+            return response, data
+
+    @contextlib.contextmanager
+    def open_writer(self, path: pathlib.Path) -> Iterator[BinaryIO]:
+        """
+        Upload what is written, as a single PUT if it fits in one part and as a
+        multipart upload otherwise. The object appears only once the block
+        exits normally; if it raises, the upload is aborted.
+        """
+        writer = _UploadWriter(self, self._key(path))
+        try:
+            yield cast(BinaryIO, writer)
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def write_bytes_to_path(self, path: pathlib.Path, data: bytes) -> int:
+        return self.write_stream_with_digest(path, [data]).size
+
+    def _digest_key(self, path: pathlib.Path) -> str:
+        return f"{self.prefix}{DIGESTS_DIR}/{self._key(path)[len(self.prefix) :]}.json"
+
+    def record_digest(self, path: pathlib.Path, result: WriteResult) -> None:
+        data = json.dumps({"size": result.size, "algorithm": result.algorithm, "digest": result.digest})
+        self._request("PUT", self._digest_key(path), body=data.encode())
+
+    def get_digest(self, path: pathlib.Path) -> WriteResult | None:
+        try:
+            _, data = self._request("GET", self._digest_key(path))
+            result = WriteResult(**json.loads(data))
+            size = self._size(self._key(path))
+        except (OSError, ValueError, TypeError):
+            return None
+        return result if result.size == size else None
+
+    def _size(self, key: str) -> int:
+        response, _ = self._request("HEAD", key)
+        return int(response.headers["Content-Length"])
+
+    def _get_range(self, key: str, offset: int, length: int) -> bytes:
+        if length == 0:
+            return b""
+        response, data = self._request("GET", key, headers={"Range": f"bytes={offset}-{offset + length - 1}"})
+        if response.status == 416:
+            # The range starts past the end of the object.
+            return b""
+        if response.status == 200:
+            # The server ignored the range.
+            return data[offset : offset + length]
+        return data
+
+    def read_bytes_from_path(self, path: pathlib.Path) -> bytes:
+        """Read the whole object, in parallel ranged GETs if it is larger than a part."""
+        key = self._key(path)
+        size = self._size(key)
+        if size <= self.part_size:
+            return self._get_range(key, 0, size) if size else b""
+        buffer = bytearray(size)
+        offsets = range(0, size, self.part_size)
+        parts = self._executor.map(lambda offset: self._get_range(key, offset, self.part_size), offsets)
+        for offset, part in zip(offsets, parts, strict=True):
+            buffer[offset : offset + len(part)] = part
+        return bytes(buffer)
+
+    def open_reader(self, path: pathlib.Path) -> contextlib.AbstractContextManager[BinaryIO]:
+        key = self._key(path)
+        return cast(BinaryIO, _ObjectReader(self, key, self._size(key)))
+
+    def read_range(self, path: pathlib.Path, offset: int, length: int) -> memoryview:
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must not be negative")
+        return memoryview(self._get_range(self._key(path), offset, length))
+
+    def exists(self, path: pathlib.Path) -> bool:
+        try:
+            self._request("HEAD", self._key(path))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete_path(self, path: pathlib.Path) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            self._request("DELETE", self._key(path))
+        with contextlib.suppress(FileNotFoundError):
+            self._request("DELETE", self._digest_key(path))
+
+
+class _UploadWriter(io.RawIOBase):
+    """Buffers what is written into parts, uploading each part as soon as it is full."""
+
+    def __init__(self, engine: S3StorageEngine, key: str) -> None:
+        self._engine = engine
+        self._key = key
+        self._buffer = bytearray()
+        self._written = 0
+        self._upload_id: str | None = None
+        self._parts: list[concurrent.futures.Future[str]] = []
+        # Bounds the parts held in memory while they are uploaded.
+        self._slots = threading.BoundedSemaphore(engine.max_concurrency)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._written
+
+    def write(self, data: bytes | bytearray | memoryview) -> int:  # type: ignore[override]
+        view = memoryview(data).cast("B")
+        self._buffer += view
+        self._written += len(view)
+        while len(self._buffer) >= self._engine.part_size:
+            part = bytes(self._buffer[: self._engine.part_size])
+            del self._buffer[: self._engine.part_size]
+            self._upload_part(part)
+        return len(view)
+
+    def _upload_part(self, part: bytes) -> None:
+        if self._upload_id is None:
+            _, data = self._engine._request("POST", self._key, {"uploads": ""})
+            self._upload_id = _find_text(ET.fromstring(data), "UploadId")
+            if not self._upload_id:
+                raise S3Error(200, "InvalidResponse", "No UploadId in the response to CreateMultipartUpload")
+        self._slots.acquire()
+        number = len(self._parts) + 1
+        try:
+            future = self._engine._executor.submit(self._send_part, number, part)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._parts.append(future)
+
+    def _send_part(self, number: int, part: bytes) -> str:
+        query = {"partNumber": str(number), "uploadId": cast(str, self._upload_id)}
+        response, _ = self._engine._request("PUT", self._key, query, body=part)
+        return cast(str, response.headers["ETag"])
+
+    def commit(self) -> None:
+        if self._upload_id is None:
+            self._engine._request("PUT", self._key, body=bytes(self._buffer))
+            return
+        if self._buffer:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        etags = [part.result() for part in self._parts]
+        complete = ET.Element("CompleteMultipartUpload")
+        for number, etag in enumerate(etags, start=1):
+            element = ET.SubElement(complete, "Part")
+            ET.SubElement(element, "PartNumber").text = str(number)
+            ET.SubElement(element, "ETag").text = etag
+        _, data = self._engine._request(
+            "POST", self._key, {"uploadId": self._upload_id}, body=ET.tostring(complete, xml_declaration=False)
+        )
+        # CompleteMultipartUpload can fail after its 200 status has been sent.
+        if data and ET.fromstring(data).tag.endswith("Error"):
+            error = ET.fromstring(data)
+            raise S3Error(200, _find_text(error, "Code") or "", _find_text(error, "Message") or "")
+
+    def abort(self) -> None:
+        for part in self._parts:
+            part.cancel()
+        concurrent.futures.wait(self._parts)
+        if self._upload_id is not None:
+            with contextlib.suppress(OSError):
+                self._engine._request("DELETE", self._key, {"uploadId": self._upload_id})
+
+
+class _ObjectReader(io.RawIOBase):
+    """A seekable file object over an object, fetching the parts after the one being read ahead of time."""
+
+    def __init__(self, engine: S3StorageEngine, key: str, size: int) -> None:
+        self._engine = engine
+        self._key = key
+        self._size = size
+        self._position = 0
+        self._parts: dict[int, concurrent.futures.Future[bytes]] = {}
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def _part(self, index: int) -> bytes:
+        part_size = self._engine.part_size
+        for ahead in range(index, min(index + self._engine.max_concurrency, -(-self._size // part_size))):
+            if ahead not in self._parts:
+                self._parts[ahead] = self._engine._executor.submit(
+                    self._engine._get_range, self._key, ahead * part_size, part_size
+                )
+        for stale in [stale for stale in self._parts if stale < index]:
+            self._parts.pop(stale).cancel()
+        return self._parts[index].result()
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:  # type: ignore[override]
+        """Fill `buffer` unless the object ends first, even across parts, as callers of read() expect."""
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view) and self._position < self._size:
+            index, start = divmod(self._position, self._engine.part_size)
+            part = self._part(index)
+            if start >= len(part):
+                break
+            count = min(len(view) - filled, len(part) - start)
+            view[filled : filled + count] = part[start : start + count]
+            filled += count
+            self._position += count
+        return filled
+
+    def close(self) -> None:
+        for part in self._parts.values():
+            part.cancel()
+        self._parts.clear()
+        super().close()
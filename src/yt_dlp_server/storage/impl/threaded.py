@@ -0,0 +1,256 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import pathlib
+import threading
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+from types import TracebackType
+from typing import Any, Self, cast
+
+from yt_dlp_server.storage.async_base import AsyncBaseStorageEngine
+from yt_dlp_server.storage.base import DEFAULT_CHUNK_SIZE, BaseStorageEngine
+from yt_dlp_server.storage.digest import WriteResult
+
+DEFAULT_MAX_WORKERS = 4
+
+# Operations on at most this many bytes are batched (see ThreadedStorageEngine).
+SMALL_OPERATION_SIZE = 64 * 1024
+
+# The most operations run together in one batch.
+MAX_BATCH_SIZE = 64
+
+# The most chunks of a stream gathered ahead of the one being written.
+STREAM_QUEUE_SIZE = 2
+
+# Put on the queue of a stream instead of a chunk when the stream fails.
+_ABORTED = object()
+
+
+class _StreamAbortedError(Exception):
+    """Raised in the writing thread when the stream fails, so that the engine discards the write."""
+
+
+async def _coalesce(chunks: Iterable[bytes] | AsyncIterable[bytes], size: int) -> AsyncIterator[bytes]:
+    """Iterate over `chunks`, joining consecutive small chunks into ones of at least `size` bytes."""
+    buffer = bytearray()
+
+    async def aiter_chunks() -> AsyncIterator[bytes]:
+        if isinstance(chunks, AsyncIterable):
+            async for chunk in chunks:
+                yield chunk
+        else:
+            for chunk in chunks:
+                yield chunk
+
+    async for chunk in aiter_chunks():
+        if not buffer and len(chunk) >= size:
+            yield chunk
+            continue
+        buffer += chunk
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+class ThreadedStorageEngine[PathType](AsyncBaseStorageEngine[PathType]):
+    """
+    Adapts any :class:`BaseStorageEngine` to asyncio by running its blocking
+    calls in a bounded pool of threads.
+
+    Small operations (deletes, existence checks, and reads and writes of at
+    most :data:`SMALL_OPERATION_SIZE` bytes) issued while the event loop is
+    busy are gathered and run together as one task in the pool, so that a
+    burst of them costs a few handoffs to the pool rather than one each.
+    Streams are written by the engine's own
+    :meth:`~BaseStorageEngine.write_stream_with_digest`, fed chunks of about
+    `chunk_size` bytes through a bounded queue, so the next chunks are
+    gathered while the previous one is written. It waits for the stream for as
+    long as the stream lasts, so it runs in a thread of its own rather than in
+    the pool: streams in flight never starve other operations, even streams
+    read from this engine. Streams are read one chunk ahead of the consumer.
+
+    An engine must only be used from one event loop at a time. Close it with
+    :meth:`aclose`, or use it as an async context manager.
+    """
+
+    def __init__(self, engine: BaseStorageEngine[PathType], max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+        """
+        :param engine: The engine that does the I/O.
+        :param max_workers: The most threads that do I/O at once, besides those writing streams.
+        """
+        self.engine = engine
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="storage")
+        self._pending: list[tuple[Callable[[], Any], asyncio.Future[Any]]] = []
+
+    @property
+    def repository(self) -> PathType:
+        return self.engine.repository
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None
+    ) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Wait for the running operations to finish and stop the threads."""
+        await asyncio.to_thread(self._executor.shutdown)
+
+    async def _run[**P, T](self, function: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(function, *args, **kwargs)
+        )
+
+    def _batched[T](self, function: Callable[[], T]) -> asyncio.Future[T]:
+        """Run `function` in the pool along with the other small operations issued in this turn of the event loop."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[T] = loop.create_future()
+        self._pending.append((function, future))
+        if len(self._pending) == 1:
+            loop.call_soon(self._flush, loop)
+        return future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), MAX_BATCH_SIZE):
+            batch = pending[start : start + MAX_BATCH_SIZE]
+            functions = [function for function, _ in batch]
+            futures = [future for _, future in batch]
+            done = loop.run_in_executor(self._executor, _run_batch, functions)
+            done.add_done_callback(functools.partial(_settle, futures))
+
+    async def write_bytes_to_path(self, path: pathlib.Path, data: bytes) -> int:
+        if len(data) <= SMALL_OPERATION_SIZE:
+            return await self._batched(lambda: self.engine.write_bytes_to_path(path, data))
+        return await self._run(self.engine.write_bytes_to_path, path, data)
+
+    async def write_stream_with_digest(
+        self,
+        path: pathlib.Path,
+        chunks: Iterable[bytes] | AsyncIterable[bytes],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        algorithm: str | None = None,
+    ) -> WriteResult:
+        loop = asyncio.get_running_loop()
+        feed: asyncio.Queue[bytes | object | None] = asyncio.Queue(STREAM_QUEUE_SIZE)
+        writing = _run_in_thread(
+            self.engine.write_stream_with_digest, path, _receive(loop, feed), chunk_size, algorithm
+        )
+
+        async def send(item: bytes | None) -> None:
+            sending = asyncio.ensure_future(feed.put(item))
+            # Once the engine has failed, nothing takes from the queue any more.
+            waiting: set[asyncio.Future[Any]] = {sending, writing}
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if not sending.done():
+                sending.cancel()
+                writing.result()
+
+        try:
+            async for chunk in _coalesce(chunks, chunk_size):
+                await send(chunk)
+            await send(None)
+        except BaseException:
+            if not writing.done():
+                # The engine is waiting for a chunk, or will be once it has written those queued.
+                while not feed.empty():
+                    feed.get_nowait()
+                feed.put_nowait(_ABORTED)
+            with contextlib.suppress(BaseException):
+                await writing
+            raise
+        return await writing
+
+    async def read_bytes_from_path(self, path: pathlib.Path) -> bytes:
+        return await self._run(self.engine.read_bytes_from_path, path)
+
+    async def read_range(self, path: pathlib.Path, offset: int, length: int) -> memoryview:
+        if length <= SMALL_OPERATION_SIZE:
+            return await self._batched(lambda: self.engine.read_range(path, offset, length))
+        return await self._run(self.engine.read_range, path, offset, length)
+
+    async def iter_path(self, path: pathlib.Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        manager, reader = await self._run(_enter, self.engine.open_reader, path)
+        reading = asyncio.ensure_future(self._run(reader.read, chunk_size))
+        try:
+            while chunk := await reading:
+                reading = asyncio.ensure_future(self._run(reader.read, chunk_size))
+                yield chunk
+        finally:
+            # The file must not be closed while the read ahead is still using it.
+            with contextlib.suppress(BaseException):
+                await reading
+            await self._run(manager.__exit__, None, None, None)
+
+    async def exists(self, path: pathlib.Path) -> bool:
+        return await self._batched(lambda: self.engine.exists(path))
+
+    async def delete_path(self, path: pathlib.Path) -> None:
+        await self._batched(lambda: self.engine.delete_path(path))
+
+
+def _enter[T](
+    open_: Callable[[pathlib.Path], contextlib.AbstractContextManager[T]], path: pathlib.Path
+) -> tuple[contextlib.AbstractContextManager[T], T]:
+    """Open `path` and enter the context manager, both of which may block."""
+    manager = open_(path)
+    return manager, manager.__enter__()
+
+
+def _run_in_thread[**P, T](function: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> asyncio.Future[T]:
+    """Run `function` in a new thread, outside the pool."""
+    done: concurrent.futures.Future[T] = concurrent.futures.Future()
+
+    def run() -> None:
+        if not done.set_running_or_notify_cancel():
+            return
+        try:
+            done.set_result(function(*args, **kwargs))
+        except BaseException as e:
+            done.set_exception(e)
+
+    threading.Thread(target=run, name="storage-stream").start()
+    return asyncio.wrap_future(done)
+
+
+def _receive(loop: asyncio.AbstractEventLoop, feed: asyncio.Queue[bytes | object | None]) -> Iterator[bytes]:
+    """In the writing thread, yield the chunks put on `feed` in the event loop `loop` until the end of the stream."""
+    while True:
+        item = asyncio.run_coroutine_threadsafe(feed.get(), loop).result()
+        if item is None:
+            return
+        if item is _ABORTED:
+            raise _StreamAbortedError
+        yield cast(bytes, item)
+
+
+def _run_batch(functions: list[Callable[[], Any]]) -> list[tuple[bool, Any]]:
+    """Run `functions` in turn, returning for each whether it succeeded, and its result or exception."""
+    outcomes: list[tuple[bool, Any]] = []
+    for function in functions:
+        try:
+            outcomes.append((True, function()))
+        except Exception as e:
+            outcomes.append((False, e))
+    return outcomes
+
+
+def _settle(futures: list[asyncio.Future[Any]], done: asyncio.Future[list[tuple[bool, Any]]]) -> None:
+    """Pass the outcomes of a batch on to the futures of its operations."""
+    if done.cancelled() or done.exception() is not None:
+        error = done.exception() if not done.cancelled() else asyncio.CancelledError()
+        outcomes: list[tuple[bool, Any]] = [(False, error)] * len(futures)
+    else:
+        outcomes = done.result()
+    for future, (succeeded, value) in zip(futures, outcomes, strict=True):
+        if future.cancelled():
+            continue
+        if succeeded:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
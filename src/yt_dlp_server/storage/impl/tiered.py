@@ -0,0 +1,378 @@
+import concurrent.futures
+import contextlib
+import logging
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Literal
+
+from yt_dlp_server.storage.base import BaseStorageEngine
+from yt_dlp_server.storage.digest import WriteResult
+
+logger = logging.getLogger(__name__)
+
+type EvictionPolicy = Literal["lru", "lfu"]
+
+# How many locks the paths are spread over (see TieredStorageEngine._path_lock).
+PATH_LOCK_STRIPES = 64
+
+
+@dataclass
+class TierStats:
+    hits: int = 0
+    misses: int = 0
+    promotions: int = 0
+    demotions: int = 0
+    evictions: int = 0
+    # How much of the fast tier is in use.
+    resident_bytes: int = 0
+    # How much of that is not demoted yet.
+    dirty_bytes: int = 0
+
+
+@dataclass
+class _Resident:
+    size: int
+    hits: int = 0
+    # Bumped on every write, so a demotion can tell whether the file changed while it was being copied.
+    generation: int = 0
+    # Whether the file is only on the fast tier, and so must not be evicted.
+    dirty: bool = False
+
+
+class TieredStorageEngine[PathType](BaseStorageEngine[PathType]):
+    """
+    A small, fast storage engine used as a cache in front of a large, slow one.
+
+    Writes land on the fast tier and are copied to the slow tier (demoted) in
+    the background. Reads are served from the fast tier when the file is
+    there; otherwise the file is first copied to it (promoted), unless it is
+    larger than the whole fast tier. The fast tier is kept under `capacity`
+    bytes by evicting the least recently (``lru``) or least frequently
+    (``lfu``) read files. Files that have not been demoted yet are never
+    evicted, so the fast tier goes over capacity while the slow tier catches
+    up; set `max_dirty_bytes` to make writes wait for demotions instead of
+    letting the fast tier grow without bound.
+
+    The slow tier holds every file, and is the repository of the engine. The
+    fast tier is treated as empty when the engine is created, so call
+    :meth:`close` (or :meth:`flush`) before discarding an engine, or
+    writes still waiting to be demoted are lost.
+    """
+
+    def __init__(
+        self,
+        fast: BaseStorageEngine[Any],
+        slow: BaseStorageEngine[PathType],
+        capacity: int,
+        policy: EvictionPolicy = "lru",
+        demotion_workers: int = 1,
+        max_dirty_bytes: int | None = None,
+    ) -> None:
+        """
+        :param fast: The cache tier.
+        :param slow: The tier that keeps every file.
+        :param capacity: How many bytes the fast tier holds.
+        :param policy: Which files are evicted from the fast tier first.
+        :param demotion_workers: How many files are copied to the slow tier at once.
+        :param max_dirty_bytes: If set, new writes wait while more than this many bytes are not demoted yet, so the
+            fast tier holds at most `capacity` plus this plus the writes in flight. Unbounded by default.
+        """
+        if capacity < 0:
+            raise ValueError("capacity must not be negative")
+        if max_dirty_bytes is not None and max_dirty_bytes < 0:
+            raise ValueError("max_dirty_bytes must not be negative")
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.fast = fast
+        self.slow = slow
+        self.capacity = capacity
+        self.policy = policy
+        self.max_dirty_bytes = max_dirty_bytes
+        self._lock = threading.Lock()
+        # Notified whenever a demotion finishes, or a file not demoted yet is deleted.
+        self._demoted = threading.Condition(self._lock)
+        self._path_locks = [threading.Lock() for _ in range(PATH_LOCK_STRIPES)]
+        # In order of last access, least recent first.
+        self._resident: OrderedDict[pathlib.Path, _Resident] = OrderedDict()
+        self._demotions: dict[pathlib.Path, concurrent.futures.Future[None]] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(demotion_workers, thread_name_prefix="demote")
+        self._stats = TierStats()
+
+    @property
+    def repository(self) -> PathType:
+        return self.slow.repository
+
+    @property
+    def digest_algorithm(self) -> str:
+        return self.fast.digest_algorithm
+
+    def canonicalize_path(self, path: pathlib.Path) -> PathType:
+        return self.slow.canonicalize_path(path)
+
+    def stats(self) -> TierStats:
+        with self._lock:
+            return TierStats(**vars(self._stats))
+
+    def _path_lock(self, path: pathlib.Path) -> threading.Lock:
+        """
+        Return the lock that orders promoting, writing and deleting `path`, so
+        that a promotion never overwrites a newer write on the fast tier or
+        brings back a deleted file. Paths share a fixed number of locks.
+        """
+        return self._path_locks[hash(path) % PATH_LOCK_STRIPES]
+
+    def flush(self) -> None:
+        """
+        Wait until every file written so far has been demoted, retrying demotions that failed.
+
+        :raises OSError: If some files still could not be demoted.
+        """
+        with self._lock:
+            for path, resident in self._resident.items():
+                if resident.dirty and path not in self._demotions:
+                    self._schedule_demotion(path, resident.generation)
+        while True:
+            with self._lock:
+                pending = list(self._demotions.values())
+            if not pending:
+                break
+            concurrent.futures.wait(pending)
+        with self._lock:
+            failed = sum(resident.dirty for resident in self._resident.values())
+        if failed:
+            raise OSError(f"{failed} files could not be demoted to the slow tier")
+
+    def close(self) -> None:
+        """Demote the files still only on the fast tier, and stop the demotion threads."""
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+
+    def _schedule_demotion(self, path: pathlib.Path, generation: int) -> None:
+        # Called with the lock held.
+        self._demotions[path] = self._executor.submit(self._demote, path, generation)
+
+    def _demote(self, path: pathlib.Path, generation: int) -> None:
+        try:
+            with self.fast.open_reader(path) as reader:
+                self.slow.write_stream_to_path(path, reader)
+            succeeded = True
+        except Exception:
+            logger.exception("Failed to demote %s to the slow tier", path)
+            succeeded = False
+        evicted: list[pathlib.Path] = []
+        with self._lock:
+            del self._demotions[path]
+            self._demoted.notify_all()
+            resident = self._resident.get(path)
+            if resident is None:
+                # Deleted while it was being copied.
+                return
+            if resident.generation != generation:
+                # Written again while it was being copied; only one copy of a path runs at a time.
+                self._schedule_demotion(path, resident.generation)
+                return
+            if succeeded:
+                resident.dirty = False
+                self._stats.dirty_bytes -= resident.size
+                self._stats.demotions += 1
+                evicted = self._evict()
+        self._delete_evicted(evicted)
+
+    def _admit(self, path: pathlib.Path, size: int, dirty: bool) -> int:
+        """Record that `path` is on the fast tier, and return its generation. Called with the lock held."""
+        previous = self._resident.pop(path, None)
+        resident = _Resident(size, dirty=dirty)
+        if previous is not None:
+            self._stats.resident_bytes -= previous.size
+            if previous.dirty:
+                self._stats.dirty_bytes -= previous.size
+            resident.hits = previous.hits
+            resident.generation = previous.generation + 1
+        self._resident[path] = resident
+        self._stats.resident_bytes += size
+        if dirty:
+            self._stats.dirty_bytes += size
+        return resident.generation
+
+    def _evict(self) -> list[pathlib.Path]:
+        """
+        Choose files to evict until the fast tier is within capacity, and return them. Called with the lock held;
+        pass the result to :meth:`_delete_evicted` once the lock is released.
+        """
+        evicted = []
+        while self._stats.resident_bytes > self.capacity:
+            candidates = [(path, resident) for path, resident in self._resident.items() if not resident.dirty]
+            if not candidates:
+                break
+            if self.policy == "lfu":
+                # min() keeps the first of equal candidates, so ties go to the least recently used.
+                path, resident = min(candidates, key=lambda candidate: candidate[1].hits)
+            else:
+                path, resident = candidates[0]
+            del self._resident[path]
+            self._stats.resident_bytes -= resident.size
+            self._stats.evictions += 1
+            evicted.append(path)
+        return evicted
+
+    def _delete_evicted(self, paths: list[pathlib.Path]) -> None:
+        """Delete evicted files from the fast tier. Called without any lock held."""
+        for path in paths:
+            with self._path_lock(path):
+                with self._lock:
+                    if path in self._resident:
+                        # Written or promoted again since it was evicted.
+                        continue
+                try:
+                    self.fast.delete_path(path)
+                except OSError:
+                    logger.exception("Failed to evict %s from the fast tier", path)
+
+    def _wait_for_demotions(self, max_dirty_bytes: int) -> None:
+        """
+        Wait until at most `max_dirty_bytes` are not demoted yet. Called with the lock held.
+
+        :raises OSError: If files that failed to be demoted take more than that; :meth:`flush` retries them.
+        """
+        while self._stats.dirty_bytes > max_dirty_bytes:
+            if not self._demotions:
+                raise OSError(f"{self._stats.dirty_bytes} bytes could not be demoted to the slow tier")
+            self._demoted.wait()
+
+    @contextlib.contextmanager
+    def open_writer(self, path: pathlib.Path) -> Iterator[BinaryIO]:
+        """
+        Write to the fast tier; the file is demoted to the slow tier in the background.
+
+        Waits first while more than `max_dirty_bytes` are not demoted yet.
+        """
+        if self.max_dirty_bytes is not None:
+            with self._lock:
+                self._wait_for_demotions(self.max_dirty_bytes)
+        manager = self.fast.open_writer(path)
+        f = manager.__enter__()
+        try:
+            yield f
+            size = f.tell()
+        except BaseException as e:
+            manager.__exit__(type(e), e, e.__traceback__)
+            raise
+        with self._path_lock(path):
+            with self._lock:
+                resident = self._resident.get(path)
+                if resident is not None and not resident.dirty:
+                    # So that it is not evicted, deleting the new file, between replacing it and admitting it.
+                    resident.dirty = True
+                    self._stats.dirty_bytes += resident.size
+            manager.__exit__(None, None, None)
+            with self._lock:
+                generation = self._admit(path, size, dirty=True)
+                # A demotion in flight demotes the file again when it sees the new generation.
+                if path not in self._demotions:
+                    self._schedule_demotion(path, generation)
+                evicted = self._evict()
+        # Only once the path lock is released, as a file evicted may share its stripe.
+        self._delete_evicted(evicted)
+
+    def write_bytes_to_path(self, path: pathlib.Path, data: bytes) -> int:
+        return self.write_stream_with_digest(path, [data]).size
+
+    def record_digest(self, path: pathlib.Path, result: WriteResult) -> None:
+        self.fast.record_digest(path, result)
+
+    def get_digest(self, path: pathlib.Path) -> WriteResult | None:
+        return self._read(path, lambda engine: engine.get_digest(path), promote=False)
+
+    def _touch(self, path: pathlib.Path) -> bool:
+        """Record a read of `path`, and return whether it is on the fast tier."""
+        with self._lock:
+            resident = self._resident.get(path)
+            if resident is None:
+                self._stats.misses += 1
+                return False
+            resident.hits += 1
+            self._resident.move_to_end(path)
+            self._stats.hits += 1
+            return True
+
+    def _promote(self, path: pathlib.Path) -> bool:
+        """Copy `path` from the slow tier to the fast tier, unless it would not fit. Return whether it was."""
+        with self._path_lock(path):
+            with self._lock:
+                if path in self._resident:
+                    # Written or promoted while waiting for the lock.
+                    return True
+            with self.slow.open_reader(path) as reader:
+                size = reader.seek(0, os.SEEK_END)
+                if size > self.capacity:
+                    return False
+                reader.seek(0)
+                self.fast.write_stream_to_path(path, reader)
+            with self._lock:
+                self._admit(path, size, dirty=False)
+                self._resident[path].hits = 1
+                self._stats.promotions += 1
+                evicted = self._evict()
+        # Only once the path lock is released, as a file evicted may share its stripe.
+        self._delete_evicted(evicted)
+        return True
+
+    def _read[T](self, path: pathlib.Path, read: Callable[[BaseStorageEngine[Any]], T], promote: bool = True) -> T:
+        """Call `read` with the tier to read `path` from, promoting it first if `promote` is set."""
+        if self._touch(path) or (promote and self._promote(path)):
+            try:
+                return read(self.fast)
+            except FileNotFoundError:
+                # Evicted just now; it is on the slow tier.
+                pass
+        return read(self.slow)
+
+    def read_bytes_from_path(self, path: pathlib.Path) -> bytes:
+        return self._read(path, lambda engine: engine.read_bytes_from_path(path))
+
+    def open_reader(self, path: pathlib.Path) -> contextlib.AbstractContextManager[BinaryIO]:
+        return self._read(path, lambda engine: _opened(engine.open_reader(path)))
+
+    def read_range(self, path: pathlib.Path, offset: int, length: int) -> memoryview:
+        return self._read(path, lambda engine: engine.read_range(path, offset, length))
+
+    def exists(self, path: pathlib.Path) -> bool:
+        with self._lock:
+            if path in self._resident:
+                return True
+        return self.slow.exists(path)
+
+    def delete_path(self, path: pathlib.Path) -> None:
+        with self._path_lock(path):
+            with self._lock:
+                resident = self._resident.pop(path, None)
+                if resident is not None:
+                    self._stats.resident_bytes -= resident.size
+                    if resident.dirty:
+                        self._stats.dirty_bytes -= resident.size
+                        self._demoted.notify_all()
+                demotion = self._demotions.get(path)
+            if demotion is not None:
+                # Otherwise the demotion could store the file on the slow tier again after it is deleted.
+                concurrent.futures.wait([demotion])
+            self.fast.delete_path(path)
+            self.slow.delete_path(path)
+
+
+def _opened(manager: contextlib.AbstractContextManager[BinaryIO]) -> contextlib.AbstractContextManager[BinaryIO]:
+    """Enter `manager` now, so that a missing file raises here rather than when the caller enters it."""
+    stack = contextlib.ExitStack()
+    reader = stack.enter_context(manager)
+
+    @contextlib.contextmanager
+    def entered() -> Iterator[BinaryIO]:
+        with stack:
+            yield reader
+
+    return entered()
@@ -0,0 +1,130 @@
+"""
+A persistent index of the files in a :class:`LocalStorageEngine` repository.
+
+The index lets questions such as "which files does this job have" or "how big
+is its output" be answered with one query instead of walking and ``stat``-ing
+the repository. Files are indexed by their logical path, so the index is not
+affected by the repository's layout or by migrating it to another one.
+"""
+
+import pathlib
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+from yt_dlp_server.storage.digest import WriteResult
+
+
+@dataclass(frozen=True)
+class FileMetadata:
+    path: pathlib.PurePath
+    size: int
+    mtime: float
+    # The job the file belongs to: the first component of its path, if it has several.
+    job_id: str | None
+    digest: WriteResult | None
+
+
+def _key(path: pathlib.PurePath) -> str:
+    key = path.as_posix()
+    return "" if key == "." else key
+
+
+class MetadataIndex:
+    """
+    An SQLite table of the stored files: their size, modification time,
+    digest and owner job.
+
+    The index can be used from several threads at once.
+    """
+
+    def __init__(self, database: pathlib.Path | str) -> None:
+        """
+        :param database: The SQLite database file, which is created if it does not exist.
+        """
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self._lock, self.connection:
+            # Readers never wait for the writers in the worker threads, and commits need no fsync.
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS file (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    job_id TEXT,
+                    algorithm TEXT,
+                    digest TEXT
+                )
+            """
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS file_job_id ON file (job_id)")
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
+
+    def put(self, path: pathlib.PurePath, size: int, mtime: float, digest: WriteResult | None = None) -> None:
+        """Record the relative, logical `path`, replacing what was recorded for it."""
+        job_id = path.parts[0] if len(path.parts) > 1 else None
+        algorithm, hexdigest = (digest.algorithm, digest.digest) if digest is not None else (None, None)
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO file (path, size, mtime, job_id, algorithm, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                (_key(path), size, mtime, job_id, algorithm, hexdigest),
+            )
+
+    def set_digest(self, path: pathlib.PurePath, digest: WriteResult) -> bool:
+        """Record the digest of `path`, keeping the rest of its record. Return whether it was recorded."""
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE file SET algorithm = ?, digest = ? WHERE path = ?",
+                (digest.algorithm, digest.digest, _key(path)),
+            )
+        return cursor.rowcount > 0
+
+    def remove(self, path: pathlib.PurePath) -> None:
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM file WHERE path = ?", (_key(path),))
+
+    def clear(self) -> None:
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM file")
+
+    def get(self, path: pathlib.PurePath) -> FileMetadata | None:
+        with self._lock:
+            row = self.connection.execute("SELECT * FROM file WHERE path = ?", (_key(path),)).fetchone()
+        if row is None:
+            return None
+        digest = WriteResult(row["size"], row["algorithm"], row["digest"]) if row["digest"] is not None else None
+        return FileMetadata(pathlib.PurePath(row["path"]), row["size"], row["mtime"], row["job_id"], digest)
+
+    def exists(self, path: pathlib.PurePath) -> bool:
+        with self._lock:
+            return self.connection.execute("SELECT 1 FROM file WHERE path = ?", (_key(path),)).fetchone() is not None
+
+    def _under(self, prefix: pathlib.PurePath) -> tuple[str, tuple[str, ...]]:
+        """Return a WHERE clause matching `prefix` and the paths under it, and its parameters."""
+        key = _key(prefix)
+        if not key:
+            return "1", ()
+        # A range over the primary key rather than LIKE, which SQLite could not answer from the index.
+        # "0" is the character after "/", so the range holds exactly the paths starting with key + "/".
+        return "(path = ? OR (path >= ? AND path < ?))", (key, f"{key}/", f"{key}0")
+
+    def list_paths(self, prefix: pathlib.PurePath = pathlib.PurePath()) -> list[pathlib.PurePath]:
+        """Return the paths that are `prefix` or under it, in order. An empty `prefix` lists every path."""
+        where, parameters = self._under(prefix)
+        with self._lock:
+            rows = self.connection.execute(f"SELECT path FROM file WHERE {where} ORDER BY path", parameters).fetchall()
+        return [pathlib.PurePath(row["path"]) for row in rows]
+
+    def total_size(self, prefix: pathlib.PurePath = pathlib.PurePath()) -> int:
+        """Return the total size of the paths that are `prefix` or under it."""
+        where, parameters = self._under(prefix)
+        with self._lock:
+            row = self.connection.execute(f"SELECT TOTAL(size) FROM file WHERE {where}", parameters).fetchone()
+        return int(row[0])
@@ -0,0 +1,199 @@
+"""
+Directory layouts for :class:`LocalStorageEngine` repositories.
+
+A layout maps the paths callers use (logical paths) to where the files are
+kept in the repository (physical paths). :class:`FlatLayout` keeps them as
+they are. :class:`ShardedLayout` fans them out into hashed subdirectories, so
+no directory grows past a few thousand entries however many files are stored.
+
+:func:`migrate_layout` moves an existing repository from one layout to
+another while it is in use; run it as ``python -m yt_dlp_server.storage.layout``.
+"""
+
+import abc
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sys
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from typing import ClassVar
+
+# Directories at the top of a repository that hold the storage engines' own
+# files, which are not laid out.
+CAS_DIR = ".cas"
+DIGESTS_DIR = ".digests"
+INDEX_DIR = ".index"
+INTERNAL_DIRS = (CAS_DIR, DIGESTS_DIR, INDEX_DIR)
+
+
+class Layout(abc.ABC):
+    # Whether every path is a valid physical path in this layout, so that a file
+    # fitting it says nothing about whether the file was laid out by it.
+    catch_all: ClassVar[bool] = False
+
+    @abc.abstractmethod
+    def physical(self, path: pathlib.PurePath) -> pathlib.PurePath:
+        """Return where the relative, logical `path` is kept, relative to the repository."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def logical(self, path: pathlib.PurePath) -> pathlib.PurePath | None:
+        """
+        Return the logical path kept at the relative, physical `path`, or None
+        if this layout would not put any file there.
+        """
+        raise NotImplementedError
+
+    def contains(self, path: pathlib.PurePath) -> bool:
+        """Return whether this layout could have put a file at the relative, physical `path`."""
+        logical = self.logical(path)
+        return logical is not None and self.physical(logical) == path
+
+
+@dataclass(frozen=True)
+class FlatLayout(Layout):
+    """Keeps every file at its logical path."""
+
+    catch_all: ClassVar[bool] = True
+
+    def physical(self, path: pathlib.PurePath) -> pathlib.PurePath:
+        return path
+
+    def logical(self, path: pathlib.PurePath) -> pathlib.PurePath | None:
+        return path
+
+
+@dataclass(frozen=True)
+class ShardedLayout(Layout):
+    """
+    Keeps every file under `levels` directories named after a hash of its logical path.
+
+    With the defaults, ``job/video.mp4`` is kept at ``3f/a2/job/video.mp4``:
+    two levels of 256 directories each, so 65536 leaf directories.
+    """
+
+    levels: int = 2
+    width: int = 2
+
+    def __post_init__(self) -> None:
+        if self.levels < 1 or not 1 <= self.width <= 8:
+            raise ValueError("levels must be at least 1 and width between 1 and 8")
+
+    def _shards(self, path: pathlib.PurePath) -> list[str]:
+        digest = hashlib.md5(path.as_posix().encode(), usedforsecurity=False).hexdigest()
+        return [digest[i * self.width : (i + 1) * self.width] for i in range(self.levels)]
+
+    def physical(self, path: pathlib.PurePath) -> pathlib.PurePath:
+        return pathlib.PurePath(*self._shards(path), path)
+
+    def logical(self, path: pathlib.PurePath) -> pathlib.PurePath | None:
+        if len(path.parts) <= self.levels:
+            return None
+        logical = pathlib.PurePath(*path.parts[self.levels :])
+        return logical if list(path.parts[: self.levels]) == self._shards(logical) else None
+
+
+def parse_layout(spec: str) -> Layout:
+    """
+    Parse a layout from ``flat`` or ``sharded:<levels>x<width>``, such as ``sharded:2x2``.
+
+    :raises ValueError: If `spec` is not a layout.
+    """
+    if spec == "flat":
+        return FlatLayout()
+    if spec == "sharded":
+        return ShardedLayout()
+    match = re.fullmatch(r"sharded:(\d+)x(\d+)", spec)
+    if match is None:
+        raise ValueError(f"Unknown layout: {spec}")
+    return ShardedLayout(levels=int(match[1]), width=int(match[2]))
+
+
+@dataclass
+class MigrationStats:
+    moved: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+
+def stored_files(repository: pathlib.Path) -> list[pathlib.PurePath]:
+    """Return the relative paths of the stored files, leaving out internal directories and temporary files."""
+    files = []
+    for root, dirs, names in os.walk(repository):
+        if pathlib.Path(root) == repository:
+            dirs[:] = [name for name in dirs if name not in INTERNAL_DIRS]
+        relative_root = pathlib.Path(root).relative_to(repository)
+        for name in names:
+            if not (name.startswith(".") and name.endswith(".tmp")):
+                files.append(pathlib.PurePath(relative_root, name))
+    return files
+
+
+def _remove_empty_parents(repository: pathlib.Path, path: pathlib.Path) -> None:
+    for parent in path.parents:
+        if parent == repository or not parent.is_relative_to(repository):
+            return
+        try:
+            parent.rmdir()
+        except OSError:
+            return
+
+
+def migrate_layout(repository: pathlib.Path, source: Layout, target: Layout, dry_run: bool = False) -> MigrationStats:
+    """
+    Move every file of `repository` from the `source` layout to the `target` layout.
+
+    Each file is moved with a single rename, along with its recorded digest,
+    so the repository stays usable throughout as long as its engines were
+    created with ``layout=target, previous_layout=source``: they find every
+    file in one layout or the other. Files already in the target layout are
+    skipped, so an interrupted migration can simply be run again. Directories
+    that are left empty are removed.
+    """
+    stats = MigrationStats()
+    digests = repository / DIGESTS_DIR
+    for physical in stored_files(repository):
+        logical = source.logical(physical)
+        # A file that fits both layouts has already been moved, unless the target takes any path.
+        if logical is None or not source.contains(physical) or (target.contains(physical) and not target.catch_all):
+            stats.skipped += 1
+            continue
+        destination = target.physical(logical)
+        if dry_run:
+            stats.moved += 1
+            continue
+        try:
+            (repository / destination).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(repository / physical, repository / destination)
+        except OSError:
+            stats.failed += 1
+            continue
+        stats.moved += 1
+        digest = digests / f"{physical}.json"
+        if digest.exists():
+            (digests / f"{destination}.json").parent.mkdir(parents=True, exist_ok=True)
+            os.replace(digest, digests / f"{destination}.json")
+            _remove_empty_parents(digests, digest)
+        _remove_empty_parents(repository, repository / physical)
+    return stats
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Move a local storage repository to another directory layout.")
+    parser.add_argument("repository", type=pathlib.Path, help="The repository to migrate.")
+    parser.add_argument("--from", dest="source", default="flat", help="The current layout. Defaults to flat.")
+    parser.add_argument("--to", dest="target", default="sharded:2x2", help="The new layout. Defaults to sharded:2x2.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the files that would be moved.")
+    args = parser.parse_args(argv)
+    stats = migrate_layout(args.repository, parse_layout(args.source), parse_layout(args.target), args.dry_run)
+    json.dump(asdict(stats), sys.stdout)
+    sys.stdout.write("\n")
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
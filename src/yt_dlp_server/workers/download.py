@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import pathlib
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from yt_dlp_server.workers.info_cache import InfoCache
+from yt_dlp_server.workers.progress import ProgressHook
+from yt_dlp_server.workers.ytdl_pool import YoutubeDLPool
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+Downloader = Callable[[str, "YtDlpSettings", pathlib.Path], None]
+
+# Postprocessor phases that run after a file has been downloaded.
+POSTPROCESS_PHASES = ("post_process", "after_move")
+
+# Per-process pool: executor processes each get their own after fork/spawn.
+YTDL_POOL = YoutubeDLPool()
+INFO_CACHE = InfoCache()
+
+
+def download(
+    url: str, settings: YtDlpSettings, output_dir: pathlib.Path, progress_hook: ProgressHook | None = None
+) -> None:
+    """
+    Download `url` with a pooled `yt_dlp.YoutubeDL` into `output_dir`.
+
+    The metadata of `url` is reused from :data:`INFO_CACHE` when possible. Any
+    ``paths`` from `settings` are redirected into `output_dir`; the caller is
+    responsible for moving the results into storage. This function is run inside
+    worker executors, so it must stay picklable and take only picklable arguments.
+
+    :param url: The URL to download.
+    :param settings: The settings to configure YoutubeDL with.
+    :param output_dir: The scratch directory to download into.
+    :param progress_hook: Called with yt-dlp's progress events. Only usable with thread executors.
+    :raises yt_dlp.utils.DownloadError: If the download fails.
+    """
+    from yt_dlp.utils import DownloadError
+
+    with YTDL_POOL.lease(settings, _output_overrides(settings, output_dir)) as ydl:
+        if progress_hook is not None:
+            ydl.add_progress_hook(progress_hook)
+        try:
+            ydl.process_ie_result(_extract_unprocessed(ydl, url, settings), download=True)
+        except DownloadError:
+            # The cached media URLs may have been rejected; extract afresh next time.
+            INFO_CACHE.invalidate(url, settings)
+            raise
+
+
+def extract(url: str, settings: YtDlpSettings) -> dict[str, Any]:
+    """
+    Extract the metadata for `url` without downloading anything, reusing
+    :data:`INFO_CACHE` when possible.
+
+    :return: The processed info dict, for :func:`download_info`. It is not
+        sanitized: values JSON cannot represent, such as the callable
+        ``fragments`` of some formats, are what the download needs. Pass it
+        through ``YoutubeDL.sanitize_info`` before persisting it.
+    """
+    with YTDL_POOL.lease(settings) as ydl:
+        info: dict[str, Any] = ydl.process_ie_result(_extract_unprocessed(ydl, url, settings), download=False)
+        return info
+
+
+def download_info(
+    info: dict[str, Any],
+    settings: YtDlpSettings,
+    output_dir: pathlib.Path,
+    progress_hook: ProgressHook | None = None,
+) -> dict[str, Any]:
+    """
+    Download the media described by `info` into `output_dir`, without running
+    the post-download postprocessors (see :func:`postprocess_info`).
+
+    :param progress_hook: Called with yt-dlp's progress events.
+    :return: The processed info dict, including ``requested_downloads``.
+    """
+    from yt_dlp.utils import DownloadError
+
+    with YTDL_POOL.lease(settings, _output_overrides(settings, output_dir), POSTPROCESS_PHASES) as ydl:
+        if progress_hook is not None:
+            ydl.add_progress_hook(progress_hook)
+        try:
+            result: dict[str, Any] = ydl.process_ie_result(info, download=True)
+        except DownloadError:
+            if info.get("original_url"):
+                INFO_CACHE.invalidate(info["original_url"], settings)
+            raise
+        return result
+
+
+def postprocess_info(info: dict[str, Any], settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+    """Run the post-download postprocessors over the files downloaded by :func:`download_info`."""
+    with YTDL_POOL.lease(settings, _output_overrides(settings, output_dir)) as ydl:
+        for requested in info.get("requested_downloads") or []:
+            ydl.post_process(requested["filepath"], requested)
+
+
+def _extract_unprocessed(ydl: Any, url: str, settings: YtDlpSettings) -> dict[str, Any]:
+    """
+    Return the unprocessed info dict for `url`, from :data:`INFO_CACHE` if it
+    has one. Single videos are cached before format selection, so a changed
+    ``format`` reuses the entry; playlists and redirects are not cached.
+    """
+    cached = INFO_CACHE.get(url, settings)
+    if cached is not None:
+        return cached
+    ie_result: dict[str, Any] = ydl.extract_info(url, download=False, process=False)
+    if ie_result.get("_type", "video") == "video":
+        # Private keys (such as the post-extractors) belong to this extraction.
+        INFO_CACHE.put(url, settings, {k: v for k, v in ie_result.items() if not k.startswith("__")})
+    return ie_result
+
+
+def _output_overrides(settings: YtDlpSettings, output_dir: pathlib.Path) -> dict[str, Any]:
+    return {"paths": {**settings.paths, "home": str(output_dir), "temp": str(output_dir)}}
+
+
+def collect_outputs(output_dir: pathlib.Path) -> list[pathlib.Path]:
+    """
+    List the finished files under `output_dir`, relative to it.
+
+    Partial downloads (``.part`` and ``.ytdl`` files) are skipped.
+    """
+    return sorted(
+        path.relative_to(output_dir)
+        for path in output_dir.rglob("*")
+        if path.is_file() and path.suffix not in (".part", ".ytdl")
+    )
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import itertools
+import logging
+from collections.abc import Callable, Iterable, Iterator
+from typing import TYPE_CHECKING, Any
+
+from yt_dlp_server.db.base import BaseDB
+from yt_dlp_server.db.models import Task as DBTask
+from yt_dlp_server.workers.download import YTDL_POOL
+from yt_dlp_server.workers.queue.base import BaseQueue
+from yt_dlp_server.workers.task import Task
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+logger = logging.getLogger(__name__)
+
+EntryLister = Callable[[str, "YtDlpSettings"], Iterable[str]]
+
+# Guards against extractors that redirect in a loop.
+MAX_REDIRECTS = 10
+
+
+def walk_entries(ydl: Any, ie_result: dict[str, Any], depth: int = 0) -> Iterator[str]:
+    """
+    Yield the URL of every entry in an unprocessed `ie_result`, lazily.
+
+    Entries are consumed as the extractor produces them, page by page; only
+    a paged list keeps the flat entries of the pages it has fetched. Nested
+    playlists are walked recursively and redirects (``url`` results) are
+    followed.
+
+    :param ydl: The YoutubeDL instance that produced `ie_result`.
+    :param ie_result: A result of ``extract_info(..., process=False)``.
+    """
+    from yt_dlp.utils import PagedList
+
+    result_type = ie_result.get("_type", "video")
+    if result_type in ("url", "url_transparent"):
+        if depth >= MAX_REDIRECTS:
+            raise RuntimeError(f"Too many redirects while listing {ie_result['url']}")
+        redirected = ydl.extract_info(ie_result["url"], download=False, process=False, ie_key=ie_result.get("ie_key"))
+        yield from walk_entries(ydl, redirected, depth + 1)
+    elif result_type in ("playlist", "multi_video"):
+        # Not `or []`: truth-testing a PagedList fetches (and caches) its first page.
+        entries = ie_result.get("entries")
+        if entries is None:
+            entries = []
+        elif isinstance(entries, PagedList):
+            entries = _paged_entries(entries)
+        for entry in entries:
+            if entry is None:
+                continue
+            if entry.get("_type") in ("playlist", "multi_video"):
+                yield from walk_entries(ydl, entry, depth)
+            else:
+                url = entry.get("webpage_url") or entry.get("url")
+                if url:
+                    yield url
+    else:
+        yield ie_result.get("webpage_url") or ie_result["url"]
+
+
+def _paged_entries(entries: Any) -> Iterator[Any]:
+    """Yield the entries of a PagedList, fetching each page only once it is reached."""
+    from yt_dlp.utils import PagedList
+
+    for index in itertools.count():
+        try:
+            yield entries[index]
+        except PagedList.IndexError:
+            return
+
+
+def list_entries(url: str, settings: YtDlpSettings) -> Iterator[str]:
+    """Stream the entry URLs of the playlist or channel at `url` using flat extraction."""
+    with YTDL_POOL.lease(settings, {"extract_flat": "in_playlist"}) as ydl:
+        ie_result = ydl.extract_info(url, download=False, process=False)
+        yield from walk_entries(ydl, ie_result)
+
+
+def fan_out(
+    url: str,
+    job_id: str,
+    db: BaseDB[Any],
+    queue: BaseQueue,
+    settings: YtDlpSettings | None = None,
+    chunk_size: int = 500,
+    lister: EntryLister = list_entries,
+    overrides: dict[str, Any] | None = None,
+) -> int:
+    """
+    Turn a playlist or channel URL into one :class:`Task` per entry.
+
+    Entries are listed as the extractor pages through them; every `chunk_size`
+    entries are added to `db` in one transaction under `job_id` and put on
+    `queue` straight away, so workers can start downloading early entries while
+    later pages are still being listed. Memory use is bounded by the chunk size
+    rather than the length of the playlist. Entries that already have a task
+    (for example when a fan-out is resumed) are neither added nor enqueued.
+    Tasks are added unclaimed, so whichever worker dequeues one can claim it.
+
+    :param url: The playlist or channel URL.
+    :param job_id: The job the tasks belong to.
+    :param db: Where the tasks are recorded.
+    :param queue: Where the tasks are enqueued.
+    :param settings: The yt-dlp settings used for listing. Defaults to the global settings.
+    :param chunk_size: The number of entries inserted per transaction.
+    :param lister: Streams entry URLs for a URL. Defaults to flat extraction through yt-dlp.
+    :param overrides: The job's overrides of the settings. They are used for
+        listing, and carried by every task (see :func:`derive_settings`).
+    :return: The number of tasks added.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    from yt_dlp_server.config import derive_settings
+
+    settings = derive_settings(overrides, settings)
+    added = 0
+    entries = iter(lister(url, settings))
+    while chunk := list(itertools.islice(entries, chunk_size)):
+        new_tasks = db.add_tasks(DBTask(job_id=job_id, url=entry) for entry in chunk)
+        for task in new_tasks:
+            queue.put(Task(url=task.url, job_id=task.job_id, settings=overrides))
+        added += len(new_tasks)
+        logger.debug("Fanned out %d entries of %s (%d new so far)", len(chunk), url, added)
+    return added
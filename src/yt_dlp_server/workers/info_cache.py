@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import collections
+import functools
+import hashlib
+import json
+import threading
+import time
+import urllib.parse
+import zlib
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+# The settings that can change what an extractor returns. Format selection,
+# output and post-processing settings are applied after extraction, so changing
+# them reuses the cached info dict.
+EXTRACTION_FIELDS = (
+    "use_extractors",
+    "default_search",
+    "live_from_start",
+    "compat_options",
+    "proxy",
+    "socket_timeout",
+    "source_address",
+    "force_ip",
+    "enable_file_urls",
+    "geo_verification_proxy",
+    "geo_bypass",
+    "geo_bypass_country",
+    "geo_bypass_ip_block",
+    "cookiefile",
+    "cookiesfrombrowser",
+    "no_check_certificate",
+    "prefer_insecure",
+    "user_agent",
+    "referer",
+    "http_headers",
+    "username",
+    "password",
+    "twofactor",
+    "usenetrc",
+    "netrc_location",
+    "videopassword",
+    "ap_mso",
+    "ap_username",
+    "ap_password",
+    "client_certificate",
+    "client_certificate_key",
+    "client_certificate_password",
+    "extractor_args",
+    "youtube_include_dash_manifest",
+    "youtube_include_hls_manifest",
+)
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Stands in, in the JSON of a cached info dict, for a value that JSON cannot represent.
+_OPAQUE_KEY = "__info_cache_opaque__"
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize `url` for use as a cache key.
+
+    The scheme and host are lowercased, default ports and fragments are dropped
+    and query parameters are sorted.
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port is not None and parts.port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def cache_key(url: str, settings: YtDlpSettings) -> str:
+    """Return the cache key for `url` extracted with `settings`."""
+    relevant = settings.model_dump_json(include=set(EXTRACTION_FIELDS))
+    return hashlib.sha256(f"{normalize_url(url)}\n{relevant}".encode()).hexdigest()
+
+
+def media_url_expiry(url: str) -> float | None:
+    """
+    Return when the signed media `url` expires, as a Unix timestamp.
+
+    Understands the ``expire`` parameter used by YouTube, ``Expires`` used by
+    CloudFront and S3 query-string authentication, and ``X-Amz-Date`` with
+    ``X-Amz-Expires`` used by S3 signature version 4.
+
+    :return: The expiry time, or `None` if `url` carries none.
+    """
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    # YouTube also puts `expire` in the path, as /expire/<timestamp>/.
+    segments = urllib.parse.urlsplit(url).path.split("/")
+    try:
+        for name in ("expire", "Expires"):
+            if name in query:
+                return float(query[name][0])
+        if "expire" in segments[:-1]:
+            return float(segments[segments.index("expire") + 1])
+        if "X-Amz-Date" in query and "X-Amz-Expires" in query:
+            signed_at = datetime.strptime(query["X-Amz-Date"][0], "%Y%m%dT%H%M%SZ").replace(tzinfo=UTC)
+            return signed_at.timestamp() + float(query["X-Amz-Expires"][0])
+    except ValueError:
+        return None
+    return None
+
+
+def _media_urls(info: dict[str, Any]) -> Iterator[str]:
+    if isinstance(info.get("url"), str):
+        yield info["url"]
+    for fmt in info.get("formats") or []:
+        if isinstance(fmt, dict) and isinstance(fmt.get("url"), str):
+            yield fmt["url"]
+
+
+@dataclass
+class _Entry:
+    data: bytes
+    expires_at: float
+    # The values JSON cannot represent, referred to by their index in `data`.
+    opaque: list[Any]
+
+
+def _restore(opaque: list[Any], obj: dict[str, Any]) -> Any:
+    if len(obj) == 1 and isinstance(obj.get(_OPAQUE_KEY), int):
+        return opaque[obj[_OPAQUE_KEY]]
+    return obj
+
+
+@dataclass
+class InfoCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size: int = 0
+
+
+class InfoCache:
+    """
+    A size-bounded LRU cache of extracted info dicts.
+
+    Retries, re-submissions and format changes all need the metadata of a URL
+    that was extracted moments ago; extraction is often the slowest and most
+    rate-limited part of a task. Entries are keyed by :func:`cache_key`, so
+    settings that only affect format selection, output or post-processing share
+    an entry. Info dicts are stored as compressed JSON, and every :meth:`get`
+    returns a fresh copy that the caller is free to modify. Values that JSON
+    cannot represent, such as the callable ``fragments`` of some formats, are
+    kept as they are and shared between the copies; they do not count towards
+    `max_bytes`.
+
+    An entry expires after `ttl` seconds, or `expiry_margin` seconds before the
+    earliest signed media URL in it expires, whichever comes first. Info dicts
+    whose media URLs have already expired are not cached at all.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 900.0,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        expiry_margin: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        :param ttl: The number of seconds an entry stays fresh.
+        :param max_entries: The maximum number of entries.
+        :param max_bytes: The maximum total size of the compressed entries.
+        :param expiry_margin: How long, in seconds, before a media URL expires its entry is dropped.
+        :param clock: A wall clock returning Unix timestamps, replaceable for testing.
+        """
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("max_entries and max_bytes must be at least 1")
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._expiry_margin = expiry_margin
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[str, _Entry] = collections.OrderedDict()
+        self._size = 0
+        self._stats = InfoCacheStats()
+
+    def get(self, url: str, settings: YtDlpSettings) -> dict[str, Any] | None:
+        """
+        Return a copy of the cached info dict for `url`, or `None` if there is
+        no fresh entry.
+        """
+        key = cache_key(url, settings)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            if self._clock() >= entry.expires_at:
+                self._remove(key)
+                self._stats.expired += 1
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            data, opaque = entry.data, entry.opaque
+        info: dict[str, Any] = json.loads(zlib.decompress(data), object_hook=functools.partial(_restore, opaque))
+        return info
+
+    def put(self, url: str, settings: YtDlpSettings, info: dict[str, Any]) -> bool:
+        """
+        Cache `info` for `url`.
+
+        :return: Whether `info` was cached.
+        """
+        expires_at = self._clock() + self._ttl
+        for media_url in _media_urls(info):
+            media_expiry = media_url_expiry(media_url)
+            if media_expiry is not None:
+                expires_at = min(expires_at, media_expiry - self._expiry_margin)
+        if expires_at <= self._clock():
+            return False
+        opaque: list[Any] = []
+
+        def set_aside(value: Any) -> dict[str, int]:
+            opaque.append(value)
+            return {_OPAQUE_KEY: len(opaque) - 1}
+
+        data = zlib.compress(json.dumps(info, separators=(",", ":"), default=set_aside).encode())
+        if len(data) > self._max_bytes:
+            return False
+        key = cache_key(url, settings)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(data, expires_at, opaque)
+            self._size += len(data)
+            while len(self._entries) > self._max_entries or self._size > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats.evictions += 1
+        return True
+
+    def invalidate(self, url: str, settings: YtDlpSettings) -> None:
+        """Drop the entry for `url`, for example after its media URLs were rejected."""
+        with self._lock:
+            self._remove(cache_key(url, settings))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> InfoCacheStats:
+        with self._lock:
+            return InfoCacheStats(**{**vars(self._stats), "entries": len(self._entries), "size": self._size})
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.data)
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import logging
+import os
+import pathlib
+import queue
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from yt_dlp_server.db.base import BaseDB
+from yt_dlp_server.storage.base import BaseStorageEngine
+from yt_dlp_server.workers.download import download_info, extract, postprocess_info
+from yt_dlp_server.workers.pool import BaseWorkerPool, Job
+from yt_dlp_server.workers.queue.base import BaseQueue, EmptyError
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+logger = logging.getLogger(__name__)
+
+InfoDict = dict[str, Any]
+
+
+@dataclass(frozen=True)
+class Stages:
+    """The functions run by each stage of a :class:`PipelinedWorkerPool`."""
+
+    extract: Callable[[str, YtDlpSettings], InfoDict] = extract
+    download: Callable[[InfoDict, YtDlpSettings, pathlib.Path], InfoDict] = download_info
+    postprocess: Callable[[InfoDict, YtDlpSettings, pathlib.Path], None] = postprocess_info
+
+
+# Sentinel that tells a stage thread to exit.
+_STOP = object()
+
+
+class PipelinedWorkerPool(BaseWorkerPool):
+    """
+    Runs each :class:`Task` through separate extraction, download and
+    post-processing stages.
+
+    Metadata extraction is latency-bound, media download is bandwidth-bound and
+    ffmpeg post-processing is CPU-bound, so each stage has its own thread pool,
+    sized to its resource, and hands work to the next through a bounded queue.
+    While ffmpeg runs for one task, other tasks keep the network busy. A full
+    queue between stages applies backpressure to the stage before it, and the
+    pool stops taking new tasks once every stage and queue is occupied.
+
+    See :class:`BaseWorkerPool` for the bookkeeping.
+    """
+
+    def __init__(
+        self,
+        queue: BaseQueue,
+        db: BaseDB[Any],
+        storage: BaseStorageEngine[Any],
+        settings: YtDlpSettings | None = None,
+        extract_concurrency: int = 4,
+        download_concurrency: int = 4,
+        postprocess_concurrency: int | None = None,
+        stage_queue_size: int | None = None,
+        stages: Stages | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        :param extract_concurrency: The number of metadata extractions to run at once.
+        :param download_concurrency: The number of media downloads to run at once.
+        :param postprocess_concurrency: The number of post-processing runs at once.
+            Defaults to the number of CPU cores.
+        :param stage_queue_size: The capacity of the queues between stages.
+            Defaults to the concurrency of the stage being fed.
+        :param stages: The stage functions. Defaults to running yt-dlp.
+
+        The remaining parameters are described on :class:`BaseWorkerPool`.
+        """
+        if postprocess_concurrency is None:
+            postprocess_concurrency = os.cpu_count() or 1
+        concurrencies = (extract_concurrency, download_concurrency, postprocess_concurrency)
+        if min(concurrencies) < 1:
+            raise ValueError("Every stage needs a concurrency of at least 1")
+        if stage_queue_size is not None and stage_queue_size < 1:
+            raise ValueError("stage_queue_size must be at least 1")
+        super().__init__(queue, db, storage, settings, **kwargs)
+        self._concurrencies = concurrencies
+        self._stage_queue_sizes = tuple(
+            stage_queue_size if stage_queue_size is not None else concurrency for concurrency in concurrencies
+        )
+        self._stages = stages if stages is not None else Stages()
+
+    @property
+    def capacity(self) -> int:
+        """The number of tasks that can be in flight across all stages and queues."""
+        return sum(self._concurrencies) + sum(self._stage_queue_sizes)
+
+    def run(self, stop_when_idle: bool = False) -> None:
+        """
+        See :meth:`BaseWorkerPool.run`.
+        """
+        self._stopping.clear()
+        inboxes: list[queue.Queue[Any]] = [queue.Queue(maxsize=size) for size in self._stage_queue_sizes]
+        completions: queue.Queue[tuple[Job, BaseException | None]] = queue.Queue()
+
+        def run_extract(job: Job, _: Any) -> Any:
+            return self._stages.extract(job.task.url, job.settings)
+
+        def run_download(job: Job, info: InfoDict) -> Any:
+            return self._stages.download(info, job.settings, job.output_dir, **self._progress_kwargs(job))
+
+        def run_postprocess(job: Job, info: InfoDict) -> Any:
+            self._stages.postprocess(info, job.settings, job.output_dir)
+            return None
+
+        def finish(job: Job, _: Any) -> None:
+            completions.put((job, None))
+
+        outputs: list[Callable[[Job, Any], None]] = [
+            lambda job, result: inboxes[1].put((job, result)),
+            lambda job, result: inboxes[2].put((job, result)),
+            finish,
+        ]
+        steps = (run_extract, run_download, run_postprocess)
+        names = ("extract", "download", "postprocess")
+        threads = [
+            threading.Thread(
+                target=self._stage_worker,
+                args=(inboxes[i], steps[i], outputs[i], completions),
+                name=f"yt-dlp-server-{names[i]}-{n}",
+                daemon=True,
+            )
+            for i in range(len(steps))
+            for n in range(self._concurrencies[i])
+        ]
+        for thread in threads:
+            thread.start()
+
+        inflight = 0
+        with self._scratch_root() as scratch_root:
+            try:
+                while not self._stopping.is_set():
+                    inflight -= self._drain(completions, block=inflight >= self.capacity)
+                    self._publish_progress()
+                    if inflight >= self.capacity:
+                        continue
+                    try:
+                        job = self._next_job(scratch_root, block=not inflight)
+                    except EmptyError:
+                        if stop_when_idle and not inflight:
+                            break
+                        inflight -= self._drain(completions, block=bool(inflight))
+                        continue
+                    if job is not None and self._lead(job):
+                        inboxes[0].put((job, None))
+                        inflight += 1
+            finally:
+                while inflight:
+                    inflight -= self._drain(completions, block=True)
+                self._publish_progress(force=True)
+                for i, inbox in enumerate(inboxes):
+                    for _ in range(self._concurrencies[i]):
+                        inbox.put(_STOP)
+                for thread in threads:
+                    thread.join()
+
+    @staticmethod
+    def _stage_worker(
+        inbox: queue.Queue[Any],
+        step: Callable[[Job, Any], Any],
+        output: Callable[[Job, Any], None],
+        completions: queue.Queue[tuple[Job, BaseException | None]],
+    ) -> None:
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            job, payload = item
+            try:
+                result = step(job, payload)
+            except BaseException as e:
+                completions.put((job, e))
+                continue
+            output(job, result)
+
+    def _drain(self, completions: queue.Queue[tuple[Job, BaseException | None]], block: bool) -> int:
+        """Complete every finished job, waiting up to the poll interval for one if `block`."""
+        drained = 0
+        try:
+            job, error = completions.get(block=block, timeout=self._poll_interval)
+            while True:
+                self._complete(job, error)
+                drained += 1
+                job, error = completions.get_nowait()
+        except queue.Empty:
+            return drained
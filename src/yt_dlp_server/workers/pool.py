@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import abc
+import concurrent.futures
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Literal
+
+from yt_dlp_server.db.base import UNCLAIMED, BaseDB
+from yt_dlp_server.db.models import Task as DBTask
+from yt_dlp_server.db.models import TaskStatus
+from yt_dlp_server.storage.base import BaseStorageEngine
+from yt_dlp_server.workers.download import Downloader, collect_outputs, download
+from yt_dlp_server.workers.progress import ProgressHook, ProgressTracker
+from yt_dlp_server.workers.queue.base import BaseQueue, EmptyError
+from yt_dlp_server.workers.singleflight import SingleFlight, flight_key, link_outputs
+from yt_dlp_server.workers.task import Task
+from yt_dlp_server.workers.zygote import zygote_context
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+    from yt_dlp_server.profiles import ProfileMatcher
+
+logger = logging.getLogger(__name__)
+
+ExecutorKind = Literal["thread", "process", "zygote"]
+
+
+@dataclass
+class Job:
+    """A claimed task and the scratch directory it downloads into."""
+
+    task: Task
+    db_task: DBTask
+    output_dir: pathlib.Path
+    settings: YtDlpSettings
+    progress_hook: ProgressHook | None = None
+
+
+class BaseWorkerPool(abc.ABC):
+    """
+    Shared bookkeeping for pools that drain a :class:`BaseQueue`.
+
+    The pool's own thread (the one calling :meth:`run`) does all of the
+    bookkeeping: it gets tasks from the queue, claims them through the
+    :class:`BaseDB`, records status transitions, copies finished files into the
+    :class:`BaseStorageEngine` under ``<job_id>/`` and calls
+    :meth:`BaseQueue.task_done`. Only the downloads themselves run elsewhere,
+    so database connections that are bound to a single thread (such as
+    :class:`SQLiteDB`) can be shared with the pool.
+
+    Tasks must carry a ``job_id``. A task that has no database record yet is
+    added on behalf of this worker. Tasks that are claimed by another worker, or
+    that have already completed, are acknowledged and skipped.
+
+    Tasks of different jobs can name the same URL. While a URL is being
+    downloaded, later tasks for it wait on that download instead of starting
+    their own, and are completed with hardlinks (or copies) of its files, or
+    with its error.
+
+    A task can override some of the pool's settings for its download; see
+    :func:`derive_settings`. Tasks with invalid overrides fail without being
+    downloaded. With a :class:`ProfileMatcher`, the settings of the profiles
+    that match a task's URL are applied first, below the task's own overrides.
+
+    With a :class:`ProgressTracker`, each download reports progress through it,
+    and the pool thread publishes its snapshots to the database as it loops.
+    """
+
+    def __init__(
+        self,
+        queue: BaseQueue,
+        db: BaseDB[Any],
+        storage: BaseStorageEngine[Any],
+        settings: YtDlpSettings | None = None,
+        worker_id: int | None = None,
+        scratch_dir: pathlib.Path | None = None,
+        poll_interval: float = 0.1,
+        claim_timeout_seconds: int = 1800,
+        progress: ProgressTracker | None = None,
+        profiles: ProfileMatcher | None = None,
+    ) -> None:
+        """
+        :param queue: The queue to take tasks from.
+        :param db: The database used to claim tasks and record their status.
+        :param storage: Where finished downloads are written.
+        :param settings: The yt-dlp settings. Defaults to the global settings as
+            they are when each task is claimed, so a pool follows :func:`reload_settings`.
+        :param worker_id: The identity used to claim tasks. Defaults to the process ID. Must not be
+            :data:`UNCLAIMED`.
+        :param scratch_dir: Where downloads are staged before being stored. Defaults to a temporary directory.
+        :param poll_interval: How long, in seconds, to wait for new tasks or completions in each loop.
+        :param claim_timeout_seconds: How long another worker's claim is honoured.
+        :param progress: Collects download progress. The download functions are
+            then called with a ``progress_hook`` keyword argument.
+        :param profiles: Tuned settings for particular hosts and extractors.
+        """
+        if worker_id == UNCLAIMED:
+            raise ValueError(f"worker_id must not be {UNCLAIMED}, which marks unclaimed tasks")
+        self._queue = queue
+        self._db = db
+        self._storage = storage
+        self._settings = settings
+        self._worker_id = worker_id if worker_id is not None else os.getpid()
+        self._scratch_dir = scratch_dir
+        self._poll_interval = poll_interval
+        self._claim_timeout_seconds = claim_timeout_seconds
+        self._stopping = threading.Event()
+        self._singleflight: SingleFlight[tuple[str, str], Job] = SingleFlight()
+        self._progress = progress
+        self._profiles = profiles
+
+    @property
+    def worker_id(self) -> int:
+        return self._worker_id
+
+    def stop(self) -> None:
+        """
+        Ask :meth:`run` to return once the downloads in flight have finished.
+
+        Safe to call from any thread.
+        """
+        self._stopping.set()
+
+    @abc.abstractmethod
+    def run(self, stop_when_idle: bool = False) -> None:
+        """
+        Process tasks until :meth:`stop` is called.
+
+        :param stop_when_idle: Also return once the queue is empty and nothing is in flight.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def _scratch_root(self) -> Iterator[pathlib.Path]:
+        scratch_root = self._scratch_dir or pathlib.Path(tempfile.mkdtemp(prefix="yt-dlp-server-scratch-"))
+        scratch_root.mkdir(parents=True, exist_ok=True)
+        try:
+            yield scratch_root
+        finally:
+            if self._scratch_dir is None:
+                shutil.rmtree(scratch_root, ignore_errors=True)
+
+    def _next_job(self, scratch_root: pathlib.Path, block: bool) -> Job | None:
+        """
+        Get and claim the next task from the queue.
+
+        :raises EmptyError: If no task arrived within the poll interval.
+        :return: The claimed job, or None if the task was skipped (and acknowledged).
+        """
+        task = self._queue.get(block=block, timeout=self._poll_interval)
+        job = self._claim(task, scratch_root)
+        if job is None:
+            self._queue.task_done()
+        return job
+
+    def _lead(self, job: Job) -> bool:
+        """
+        Return whether `job` should be run, or False if it now waits on an
+        identical download that is already in flight.
+        """
+        if self._singleflight.join(flight_key(job.task.url, job.settings), job):
+            if self._progress is not None:
+                job.progress_hook = self._progress.start(job.db_task)
+            return True
+        logger.info("Task %s / %s is waiting on a download in flight", job.db_task.job_id, job.db_task.url)
+        return False
+
+    @staticmethod
+    def _progress_kwargs(job: Job) -> dict[str, Any]:
+        """Return the keyword arguments that give `job`'s download its progress hook, if any."""
+        return {} if job.progress_hook is None else {"progress_hook": job.progress_hook}
+
+    def _publish_progress(self, force: bool = False) -> None:
+        if self._progress is not None:
+            self._progress.publish(self._db, force=force)
+
+    def _claim(self, task: Task, scratch_root: pathlib.Path) -> Job | None:
+        """Claim `task` and mark it running, or return None if it should be skipped."""
+        from yt_dlp_server.config import derive_settings, get_settings
+
+        if task.job_id is None:
+            logger.warning("Skipping task without a job_id: %s", task.url)
+            return None
+        db_task = DBTask(job_id=task.job_id, url=task.url)
+        try:
+            if self._db.get_task(db_task) is None:
+                self._db.add_task(db_task, self._worker_id)
+            record = self._db.claim_task(db_task, self._worker_id, self._claim_timeout_seconds)
+            if record is None:
+                logger.info("Task %s / %s is claimed by another worker", task.job_id, task.url)
+                return None
+            if record.status == TaskStatus.COMPLETED:
+                logger.info("Task %s / %s has already completed", task.job_id, task.url)
+                return None
+            try:
+                base = self._settings if self._settings is not None else get_settings()
+                overrides = task.settings
+                if self._profiles is not None:
+                    overrides = {**self._profiles.overrides_for(task.url), **(task.settings or {})}
+                settings = derive_settings(overrides, base)
+            except ValueError:
+                logger.exception("Task %s / %s has invalid settings", task.job_id, task.url)
+                self._db.update_task(db_task, TaskStatus.FAILED)
+                return None
+            self._db.update_task(db_task, TaskStatus.RUNNING)
+        except Exception:
+            logger.exception("Failed to claim task %s / %s", task.job_id, task.url)
+            return None
+        output_dir = pathlib.Path(tempfile.mkdtemp(prefix="task-", dir=scratch_root))
+        return Job(task=task, db_task=db_task, output_dir=output_dir, settings=settings)
+
+    def _complete(self, job: Job, error: BaseException | None) -> None:
+        """Complete `job` and every job that was waiting on it."""
+        for waiter in self._singleflight.finish(flight_key(job.task.url, job.settings)):
+            waiter_error = error
+            if waiter_error is None:
+                try:
+                    link_outputs(job.output_dir, waiter.output_dir)
+                except Exception as e:
+                    waiter_error = e
+            self._finish(waiter, waiter_error)
+        self._finish(job, error)
+
+    def _finish(self, job: Job, error: BaseException | None) -> None:
+        """Store the results of `job` (unless it failed), record its status and acknowledge it."""
+        if self._progress is not None:
+            self._progress.finish(job.db_task)
+        status = TaskStatus.FAILED
+        try:
+            if error is not None:
+                logger.error("Task %s / %s failed", job.db_task.job_id, job.db_task.url, exc_info=error)
+            else:
+                self._store(job)
+                status = TaskStatus.COMPLETED
+        except Exception:
+            logger.exception("Failed to store results of task %s / %s", job.db_task.job_id, job.db_task.url)
+        finally:
+            shutil.rmtree(job.output_dir, ignore_errors=True)
+        try:
+            self._db.update_task(job.db_task, status)
+        except Exception:
+            logger.exception("Failed to record status of task %s / %s", job.db_task.job_id, job.db_task.url)
+        finally:
+            self._queue.task_done()
+
+    def _store(self, job: Job) -> None:
+        for relative_path in collect_outputs(job.output_dir):
+            with open(job.output_dir / relative_path, "rb") as f:
+                self._storage.write_stream_to_path(pathlib.Path(job.db_task.job_id) / relative_path, f)
+
+
+class WorkerPool(BaseWorkerPool):
+    """
+    Runs each :class:`Task` as a single download on a thread or process executor.
+
+    See :class:`BaseWorkerPool` for the bookkeeping.
+    """
+
+    def __init__(
+        self,
+        queue: BaseQueue,
+        db: BaseDB[Any],
+        storage: BaseStorageEngine[Any],
+        settings: YtDlpSettings | None = None,
+        concurrency: int = 4,
+        executor: ExecutorKind = "thread",
+        downloader: Downloader = download,
+        **kwargs: Any,
+    ) -> None:
+        """
+        :param concurrency: The number of downloads to run at once.
+        :param executor: Whether downloads run in threads, in spawned processes, or in
+            processes forked from a zygote that has already imported yt-dlp (see
+            :func:`zygote_context`).
+        :param downloader: The function that performs a download. Must be picklable for process executors.
+
+        The remaining parameters are described on :class:`BaseWorkerPool`.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if executor not in ("thread", "process", "zygote"):
+            raise ValueError(f"Unknown executor: {executor}")
+        if executor != "thread" and kwargs.get("progress") is not None:
+            raise ValueError("Progress tracking needs a thread executor")
+        super().__init__(queue, db, storage, settings, **kwargs)
+        self._concurrency = concurrency
+        self._executor_kind = executor
+        self._downloader = downloader
+
+    def run(self, stop_when_idle: bool = False) -> None:
+        """
+        See :meth:`BaseWorkerPool.run`.
+        """
+        self._stopping.clear()
+        inflight: dict[concurrent.futures.Future[None], Job] = {}
+        with self._scratch_root() as scratch_root, self._make_executor() as executor:
+            try:
+                while not self._stopping.is_set():
+                    self._reap(inflight, block=len(inflight) >= self._concurrency)
+                    self._publish_progress()
+                    if len(inflight) >= self._concurrency:
+                        continue
+                    try:
+                        job = self._next_job(scratch_root, block=not inflight)
+                    except EmptyError:
+                        if stop_when_idle and not inflight:
+                            break
+                        self._reap(inflight, block=True)
+                        continue
+                    if job is not None and self._lead(job):
+                        try:
+                            future = executor.submit(
+                                self._downloader,
+                                job.task.url,
+                                job.settings,
+                                job.output_dir,
+                                **self._progress_kwargs(job),
+                            )
+                        except Exception as e:
+                            # Such as BrokenProcessPool; fail the job and whatever waits on it.
+                            self._complete(job, e)
+                            continue
+                        inflight[future] = job
+            finally:
+                while inflight:
+                    self._reap(inflight, block=True)
+                self._publish_progress(force=True)
+
+    def _make_executor(self) -> concurrent.futures.Executor:
+        if self._executor_kind == "process":
+            return concurrent.futures.ProcessPoolExecutor(max_workers=self._concurrency)
+        if self._executor_kind == "zygote":
+            return concurrent.futures.ProcessPoolExecutor(max_workers=self._concurrency, mp_context=zygote_context())
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._concurrency, thread_name_prefix="yt-dlp-server-worker"
+        )
+
+    def _reap(self, inflight: dict[concurrent.futures.Future[None], Job], block: bool) -> None:
+        if not inflight:
+            return
+        done, _ = concurrent.futures.wait(
+            inflight,
+            timeout=self._poll_interval if block else 0,
+            return_when=concurrent.futures.FIRST_COMPLETED,
+        )
+        for future in done:
+            self._complete(inflight.pop(future), future.exception())
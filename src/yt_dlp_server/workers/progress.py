@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from yt_dlp_server.db.base import BaseDB
+from yt_dlp_server.db.models import Task as DBTask
+from yt_dlp_server.db.models import TaskProgress
+
+logger = logging.getLogger(__name__)
+
+ProgressHook = Callable[[dict[str, Any]], None]
+ProgressSubscriber = Callable[[list[tuple[DBTask, TaskProgress]]], None]
+
+# The fields of a progress hook event that are kept, in slot order.
+_FIELDS = ("status", "downloaded_bytes", "total_bytes", "speed", "eta")
+
+
+class ProgressTracker:
+    """
+    Aggregates yt-dlp progress events into periodic, coalesced snapshots.
+
+    Progress hooks fire many times per second per download. Each hook returned
+    by :meth:`start` only overwrites its task's slot in a fixed-size table and
+    marks it dirty, without locking, so the cost per event is a few stores.
+    :meth:`publish` runs at most once per `interval`. It collects the dirty
+    slots and hands them to the database in a single call and then to every
+    subscriber, so each tick costs O(tasks) however many events arrived.
+
+    :meth:`publish` should be called by the thread that owns the database
+    connection, such as a worker pool's bookkeeping thread.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param capacity: The number of tasks that can be tracked at once.
+        :param interval: The minimum number of seconds between snapshots.
+        :param clock: A monotonic clock, replaceable for testing.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self._interval = interval
+        self._clock = clock
+        self._tasks: list[DBTask | None] = [None] * capacity
+        self._keys: list[tuple[str, str] | None] = [None] * capacity
+        self._events: list[tuple[Any, ...] | None] = [None] * capacity
+        self._dirty = bytearray(capacity)
+        self._released = bytearray(capacity)
+        self._free = list(reversed(range(capacity)))
+        self._slots: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._subscribers: list[ProgressSubscriber] = []
+        self._last_publish: float | None = None
+
+    def start(self, task: DBTask) -> ProgressHook | None:
+        """
+        Start tracking `task`.
+
+        :return: A yt-dlp progress hook for the task's download, or None if the
+            table is full (the download then runs without progress reporting).
+        """
+        key = (task.job_id, task.url)
+        with self._lock:
+            if key in self._slots:
+                slot = self._slots[key]
+            elif self._free:
+                slot = self._free.pop()
+                self._slots[key] = slot
+            else:
+                logger.warning("Progress table is full; not tracking %s / %s", task.job_id, task.url)
+                return None
+            self._tasks[slot] = task
+            self._keys[slot] = key
+            self._events[slot] = None
+            self._dirty[slot] = 0
+            self._released[slot] = 0
+        events = self._events
+        dirty = self._dirty
+
+        def hook(event: dict[str, Any]) -> None:
+            events[slot] = (
+                event.get("status", "downloading"),
+                event.get("downloaded_bytes"),
+                event.get("total_bytes") or event.get("total_bytes_estimate"),
+                event.get("speed"),
+                event.get("eta"),
+            )
+            dirty[slot] = 1
+
+        return hook
+
+    def finish(self, task: DBTask) -> None:
+        """
+        Stop tracking `task`. Its last progress is still included in the next
+        snapshot, after which its slot is reused.
+        """
+        with self._lock:
+            slot = self._slots.get((task.job_id, task.url))
+            if slot is not None:
+                self._released[slot] = 1
+
+    def subscribe(self, subscriber: ProgressSubscriber) -> Callable[[], None]:
+        """
+        Call `subscriber` with every published snapshot.
+
+        :return: A function that unsubscribes `subscriber`.
+        """
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+        return unsubscribe
+
+    def snapshot(self) -> list[tuple[DBTask, TaskProgress]]:
+        """Return the latest progress of every tracked task that has reported any."""
+        with self._lock:
+            return [
+                (task, _to_progress(event))
+                for task, event in zip(self._tasks, self._events, strict=True)
+                if task is not None and event is not None
+            ]
+
+    def publish(self, db: BaseDB[Any] | None = None, force: bool = False) -> list[tuple[DBTask, TaskProgress]]:
+        """
+        Publish the progress that changed since the last snapshot, unless the
+        last one was less than `interval` seconds ago.
+
+        :param db: Where the snapshot is recorded, if anywhere.
+        :param force: Publish regardless of the interval, for example when shutting down.
+        :return: The published snapshot, empty if nothing was published.
+        """
+        now = self._clock()
+        if not force and self._last_publish is not None and now - self._last_publish < self._interval:
+            return []
+        self._last_publish = now
+        changed = []
+        with self._lock:
+            for slot, task in enumerate(self._tasks):
+                if task is None:
+                    continue
+                if self._dirty[slot]:
+                    # Clear the flag before reading, so a concurrent event is never lost.
+                    self._dirty[slot] = 0
+                    event = self._events[slot]
+                    if event is not None:
+                        changed.append((task, _to_progress(event)))
+                if self._released[slot]:
+                    self._release(slot)
+            subscribers = list(self._subscribers)
+        if not changed:
+            return changed
+        if db is not None:
+            try:
+                db.update_progress(changed)
+            except Exception:
+                logger.exception("Failed to record progress of %d tasks", len(changed))
+        for subscriber in subscribers:
+            try:
+                subscriber(changed)
+            except Exception:
+                logger.exception("Progress subscriber %r failed", subscriber)
+        return changed
+
+    def _release(self, slot: int) -> None:
+        key = self._keys[slot]
+        if key is not None:
+            del self._slots[key]
+        self._tasks[slot] = None
+        self._keys[slot] = None
+        self._events[slot] = None
+        self._released[slot] = 0
+        self._free.append(slot)
+
+
+def _to_progress(event: tuple[Any, ...]) -> TaskProgress:
+    fields = dict(zip(_FIELDS, event, strict=True))
+    # Byte counts can be estimates, which yt-dlp reports as floats.
+    for name in ("downloaded_bytes", "total_bytes"):
+        if fields[name] is not None:
+            fields[name] = int(fields[name])
+    return TaskProgress(**fields)
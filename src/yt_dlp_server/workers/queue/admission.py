@@ -0,0 +1,172 @@
+import math
+import threading
+import time
+from collections.abc import Callable
+
+from yt_dlp_server.workers.queue.base import BaseQueue, FullError
+from yt_dlp_server.workers.task import Task
+
+
+class AdmissionRejectedError(FullError):
+    """Exception raised by put() when admission control sheds load."""
+
+    def __init__(self, retry_after: float) -> None:
+        self.retry_after = retry_after
+        super().__init__(f"Queue is overloaded, retry after {retry_after:.3f}s")
+
+
+class AdmissionControlledQueue(BaseQueue):
+    """
+    A queue wrapper that sizes the allowed backlog from the measured drain rate.
+
+    Rather than relying on a fixed ``maxsize``, the wrapper measures how quickly
+    consumers take items out of the wrapped queue and estimates how long a newly
+    admitted item would wait (``qsize / drain_rate``). In the spirit of CoDel,
+    short bursts above ``target_latency`` are absorbed; only once the estimated
+    delay has stayed above the target for a whole ``interval`` does :meth:`put`
+    start rejecting with :class:`AdmissionRejectedError`, which carries a
+    ``retry_after`` hint. Rejections are immediate regardless of ``block``, so
+    producers never wait on an overloaded queue.
+
+    The estimate only needs :meth:`BaseQueue.qsize`, so any implementation can
+    be wrapped, including non-FIFO and distributed queues.
+    """
+
+    def __init__(
+        self,
+        queue: BaseQueue,
+        target_latency: float = 30.0,
+        interval: float = 5.0,
+        min_backlog: int = 1,
+        max_backlog: int | None = None,
+        smoothing: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param queue: The queue to wrap.
+        :param target_latency: The queueing delay, in seconds, that admitted items should not exceed.
+        :param interval: How long, in seconds, the delay must stay above target before shedding load.
+            Also the window over which the drain rate is sampled.
+        :param min_backlog: The backlog that is always admitted, even with no measured drain rate.
+        :param max_backlog: An optional hard cap on the backlog.
+        :param smoothing: The weight of the newest sample in the drain-rate moving average.
+        :param clock: A monotonic clock, replaceable for testing.
+        """
+        if target_latency <= 0:
+            raise ValueError("target_latency must be positive")
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be in (0, 1]")
+        self._queue = queue
+        self._target_latency = target_latency
+        self._interval = interval
+        self._min_backlog = min_backlog
+        self._max_backlog = max_backlog
+        self._smoothing = smoothing
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._drain_rate: float | None = None
+        self._window_start = clock()
+        self._window_gets = 0
+        self._first_above_time: float | None = None
+
+    @property
+    def drain_rate(self) -> float | None:
+        """
+        The smoothed number of items taken from the queue per second, or None
+        if no window has completed yet.
+        """
+        with self._lock:
+            return self._update_drain_rate(self._clock())
+
+    @property
+    def backlog_limit(self) -> int | None:
+        """
+        The backlog that can be drained within ``target_latency`` at the current
+        drain rate, or ``max_backlog`` if the drain rate is not yet known.
+        """
+        with self._lock:
+            return self._backlog_limit(self._update_drain_rate(self._clock()))
+
+    def get(self, block: bool = True, timeout: float | None = None) -> Task:
+        """
+        See :meth:`BaseQueue.get`.
+        """
+        item = self._queue.get(block=block, timeout=timeout)
+        with self._lock:
+            self._window_gets += 1
+            self._update_drain_rate(self._clock())
+        return item
+
+    def put(self, item: Task, block: bool = True, timeout: float | None = None) -> None:
+        """
+        See :meth:`BaseQueue.put`.
+
+        :raises AdmissionRejectedError: If the queue is overloaded. This is
+            raised immediately, even if `block` is true.
+        """
+        with self._lock:
+            now = self._clock()
+            drain_rate = self._update_drain_rate(now)
+            qsize = self._queue.qsize()
+            limit = self._backlog_limit(drain_rate)
+            if self._max_backlog is not None and qsize >= self._max_backlog:
+                raise AdmissionRejectedError(self._retry_after(qsize, limit, drain_rate))
+            if limit is not None and qsize >= limit:
+                if self._first_above_time is None:
+                    self._first_above_time = now
+                elif now - self._first_above_time >= self._interval:
+                    raise AdmissionRejectedError(self._retry_after(qsize, limit, drain_rate))
+            else:
+                self._first_above_time = None
+        self._queue.put(item, block=block, timeout=timeout)
+
+    def qsize(self) -> int:
+        """
+        See :meth:`BaseQueue.qsize`.
+        """
+        return self._queue.qsize()
+
+    def task_done(self) -> None:
+        """
+        See :meth:`BaseQueue.task_done`.
+        """
+        self._queue.task_done()
+
+    def join(self) -> None:
+        """
+        See :meth:`BaseQueue.join`.
+        """
+        self._queue.join()
+
+    def _update_drain_rate(self, now: float) -> float | None:
+        # Must be called with the lock held. A stalled consumer still closes the
+        # window, so the rate decays towards zero instead of staying stale.
+        elapsed = now - self._window_start
+        if elapsed >= self._interval:
+            sample = self._window_gets / elapsed
+            if self._drain_rate is None:
+                self._drain_rate = sample
+            else:
+                # One smoothing step for every window that has passed, as if
+                # each had been closed on time with the same sample.
+                windows = int(elapsed // self._interval)
+                self._drain_rate = sample + (self._drain_rate - sample) * (1 - self._smoothing) ** windows
+            self._window_start = now
+            self._window_gets = 0
+        return self._drain_rate
+
+    def _backlog_limit(self, drain_rate: float | None) -> int | None:
+        if drain_rate is None:
+            return self._max_backlog
+        limit = max(self._min_backlog, math.ceil(drain_rate * self._target_latency))
+        if self._max_backlog is not None:
+            limit = min(limit, self._max_backlog)
+        return limit
+
+    def _retry_after(self, qsize: int, limit: int | None, drain_rate: float | None) -> float:
+        if not drain_rate:
+            return self._target_latency
+        excess = qsize - (limit if limit is not None else qsize) + 1
+        return max(excess / drain_rate, 1 / drain_rate)
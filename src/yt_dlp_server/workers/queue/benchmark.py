@@ -0,0 +1,291 @@
+"""
+Benchmarks for :class:`BaseQueue` implementations.
+
+Every concrete queue defined under :mod:`yt_dlp_server.workers.queue.impl` is
+run through the same scenarios, and the results are reported as JSON:
+
+    python -m yt_dlp_server.workers.queue.benchmark --iterations 20000
+
+Each scenario reports throughput in operations per second and latency
+percentiles in microseconds.
+"""
+
+import argparse
+import importlib
+import inspect
+import json
+import math
+import pkgutil
+import platform
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from yt_dlp_server.workers.queue import impl
+from yt_dlp_server.workers.queue.base import BaseQueue
+from yt_dlp_server.workers.task import Task
+
+QueueFactory = Callable[[], BaseQueue]
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+@dataclass
+class BenchmarkConfig:
+    iterations: int = 10_000
+    batch_size: int = 100
+    producers: int = 4
+    consumers: int = 4
+    wakeup_rounds: int = 200
+    wakeup_delay: float = 0.001
+    warmup: int = 1_000
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    operations: int
+    seconds: float
+    ops_per_second: float
+    latency_us: dict[str, float] = field(default_factory=dict)
+
+
+def discover_queues() -> dict[str, QueueFactory]:
+    """
+    Find every concrete :class:`BaseQueue` defined in the ``impl`` package.
+
+    :return: A mapping from class name to a zero-argument factory.
+    """
+    factories: dict[str, QueueFactory] = {}
+    for module_info in pkgutil.iter_modules(impl.__path__, f"{impl.__name__}."):
+        module = importlib.import_module(module_info.name)
+        for name, obj in inspect.getmembers(module, inspect.isclass):
+            if issubclass(obj, BaseQueue) and not inspect.isabstract(obj) and obj.__module__ == module.__name__:
+                factories[name] = obj
+    return dict(sorted(factories.items()))
+
+
+def summarize(latencies_ns: list[int]) -> dict[str, float]:
+    """
+    Summarize latencies as nearest-rank percentiles, in microseconds.
+
+    :param latencies_ns: Individual latencies in nanoseconds.
+    :return: A mapping of ``p50``, ``p90``, ``p99``, ``p99.9`` and ``max``.
+    """
+    if not latencies_ns:
+        return {}
+    ordered = sorted(latencies_ns)
+    summary = {}
+    for percentile in PERCENTILES:
+        rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+        summary[f"p{percentile:g}"] = ordered[rank - 1] / 1000
+    summary["max"] = ordered[-1] / 1000
+    return summary
+
+
+def _result(scenario: str, operations: int, elapsed_ns: int, latencies_ns: list[int]) -> ScenarioResult:
+    seconds = elapsed_ns / 1e9
+    return ScenarioResult(
+        scenario=scenario,
+        operations=operations,
+        seconds=seconds,
+        ops_per_second=operations / seconds if seconds else float("inf"),
+        latency_us=summarize(latencies_ns),
+    )
+
+
+def _tasks(count: int) -> list[Task]:
+    return [Task(url=f"https://example.com/{i}") for i in range(count)]
+
+
+def bench_single(factory: QueueFactory, config: BenchmarkConfig) -> ScenarioResult:
+    """Alternate one put and one get on a single thread."""
+    queue = factory()
+    tasks = _tasks(config.iterations)
+    for task in tasks[: config.warmup]:
+        queue.put(task)
+        queue.get()
+    latencies: list[int] = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for task in tasks:
+        t0 = clock()
+        queue.put(task)
+        t1 = clock()
+        queue.get()
+        t2 = clock()
+        latencies.append(t1 - t0)
+        latencies.append(t2 - t1)
+    return _result("single", 2 * len(tasks), clock() - start, latencies)
+
+
+def bench_batched(factory: QueueFactory, config: BenchmarkConfig) -> ScenarioResult:
+    """Put a batch of items, then get the whole batch, on a single thread."""
+    queue = factory()
+    batch = _tasks(config.batch_size)
+    rounds = max(1, config.iterations // config.batch_size)
+    latencies: list[int] = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for _ in range(rounds):
+        t0 = clock()
+        for task in batch:
+            queue.put(task)
+        t1 = clock()
+        for _ in batch:
+            queue.get()
+        t2 = clock()
+        latencies.append((t1 - t0) // len(batch))
+        latencies.append((t2 - t1) // len(batch))
+    return _result("batched", 2 * rounds * len(batch), clock() - start, latencies)
+
+
+def bench_mpmc(factory: QueueFactory, config: BenchmarkConfig) -> ScenarioResult:
+    """
+    Run several producer and consumer threads concurrently.
+
+    Latency is measured per item, from just before its put to just after its get.
+    """
+    queue = factory()
+    tasks = _tasks(config.iterations)
+    put_times: dict[int, int] = {}
+    latencies: list[int] = []
+    latencies_lock = threading.Lock()
+    barrier = threading.Barrier(config.producers + config.consumers + 1)
+    clock = time.perf_counter_ns
+
+    def produce(chunk: list[Task]) -> None:
+        barrier.wait()
+        for task in chunk:
+            put_times[id(task)] = clock()
+            queue.put(task)
+
+    def consume(count: int) -> None:
+        local: list[int] = []
+        barrier.wait()
+        for _ in range(count):
+            task = queue.get()
+            local.append(clock() - put_times[id(task)])
+        with latencies_lock:
+            latencies.extend(local)
+
+    producer_chunks = [tasks[i :: config.producers] for i in range(config.producers)]
+    consumer_counts = [len(tasks[i :: config.consumers]) for i in range(config.consumers)]
+    threads = [threading.Thread(target=produce, args=(chunk,)) for chunk in producer_chunks]
+    threads += [threading.Thread(target=consume, args=(count,)) for count in consumer_counts]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = clock()
+    for thread in threads:
+        thread.join()
+    return _result("mpmc", 2 * len(tasks), clock() - start, latencies)
+
+
+def bench_wakeup(factory: QueueFactory, config: BenchmarkConfig) -> ScenarioResult:
+    """
+    Measure how quickly a consumer blocked in ``get(timeout=...)`` wakes up
+    after an item is put.
+    """
+    queue = factory()
+    task = Task(url="https://example.com/wakeup")
+    latencies: list[int] = []
+    put_time = 0
+    ready = threading.Event()
+    clock = time.perf_counter_ns
+
+    def consume() -> None:
+        for _ in range(config.wakeup_rounds):
+            ready.set()
+            queue.get(timeout=10.0)
+            latencies.append(clock() - put_time)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    start = clock()
+    for _ in range(config.wakeup_rounds):
+        ready.wait()
+        ready.clear()
+        # Give the consumer time to actually block inside get().
+        time.sleep(config.wakeup_delay)
+        put_time = clock()
+        queue.put(task)
+    consumer.join()
+    return _result("wakeup", config.wakeup_rounds, clock() - start, latencies)
+
+
+SCENARIOS: dict[str, Callable[[QueueFactory, BenchmarkConfig], ScenarioResult]] = {
+    "single": bench_single,
+    "batched": bench_batched,
+    "mpmc": bench_mpmc,
+    "wakeup": bench_wakeup,
+}
+
+
+def run_benchmarks(
+    config: BenchmarkConfig,
+    queues: dict[str, QueueFactory] | None = None,
+    scenarios: Iterable[str] | None = None,
+) -> dict[str, Any]:
+    """
+    Run the selected scenarios against the selected queues.
+
+    :param config: The sizes and concurrency levels to use.
+    :param queues: The queues to benchmark. Defaults to :func:`discover_queues`.
+    :param scenarios: The names of the scenarios to run. Defaults to all of them.
+    :return: A JSON-serializable report.
+    """
+    queues = discover_queues() if queues is None else queues
+    selected = list(SCENARIOS) if scenarios is None else list(scenarios)
+    results: dict[str, list[dict[str, Any]]] = {}
+    for name, factory in queues.items():
+        results[name] = [asdict(SCENARIOS[scenario](factory, config)) for scenario in selected]
+    return {
+        "environment": {
+            "python": sys.version,
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+        },
+        "config": asdict(config),
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    defaults = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=defaults.iterations)
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    parser.add_argument("--producers", type=int, default=defaults.producers)
+    parser.add_argument("--consumers", type=int, default=defaults.consumers)
+    parser.add_argument("--wakeup-rounds", type=int, default=defaults.wakeup_rounds)
+    parser.add_argument("--wakeup-delay", type=float, default=defaults.wakeup_delay)
+    parser.add_argument("--warmup", type=int, default=defaults.warmup)
+    parser.add_argument("--queue", action="append", help="Only benchmark this queue class (repeatable).")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS))
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(
+        iterations=args.iterations,
+        batch_size=args.batch_size,
+        producers=args.producers,
+        consumers=args.consumers,
+        wakeup_rounds=args.wakeup_rounds,
+        wakeup_delay=args.wakeup_delay,
+        warmup=args.warmup,
+    )
+    queues = discover_queues()
+    if args.queue:
+        unknown = set(args.queue) - set(queues)
+        if unknown:
+            parser.error(f"unknown queue(s): {', '.join(sorted(unknown))}")
+        queues = {name: queues[name] for name in args.queue}
+    json.dump(run_benchmarks(config, queues, args.scenario), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
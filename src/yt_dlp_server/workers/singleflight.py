@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import shutil
+import threading
+from collections.abc import Hashable
+from typing import TYPE_CHECKING, TypeVar
+
+from yt_dlp_server.workers.download import collect_outputs
+from yt_dlp_server.workers.info_cache import normalize_url
+from yt_dlp_server.workers.ytdl_pool import settings_key
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def flight_key(url: str, settings: YtDlpSettings) -> tuple[str, str]:
+    """Return the key under which downloads of `url` with `settings` are coalesced."""
+    return normalize_url(url), settings_key(settings)
+
+
+class SingleFlight[K: Hashable, V]:
+    """
+    Tracks which keys have work in flight and who is waiting on it.
+
+    The first caller to :meth:`join` a key becomes its leader and does the
+    work; later callers are recorded as waiters until the leader calls
+    :meth:`finish`, which hands them back so the result can be shared.
+    Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: dict[K, list[V]] = {}
+
+    def join(self, key: K, waiter: V) -> bool:
+        """
+        Join the flight for `key`.
+
+        :return: True if the caller is the leader and should do the work,
+            False if `waiter` was queued behind the leader.
+        """
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters is None:
+                self._waiters[key] = []
+                return True
+            waiters.append(waiter)
+            return False
+
+    def finish(self, key: K) -> list[V]:
+        """End the flight for `key` and return everything that was waiting on it."""
+        with self._lock:
+            return self._waiters.pop(key, [])
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._waiters
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._waiters)
+
+
+def link_outputs(source_dir: pathlib.Path, target_dir: pathlib.Path) -> None:
+    """
+    Give `target_dir` the finished files of `source_dir`, hardlinking where the
+    filesystem allows and copying otherwise.
+    """
+    for relative_path in collect_outputs(source_dir):
+        target = target_dir / relative_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(source_dir / relative_path, target)
+        except OSError:
+            shutil.copy2(source_dir / relative_path, target)
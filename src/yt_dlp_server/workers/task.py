@@ -1,5 +1,10 @@
+from typing import Any
+
 from pydantic import BaseModel
 
 
 class Task(BaseModel):
     url: str
+    job_id: str | None = None
+    # Overrides of the worker's settings for this task's job, by field name.
+    settings: dict[str, Any] | None = None
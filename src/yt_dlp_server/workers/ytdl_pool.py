@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import collections
+import itertools
+import threading
+import time
+from collections.abc import Callable, Collection, Iterator, Mapping, MutableMapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from yt_dlp_server.params import ytdl_params
+
+if TYPE_CHECKING:
+    from yt_dlp_server.config import YtDlpSettings
+
+YoutubeDLFactory = Callable[[MutableMapping[str, Any]], Any]
+
+
+def settings_key(settings: YtDlpSettings) -> str:
+    """Return a stable hash of the effective values of `settings`."""
+    return settings.content_hash()
+
+
+@dataclass
+class _Entry:
+    key: str
+    ydl: Any
+    created_at: float
+    baseline_params: dict[str, Any]
+    baseline_hooks: tuple[int, int]
+    generation: int = 0
+    uses: int = 0
+    pooled: bool = True
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    recycled: int = 0
+    overflows: int = 0
+    idle: int = 0
+    leased: int = 0
+    by_key: dict[str, int] = field(default_factory=dict)
+
+
+class YoutubeDLPool:
+    """
+    A bounded pool of long-lived `yt_dlp.YoutubeDL` instances.
+
+    Constructing a YoutubeDL parses its params, sets up extractor classes and
+    builds HTTP handlers; reusing one also keeps its caches and keep-alive
+    connections warm. Instances are keyed by :func:`settings_key`, so a lease
+    only ever reuses an instance built from identical settings.
+
+    A lease is exclusive: YoutubeDL is not thread-safe, so each instance is used
+    by one thread at a time. On release the instance is reset (per-lease param
+    overrides and hooks are removed, download counters are cleared) and put back
+    as the most recently used idle entry. When the pool is full, the least
+    recently used idle instance is closed to make room; if every instance is
+    leased, the new lease gets an unpooled instance that is closed on release,
+    so callers never block on the pool. Instances are recycled after
+    `max_uses` leases or `max_age` seconds to limit memory growth, and
+    :meth:`invalidate` retires every existing instance at once.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 8,
+        max_uses: int = 100,
+        max_age: float = 3600.0,
+        factory: YoutubeDLFactory | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param max_size: The maximum number of pooled instances, idle or leased.
+        :param max_uses: The number of leases after which an instance is recycled.
+        :param max_age: The age, in seconds, after which an instance is recycled.
+        :param factory: Builds an instance from YoutubeDL params, replaceable for testing.
+            Defaults to `yt_dlp.YoutubeDL`, imported when the first instance is built.
+        :param clock: A monotonic clock, replaceable for testing.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._max_size = max_size
+        self._max_uses = max_uses
+        self._max_age = max_age
+        self._factory = factory
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._idle: collections.OrderedDict[int, _Entry] = collections.OrderedDict()
+        self._leased = 0
+        self._ids = itertools.count()
+        self._generation = 0
+        self._stats = PoolStats()
+
+    @contextmanager
+    def lease(
+        self,
+        settings: YtDlpSettings,
+        overrides: Mapping[str, Any] | None = None,
+        skip_postprocessors: Collection[str] = (),
+    ) -> Iterator[Any]:
+        """
+        Lease an instance configured from `settings` for the duration of the block.
+
+        :param settings: The settings the instance must be built from.
+        :param overrides: Params to apply for this lease only, such as ``paths``.
+            Only params that YoutubeDL reads at use time (rather than at
+            construction) take effect this way.
+        :param skip_postprocessors: The phases (the ``when`` of the
+            ``postprocessors`` param) whose postprocessors the instance is built
+            without. Such instances are pooled apart from the others.
+        """
+        entry = self._acquire(settings, frozenset(skip_postprocessors))
+        if overrides:
+            entry.ydl.params.update(overrides)
+        try:
+            yield entry.ydl
+        finally:
+            self._release(entry)
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            stats = PoolStats(**{**vars(self._stats), "by_key": {}})
+            stats.idle = len(self._idle)
+            stats.leased = self._leased
+            for entry in self._idle.values():
+                stats.by_key[entry.key] = stats.by_key.get(entry.key, 0) + 1
+            return stats
+
+    def prune(self) -> None:
+        """Close idle instances that are due for recycling."""
+        with self._lock:
+            expired = [entry_id for entry_id, entry in self._idle.items() if self._expired(entry)]
+            entries = [self._idle.pop(entry_id) for entry_id in expired]
+            self._stats.recycled += len(entries)
+        for entry in entries:
+            entry.ydl.close()
+
+    def invalidate(self) -> None:
+        """
+        Retire every instance, for example after the settings were reloaded.
+
+        Idle instances are closed now; leased ones finish their lease and are
+        closed when released instead of being pooled again.
+        """
+        with self._lock:
+            self._generation += 1
+            entries = list(self._idle.values())
+            self._idle.clear()
+            self._stats.recycled += len(entries)
+        for entry in entries:
+            entry.ydl.close()
+
+    def close(self) -> None:
+        """Close every idle instance. Leased instances are closed when released."""
+        with self._lock:
+            entries = list(self._idle.values())
+            self._idle.clear()
+        for entry in entries:
+            entry.ydl.close()
+
+    def _expired(self, entry: _Entry) -> bool:
+        return (
+            entry.generation != self._generation
+            or entry.uses >= self._max_uses
+            or self._clock() - entry.created_at >= self._max_age
+        )
+
+    def _acquire(self, settings: YtDlpSettings, skip_postprocessors: frozenset[str]) -> _Entry:
+        key = settings_key(settings)
+        if skip_postprocessors:
+            key = f"{key}-{','.join(sorted(skip_postprocessors))}"
+        to_close: list[_Entry] = []
+        with self._lock:
+            entry = None
+            for entry_id in reversed(self._idle):
+                candidate = self._idle[entry_id]
+                if candidate.key == key:
+                    entry = self._idle.pop(entry_id)
+                    break
+            if entry is not None and self._expired(entry):
+                to_close.append(entry)
+                self._stats.recycled += 1
+                entry = None
+            if entry is not None:
+                self._stats.hits += 1
+                self._leased += 1
+            else:
+                self._stats.misses += 1
+                pooled = len(self._idle) + self._leased < self._max_size
+                if not pooled and self._idle:
+                    to_close.append(self._idle.popitem(last=False)[1])
+                    self._stats.evictions += 1
+                    pooled = True
+                if pooled:
+                    self._leased += 1
+                else:
+                    self._stats.overflows += 1
+        for stale in to_close:
+            stale.ydl.close()
+        if entry is None:
+            entry = self._create(key, settings, skip_postprocessors, pooled)
+        entry.uses += 1
+        return entry
+
+    def _create(self, key: str, settings: YtDlpSettings, skip_postprocessors: frozenset[str], pooled: bool) -> _Entry:
+        generation = self._generation
+        try:
+            if self._factory is None:
+                import yt_dlp
+
+                self._factory = yt_dlp.YoutubeDL
+            params = ytdl_params(settings)
+            if skip_postprocessors:
+                # YoutubeDL's own default phase is post_process.
+                params["postprocessors"] = [
+                    pp for pp in params["postprocessors"] if pp.get("when", "post_process") not in skip_postprocessors
+                ]
+            ydl = self._factory(params)
+        except BaseException:
+            if pooled:
+                with self._lock:
+                    self._leased -= 1
+            raise
+        return _Entry(
+            key=key,
+            ydl=ydl,
+            created_at=self._clock(),
+            # Only the overlay that YoutubeDL wrote to while initializing; the
+            # shared params below it are never written to.
+            baseline_params=dict(params.maps[0]),
+            baseline_hooks=(len(ydl._progress_hooks), len(ydl._postprocessor_hooks)),
+            generation=generation,
+            pooled=pooled,
+        )
+
+    def _release(self, entry: _Entry) -> None:
+        if entry.pooled:
+            self._reset(entry)
+            with self._lock:
+                self._leased -= 1
+                if not self._expired(entry):
+                    self._idle[next(self._ids)] = entry
+                    return
+                self._stats.recycled += 1
+        entry.ydl.close()
+
+    @staticmethod
+    def _reset(entry: _Entry) -> None:
+        ydl = entry.ydl
+        ydl.params.clear()
+        ydl.params.update(entry.baseline_params)
+        progress_hooks, postprocessor_hooks = entry.baseline_hooks
+        del ydl._progress_hooks[progress_hooks:]
+        del ydl._postprocessor_hooks[postprocessor_hooks:]
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._num_videos = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls.clear()
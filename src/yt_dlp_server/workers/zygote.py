@@ -0,0 +1,162 @@
+import argparse
+import concurrent.futures
+import importlib
+import json
+import multiprocessing
+import multiprocessing.context
+import pathlib
+import statistics
+import sys
+import time
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from typing import Literal
+
+# Imported once by the zygote: yt-dlp and its extractor registry, the settings
+# model and the parsed global settings, and the download path.
+PRELOAD_MODULES = (
+    "yt_dlp",
+    "yt_dlp.extractor.extractors",
+    "yt_dlp_server.config",
+    "yt_dlp_server.workers.zygote_preload",
+    "yt_dlp_server.workers.download",
+)
+
+StartMethod = Literal["spawn", "zygote"]
+
+
+def zygote_context(preload: Sequence[str] = PRELOAD_MODULES) -> multiprocessing.context.ForkServerContext:
+    """
+    Return a multiprocessing context whose processes are forked from a zygote.
+
+    The zygote is the ``forkserver`` process: it starts once, imports `preload`
+    (by default yt-dlp, its extractors, the settings model and the download
+    path), parses the global settings, and then forks a worker for every
+    process started through the context. Workers start without repeating that
+    work, and share the zygote's pages copy-on-write. Unlike forking the server
+    itself, the zygote has no threads or open connections that the workers
+    could inherit.
+
+    The global settings are parsed from the zygote's environment when it
+    starts, so a later :func:`reload_settings` in the server does not reach the
+    workers' :func:`get_settings`; the pools pass each download its settings.
+
+    The forkserver is shared by the whole process, so `preload` only takes
+    effect if it is set before the zygote first starts.
+    """
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(list(preload))
+    return context
+
+
+def _ready() -> None:
+    pass
+
+
+def start_zygote(preload: Sequence[str] = PRELOAD_MODULES) -> multiprocessing.context.ForkServerContext:
+    """
+    Like :func:`zygote_context`, but also start the zygote now rather than on
+    first use, and wait until it has finished importing `preload`.
+    """
+    context = zygote_context(preload)
+    # The zygote only forks once its imports are done.
+    process = context.Process(target=_ready)
+    process.start()
+    process.join()
+    return context
+
+
+@dataclass
+class WorkerStartup:
+    """How long a fresh worker took to become ready, and how much memory it uses."""
+
+    method: StartMethod
+    startup_seconds: float
+    rss_bytes: int | None
+    private_bytes: int | None
+
+
+def _memory_usage() -> tuple[int | None, int | None]:
+    """Return the resident and private (unshared) memory of this process, where the platform reports them."""
+    try:
+        rollup = pathlib.Path("/proc/self/smaps_rollup").read_text()
+    except OSError:
+        return None, None
+    fields = {}
+    for line in rollup.splitlines()[1:]:
+        name, _, value = line.partition(":")
+        fields[name] = int(value.split()[0]) * 1024
+    return fields.get("Rss"), fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+
+
+def probe() -> tuple[int | None, int | None]:
+    """
+    Get a worker ready to download, then report its memory usage.
+
+    Run in a fresh worker by :func:`measure_startup`.
+    """
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    from yt_dlp_server.config import get_settings
+
+    get_settings()
+    return _memory_usage()
+
+
+def measure_startup(method: StartMethod, workers: int = 3) -> list[WorkerStartup]:
+    """
+    Start `workers` fresh worker processes one at a time and measure each.
+
+    Startup time runs from asking for a worker until it is ready to download.
+    For the zygote, starting the zygote itself is a one-off cost that is not
+    included.
+    """
+    context: multiprocessing.context.BaseContext
+    context = start_zygote() if method == "zygote" else multiprocessing.get_context("spawn")
+    results = []
+    for _ in range(workers):
+        started = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            rss, private = executor.submit(probe).result()
+            elapsed = time.perf_counter() - started
+        results.append(WorkerStartup(method, elapsed, rss, private))
+    return results
+
+
+def savings_per_worker(spawn: list[WorkerStartup], zygote: list[WorkerStartup]) -> dict[str, float | None]:
+    """
+    Return how much a zygote-forked worker saves over a spawned one, on average.
+
+    Memory savings are None where the platform does not report memory usage.
+    """
+    savings: dict[str, float | None] = {}
+    for field in ("startup_seconds", "rss_bytes", "private_bytes"):
+        spawned = [getattr(result, field) for result in spawn]
+        forked = [getattr(result, field) for result in zygote]
+        if None in spawned or None in forked:
+            savings[field] = None
+        else:
+            savings[field] = statistics.mean(spawned) - statistics.mean(forked)
+    return savings
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the startup time and memory of spawned and zygote-forked workers."
+    )
+    parser.add_argument("--workers", type=int, default=3, help="The number of workers to start per method.")
+    args = parser.parse_args(argv)
+    spawn = measure_startup("spawn", args.workers)
+    zygote = measure_startup("zygote", args.workers)
+    report = {
+        "spawn": [asdict(result) for result in spawn],
+        "zygote": [asdict(result) for result in zygote],
+        "savings_per_worker": savings_per_worker(spawn, zygote),
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
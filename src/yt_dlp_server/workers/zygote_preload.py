@@ -0,0 +1,11 @@
+"""
+Parses the global settings when imported.
+
+The zygote imports this module (see :data:`yt_dlp_server.workers.zygote.PRELOAD_MODULES`),
+so the workers it forks inherit the parsed settings instead of each reading
+them from the environment again.
+"""
+
+from yt_dlp_server.config import get_settings
+
+get_settings()
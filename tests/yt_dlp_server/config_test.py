@@ -1,7 +1,10 @@
 import os
 from contextlib import contextmanager
 
-from yt_dlp_server.config import YtDlpSettings
+import pydantic
+import pytest
+
+from yt_dlp_server.config import YtDlpSettings, derive_settings
 
 
 @contextmanager
@@ -57,3 +60,31 @@ def test_env_retries_infinite_literal():
         settings = YtDlpSettings()
         assert settings.retries == "infinite"
 
+
+def test_with_overrides_validates_only_overridden_fields():
+    base = YtDlpSettings(retries=3)
+    base.content_hash()
+
+    settings = base.with_overrides({"retries": "7", "format": "worst"})
+
+    assert (settings.retries, settings.format, base.retries) == (7, "worst", 3)
+    assert settings.default_search == base.default_search
+    assert settings.content_hash() != base.content_hash()
+    with pytest.raises(pydantic.ValidationError):
+        base.with_overrides({"retries": "many"})
+    with pytest.raises(pydantic.ValidationError):
+        base.with_overrides({"no_such_setting": 1})
+
+
+def test_derive_settings_interns_identical_overrides():
+    base = YtDlpSettings()
+
+    first = derive_settings({"format": "worst", "ratelimit": 1000}, base)
+    second = derive_settings({"ratelimit": 1000, "format": "worst"}, base)
+
+    assert first is second
+    assert derive_settings({"format": "best"}, base) is not first
+    assert derive_settings({"format": "worst"}, YtDlpSettings(retries=1)) is not first
+    assert derive_settings(None, base) is base
+    assert derive_settings({}, base) is base
+    assert first.to_ytdl_params().maps[-1] is second.to_ytdl_params().maps[-1]
@@ -7,7 +7,7 @@ import pytest
 
 from yt_dlp_server.db.errors import TaskNotFoundError
 from yt_dlp_server.db.impl.sqlite import SQLiteDB
-from yt_dlp_server.db.models import Task, TaskRecord, TaskStatus
+from yt_dlp_server.db.models import Task, TaskProgress, TaskRecord, TaskStatus
 
 
 @pytest.fixture
@@ -74,8 +74,8 @@ class TestSQLiteDBConnection:
         cursor = db.connection.execute("PRAGMA table_info(task)")
         columns = cursor.fetchall()
 
-        # Expected columns: id, job_id, url, status, created_at, claimed_by, claimed_at, updated_at
-        assert len(columns) == 8
+        # Expected columns: id, job_id, url, status, created_at, claimed_by, claimed_at, updated_at, progress
+        assert len(columns) == 9
 
         # Check id column
         id_col = next(col for col in columns if col[1] == "id")
@@ -117,6 +117,11 @@ class TestSQLiteDBConnection:
         assert updated_at_col[2] == "TEXT"
         assert updated_at_col[3] == 1  # not null flag
 
+        # Check progress column
+        progress_col = next(col for col in columns if col[1] == "progress")
+        assert progress_col[2] == "TEXT"
+        assert progress_col[3] == 0  # nullable
+
         # Check for unique constraint on (job_id, url)
         cursor = db.connection.execute("PRAGMA index_list(task)")
         indexes = cursor.fetchall()
@@ -446,6 +451,16 @@ class TestSQLiteDBTaskClaiming:
         assert claimed_record.claimed_at > initial_record.claimed_at
         assert claimed_record.updated_at > initial_record.updated_at
 
+    def test_unclaimed_task_can_be_claimed_by_any_worker_once(self, db, sample_task):
+        """Test that a task added unclaimed goes to the first worker that claims it."""
+        db.add_tasks([sample_task])
+
+        claimed_record = db.claim_task(sample_task, 456, timeout_seconds=60)
+
+        assert claimed_record is not None
+        assert claimed_record.claimed_by == 456
+        assert db.claim_task(sample_task, 789, timeout_seconds=60) is None
+
     def test_claim_nonexistent_task_raises_error(self, db):
         """Test that claiming a non-existent task raises TaskNotFoundError."""
         nonexistent_task = Task(job_id="nonexistent", url="http://a.b/c")
@@ -453,6 +468,92 @@ class TestSQLiteDBTaskClaiming:
             db.claim_task(nonexistent_task, 123)
 
 
+class TestSQLiteDBBulkOperations:
+    """Test adding tasks in bulk."""
+
+    def test_add_tasks_inserts_all(self, db, sample_task, another_task):
+        """Test that add_tasks inserts every task and returns them in order."""
+        added = db.add_tasks([sample_task, another_task], 123)
+
+        assert added == [sample_task, another_task]
+        for task in (sample_task, another_task):
+            record = db.get_task(task)
+            assert record is not None
+            assert record.status == TaskStatus.PENDING
+            assert record.claimed_by == 123
+
+    def test_add_tasks_skips_existing(self, db, sample_task, another_task):
+        """Test that tasks that already exist are skipped rather than raising."""
+        db.add_task(sample_task, 1)
+        db.update_task(sample_task, TaskStatus.COMPLETED)
+
+        added = db.add_tasks([sample_task, another_task, another_task], 2)
+
+        assert added == [another_task]
+        assert db.get_task(sample_task).status == TaskStatus.COMPLETED
+        assert db.get_task(sample_task).claimed_by == 1
+
+    def test_add_tasks_accepts_iterators(self, db):
+        """Test that add_tasks consumes a generator."""
+        tasks = (Task(job_id="bulk", url=f"https://example.com/{i}") for i in range(100))
+
+        added = db.add_tasks(tasks, 1)
+
+        assert len(added) == 100
+        count = db.connection.execute("SELECT COUNT(*) FROM task WHERE job_id = 'bulk'").fetchone()[0]
+        assert count == 100
+
+    def test_add_tasks_empty(self, db):
+        """Test that adding no tasks is a no-op."""
+        assert db.add_tasks([], 1) == []
+
+
+class TestSQLiteDBProgress:
+    """Test recording task progress."""
+
+    def test_progress_is_none_by_default(self, db, sample_task):
+        """Test that a new task has no progress."""
+        assert db.add_task(sample_task, 1).progress is None
+
+    def test_update_progress(self, db, sample_task, another_task):
+        """Test that progress of several tasks is recorded and read back."""
+        db.add_task(sample_task, 1)
+        db.add_task(another_task, 1)
+        first = TaskProgress(status="downloading", downloaded_bytes=512, total_bytes=1024, speed=256.0, eta=2)
+        second = TaskProgress(status="finished", downloaded_bytes=2048, total_bytes=2048)
+
+        db.update_progress([(sample_task, first), (another_task, second)])
+
+        assert db.get_task(sample_task).progress == first
+        assert db.get_task(another_task).progress == second
+        assert db.get_task(sample_task).status == TaskStatus.PENDING
+
+    def test_update_progress_ignores_missing_tasks(self, db, sample_task):
+        """Test that progress for a task that does not exist is dropped."""
+        db.update_progress([(sample_task, TaskProgress(status="downloading"))])
+        assert db.get_task(sample_task) is None
+
+    def test_create_tables_adds_progress_to_existing_table(self, tmp_path, sample_task):
+        """Test that a table created without the progress column is migrated."""
+        db_file = tmp_path / "old.db"
+        connection = sqlite3.connect(db_file)
+        connection.execute(
+            "CREATE TABLE task (id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, url TEXT NOT NULL, "
+            "status TEXT NOT NULL, created_at TEXT NOT NULL, claimed_by INTEGER NOT NULL, "
+            "claimed_at TEXT NOT NULL, updated_at TEXT NOT NULL, UNIQUE(job_id, url))"
+        )
+        connection.close()
+        db = SQLiteDB()
+        db.connect(str(db_file))
+
+        db.create_tables()
+        db.add_task(sample_task, 1)
+        db.update_progress([(sample_task, TaskProgress(status="finished"))])
+
+        assert db.get_task(sample_task).progress == TaskProgress(status="finished")
+        db.connection.close()
+
+
 class TestSQLiteDBGuards:
     """Tests for guard conditions when DB is not connected."""
 
@@ -464,12 +565,18 @@ class TestSQLiteDBGuards:
         # add_task
         with pytest.raises(RuntimeError):
             db.add_task(sample_task, 1)
+        # add_tasks
+        with pytest.raises(RuntimeError):
+            db.add_tasks([sample_task], 1)
         # get_task
         with pytest.raises(RuntimeError):
             db.get_task(sample_task)
         # update_task
         with pytest.raises(RuntimeError):
             db.update_task(sample_task, TaskStatus.PENDING)
+        # update_progress
+        with pytest.raises(RuntimeError):
+            db.update_progress([(sample_task, TaskProgress(status="downloading"))])
         # claim_task
         with pytest.raises(RuntimeError):
             db.claim_task(sample_task, 1)
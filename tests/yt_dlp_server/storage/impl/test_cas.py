@@ -0,0 +1,167 @@
+import concurrent.futures
+import hashlib
+import io
+import pathlib
+
+import pytest
+
+from yt_dlp_server.storage.impl.cas import CASCollected, ContentAddressedStorageEngine
+
+
+@pytest.fixture
+def engine(tmp_path: pathlib.Path) -> ContentAddressedStorageEngine:
+    return ContentAddressedStorageEngine(repository=tmp_path / "repository", digest_sidecars=True)
+
+
+def test_identical_files_are_stored_once(engine):
+    data = b"video" * 1000
+    engine.write_bytes_to_path(pathlib.Path("job-1/video.mp4"), data)
+    engine.write_stream_to_path(pathlib.Path("job-2/video.mp4"), io.BytesIO(data), chunk_size=100)
+    with engine.open_writer(pathlib.Path("job-3/copy.mp4")) as writer:
+        writer.write(data)
+
+    stats = engine.stats()
+    assert (stats.objects, stats.object_bytes, stats.references) == (1, len(data), 3)
+    object_path = engine.object_path(hashlib.sha256(data).hexdigest())
+    for path in ("job-1/video.mp4", "job-2/video.mp4", "job-3/copy.mp4"):
+        assert engine.read_bytes_from_path(pathlib.Path(path)) == data
+        assert engine.canonicalize_path(pathlib.Path(path)).samefile(object_path)
+
+
+def test_object_is_deleted_with_its_last_reference(engine):
+    engine.write_bytes_to_path(pathlib.Path("a.bin"), b"shared")
+    engine.write_bytes_to_path(pathlib.Path("b.bin"), b"shared")
+    object_path = engine.object_path(hashlib.sha256(b"shared").hexdigest())
+
+    engine.delete_path(pathlib.Path("a.bin"))
+    assert object_path.exists()
+    assert engine.read_bytes_from_path(pathlib.Path("b.bin")) == b"shared"
+
+    engine.delete_path(pathlib.Path("b.bin"))
+    assert not object_path.exists()
+    assert engine.stats().objects == 0
+    engine.delete_path(pathlib.Path("b.bin"))
+
+
+def test_overwriting_releases_the_previous_object(engine):
+    path = pathlib.Path("video.mp4")
+    engine.write_bytes_to_path(path, b"first")
+    engine.write_bytes_to_path(path, b"first")
+    assert engine.stats().references == 1
+
+    engine.write_bytes_to_path(path, b"second")
+
+    assert engine.read_bytes_from_path(path) == b"second"
+    assert not engine.object_path(hashlib.sha256(b"first").hexdigest()).exists()
+    assert (engine.stats().objects, engine.stats().references) == (1, 1)
+
+
+def test_failed_write_stores_nothing(engine):
+    def chunks():
+        yield b"partial"
+        raise RuntimeError("source failed")
+
+    with pytest.raises(RuntimeError):
+        engine.write_stream_to_path(pathlib.Path("broken.bin"), chunks())
+
+    assert engine.stats().objects == 0
+    assert not engine.canonicalize_path(pathlib.Path("broken.bin")).exists()
+    assert list((engine.cas_dir / "tmp").iterdir()) == []
+
+
+def test_paths_outside_the_repository_are_plain_files(engine, tmp_path: pathlib.Path):
+    outside = tmp_path / "outside" / "file.bin"
+
+    engine.write_stream_to_path(outside, [b"plain"])
+
+    assert outside.read_bytes() == b"plain"
+    assert engine.stats().objects == 0
+    engine.delete_path(outside)
+    assert not outside.exists()
+
+
+def test_ranges_are_read_from_the_shared_object(engine):
+    engine.write_bytes_to_path(pathlib.Path("a.bin"), b"0123456789")
+    assert engine.read_range(pathlib.Path("a.bin"), 3, 4) == b"3456"
+
+
+def test_content_address_doubles_as_the_digest(engine):
+    data = b"video" * 100
+
+    result = engine.write_stream_with_digest(pathlib.Path("a.mp4"), [data])
+    other = engine.write_stream_with_digest(pathlib.Path("b.mp4"), [data], algorithm="blake2b")
+
+    assert engine.object_path(result.digest).exists()
+    assert engine.get_digest(pathlib.Path("a.mp4")) == result
+    assert other.digest == hashlib.blake2b(data).hexdigest()
+    assert engine.verify_path(pathlib.Path("b.mp4"))
+
+
+def test_index_counts_every_reference(tmp_path: pathlib.Path):
+    engine = ContentAddressedStorageEngine(repository=tmp_path, index=True)
+    engine.write_bytes_to_path(pathlib.Path("job-1/video.mp4"), b"video")
+    with engine.open_writer(pathlib.Path("job-2/video.mp4")) as f:
+        f.write(b"video")
+
+    assert engine.total_size() == 10
+    assert engine.list_paths() == [pathlib.Path("job-1/video.mp4"), pathlib.Path("job-2/video.mp4")]
+    engine.delete_path(pathlib.Path("job-1/video.mp4"))
+    assert engine.list_paths() == [pathlib.Path("job-2/video.mp4")]
+
+
+def test_gc_removes_what_an_interrupted_write_or_delete_leaves(engine):
+    engine.write_bytes_to_path(pathlib.Path("kept.bin"), b"kept")
+    # A write that died after storing its object, before linking its path.
+    orphan = engine.object_path(hashlib.sha256(b"orphan").hexdigest())
+    orphan.parent.mkdir(parents=True, exist_ok=True)
+    orphan.write_bytes(b"orphan")
+    # A delete that died after removing its object, before removing its inode entry.
+    (engine.cas_dir / "inodes" / "123456789").symlink_to("../objects/00/gone")
+
+    collected = engine.gc()
+
+    assert (collected.objects, collected.inode_links) == (1, 1)
+    assert not orphan.exists()
+    assert [path.name for path in (engine.cas_dir / "inodes").iterdir()] == [
+        str(engine.canonicalize_path(pathlib.Path("kept.bin")).stat().st_ino)
+    ]
+    assert engine.read_bytes_from_path(pathlib.Path("kept.bin")) == b"kept"
+    engine.delete_path(pathlib.Path("kept.bin"))
+    assert engine.stats().objects == 0
+    assert engine.gc() == CASCollected()
+
+
+def test_stale_inode_entries_are_repointed(engine):
+    data = b"video"
+    object_path = engine.object_path(hashlib.sha256(data).hexdigest())
+    engine.write_bytes_to_path(pathlib.Path("a.bin"), data)
+    inode_path = engine.cas_dir / "inodes" / str(object_path.stat().st_ino)
+    # As if the inode had belonged to an object that was deleted without its entry.
+    inode_path.unlink()
+    inode_path.symlink_to("../objects/00/previous")
+
+    engine.write_bytes_to_path(pathlib.Path("b.bin"), data)
+    engine.delete_path(pathlib.Path("a.bin"))
+    engine.delete_path(pathlib.Path("b.bin"))
+
+    assert not object_path.exists()
+    assert not inode_path.is_symlink()
+
+
+def write_and_delete(repository: pathlib.Path, name: str, rounds: int) -> None:
+    engine = ContentAddressedStorageEngine(repository=repository)
+    for _ in range(rounds):
+        engine.write_bytes_to_path(pathlib.Path(name), b"shared")
+        engine.delete_path(pathlib.Path(name))
+
+
+def test_processes_share_objects_safely(tmp_path: pathlib.Path):
+    repository = tmp_path / "repository"
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(write_and_delete, repository, f"{n}.bin", 50) for n in range(2)]
+        for future in futures:
+            future.result()
+
+    engine = ContentAddressedStorageEngine(repository=repository)
+    assert engine.stats().objects == 0
+    assert engine.gc() == CASCollected()
@@ -0,0 +1,139 @@
+import gzip
+import io
+import json
+import pathlib
+import sys
+
+import pytest
+
+from yt_dlp_server.storage.base import BaseStorageEngine
+from yt_dlp_server.storage.compression import is_compressed, is_text_path
+from yt_dlp_server.storage.impl.compressed import CompressedStorageEngine
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+
+INFO = json.dumps(
+    {"id": "abc", "title": "A video", "formats": [{"format_id": str(i), "ext": "mp4"} for i in range(50)]}
+)
+
+
+@pytest.fixture
+def local(tmp_path: pathlib.Path) -> LocalStorageEngine:
+    return LocalStorageEngine(repository=tmp_path, digest_sidecars=True)
+
+
+@pytest.fixture
+def engine(local: LocalStorageEngine) -> CompressedStorageEngine[pathlib.Path]:
+    return CompressedStorageEngine(local)
+
+
+@pytest.mark.parametrize(
+    ("name", "text"),
+    [
+        ("video.info.json", True),
+        ("video.description", True),
+        ("video.en.vtt", True),
+        ("video.en.ass", True),
+        ("page_1.dump", True),
+        ("notes.md", True),
+        ("video.mp4", False),
+        ("video.webp", False),
+    ],
+)
+def test_is_text_path(name: str, text: bool):
+    assert is_text_path(pathlib.PurePath(name)) == text
+
+
+def test_text_is_compressed_transparently(engine, local):
+    path = pathlib.Path("job/video.info.json")
+
+    assert engine.write_text_to_path(path, INFO) == len(INFO)
+
+    stored = local.read_bytes_from_path(path)
+    assert is_compressed(stored) and len(stored) < len(INFO) / 4
+    assert gzip.decompress(stored).decode() == INFO
+    assert engine.read_text_from_path(path) == INFO
+    assert bytes(engine.read_range(path, 2, 4)) == INFO[2:6].encode()
+    with engine.open_reader(path) as reader:
+        assert reader.seek(0, io.SEEK_END) == len(INFO)
+
+
+def test_streams_are_compressed_as_they_are_written(engine, local):
+    path = pathlib.Path("job/video.en.vtt")
+    lines = [f"00:00:{i:02}.000 --> 00:00:{i + 1:02}.000\nLine {i}\n\n".encode() for i in range(60)]
+
+    result = engine.write_stream_with_digest(path, io.BytesIO(b"".join(lines)), chunk_size=100)
+
+    assert result.size == len(b"".join(lines))
+    assert is_compressed(local.read_bytes_from_path(path))
+    assert engine.read_bytes_from_path(path) == b"".join(lines)
+    assert engine.verify_path(path)
+    with engine.open_writer(pathlib.Path("job/video.description")) as f:
+        f.write(b"A description")
+    assert engine.read_text_from_path(pathlib.Path("job/video.description")) == "A description"
+
+
+def test_verify_checks_the_stored_data(engine, local):
+    path = pathlib.Path("job/video.info.json")
+    engine.write_text_to_path(path, INFO)
+
+    stored = bytearray(local.read_bytes_from_path(path))
+    stored[-9] ^= 0xFF
+    local.canonicalize_path(path).write_bytes(stored)
+
+    assert not engine.verify_path(path)
+
+
+def test_digest_recorded_after_open_writer_is_that_of_the_stored_data(engine, local):
+    path = pathlib.Path("job/video.info.json")
+
+    result = BaseStorageEngine.write_stream_with_digest(engine, path, [INFO.encode()])
+
+    assert result.size == len(INFO)
+    digest = engine.get_digest(path)
+    assert digest is not None and digest.size == len(local.read_bytes_from_path(path))
+    assert engine.verify_path(path)
+
+
+def test_other_files_are_stored_as_they_are(engine, local):
+    path = pathlib.Path("job/video.mp4")
+    data = gzip.compress(b"a video that happens to look compressed")
+
+    engine.write_bytes_to_path(path, data)
+
+    assert local.read_bytes_from_path(path) == data
+    assert engine.read_bytes_from_path(path) == data
+    assert engine.verify_path(path)
+
+
+def test_uncompressed_text_is_read_as_it_is(engine, local):
+    path = pathlib.Path("job/video.info.json")
+    local.write_text_to_path(path, INFO)
+
+    assert engine.read_text_from_path(path) == INFO
+
+
+def test_zstd_without_the_package_raises_value_error(local, monkeypatch: pytest.MonkeyPatch):
+    # A None entry makes importing the module fail, as if it was not installed.
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(ValueError, match="zstandard"):
+        CompressedStorageEngine(local, codec="zstd")
+
+
+def test_zstd_dictionary_is_trained_on_info_json(local):
+    engine = CompressedStorageEngine(local, codec="zstd")
+    infos = [
+        json.dumps({"id": f"video-{i}", "title": f"Video {i}", "duration": i, "tags": [f"tag-{i % 7}"] * 20})
+        for i in range(120)
+    ]
+    for i, info in enumerate(infos):
+        engine.write_text_to_path(pathlib.Path(f"job/{i}.info.json"), info)
+
+    assert local.read_text_from_path(pathlib.Path(".dictionaries/current")).isdigit()
+    reopened = CompressedStorageEngine(local, codec="zstd")
+    assert all(reopened.read_text_from_path(pathlib.Path(f"job/{i}.info.json")) == infos[i] for i in range(120))
+    assert len(local.read_bytes_from_path(pathlib.Path("job/119.info.json"))) < len(infos[119]) / 2
+
+
+def test_unknown_codec_raises_value_error(local):
+    with pytest.raises(ValueError):
+        CompressedStorageEngine(local, codec="lzma")  # type: ignore[arg-type]
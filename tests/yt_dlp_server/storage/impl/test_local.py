@@ -1,11 +1,17 @@
+import hashlib
+import io
 import pathlib
 import shutil
 import tempfile
-from collections.abc import Iterator
+import tracemalloc
+from collections.abc import Callable, Iterator
+from typing import Any
 
 import pytest
 
+from yt_dlp_server.storage.impl.cas import ContentAddressedStorageEngine
 from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.storage.index import MetadataIndex
 
 
 @pytest.fixture
@@ -165,3 +171,273 @@ class TestLocalStorageEngine:
         assert bytes_written == len(text.encode("utf-8"))
         read_back = engine.read_text_from_path(path, encoding="utf-8")
         assert read_back == text
+
+    def test_write_stream_from_iterable(self, temp_repo_path: pathlib.Path):
+        """Test that an iterable of chunks is written in order."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("streams/iterable.bin")
+
+        written = engine.write_stream_to_path(path, (bytes([i]) * 1000 for i in range(10)))
+
+        assert written == 10000
+        assert engine.read_bytes_from_path(path) == b"".join(bytes([i]) * 1000 for i in range(10))
+
+    def test_write_stream_from_file_object(self, temp_repo_path: pathlib.Path):
+        """Test that a file object is read and written in chunks of the given size."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        data = bytes(range(256)) * 100
+        source = io.BytesIO(data)
+        reads = []
+        original_read = source.read
+
+        def read(size: int = -1) -> bytes:
+            reads.append(size)
+            return original_read(size)
+
+        source.read = read  # type: ignore[method-assign]
+
+        written = engine.write_stream_to_path(pathlib.Path("file.bin"), source, chunk_size=4096)
+
+        assert written == len(data)
+        assert set(reads) == {4096}
+        assert engine.read_bytes_from_path(pathlib.Path("file.bin")) == data
+
+    def test_stream_memory_is_independent_of_size(self, temp_repo_path: pathlib.Path):
+        """Test that streaming 64 MiB does not hold the data in memory."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        chunk = b"\x00" * (1024 * 1024)
+        tracemalloc.start()
+        try:
+            engine.write_stream_to_path(pathlib.Path("big.bin"), (chunk for _ in range(64)))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert engine.canonicalize_path(pathlib.Path("big.bin")).stat().st_size == 64 * len(chunk)
+        assert peak < 8 * len(chunk)
+
+    def test_open_writer_replaces_atomically(self, temp_repo_path: pathlib.Path):
+        """Test that the old contents stay visible until the writer is closed."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("atomic.txt")
+        engine.write_bytes_to_path(path, b"old")
+
+        with engine.open_writer(path) as writer:
+            writer.write(b"new")
+            assert engine.read_bytes_from_path(path) == b"old"
+
+        assert engine.read_bytes_from_path(path) == b"new"
+        assert not list(temp_repo_path.glob("*.tmp"))
+
+    def test_failed_write_leaves_nothing_behind(self, temp_repo_path: pathlib.Path):
+        """Test that a writer that raises neither replaces the file nor leaves a temporary file."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("kept.txt")
+        engine.write_bytes_to_path(path, b"kept")
+
+        def chunks():
+            yield b"partial"
+            raise RuntimeError("source failed")
+
+        with pytest.raises(RuntimeError):
+            engine.write_stream_to_path(path, chunks())
+
+        assert engine.read_bytes_from_path(path) == b"kept"
+        assert not list(temp_repo_path.glob("*.tmp"))
+
+    def test_read_range(self, temp_repo_path: pathlib.Path):
+        """Test that ranges are read exactly, truncated at the end of the file."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("range.bin")
+        data = bytes(range(256)) * 16
+        engine.write_bytes_to_path(path, data)
+
+        assert engine.read_range(path, 0, 4) == data[:4]
+        assert engine.read_range(path, 1000, 500) == data[1000:1500]
+        assert engine.read_range(path, len(data) - 10, 100) == data[-10:]
+        assert engine.read_range(path, len(data) + 10, 100) == b""
+        assert isinstance(engine.read_range(path, 0, 4), memoryview)
+        with pytest.raises(ValueError):
+            engine.read_range(path, -1, 4)
+
+    def test_read_range_of_nonexistent_file(self, temp_repo_path: pathlib.Path):
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        with pytest.raises(FileNotFoundError):
+            engine.read_range(pathlib.Path("missing.bin"), 0, 1)
+
+    def test_open_reader_seeks(self, temp_repo_path: pathlib.Path):
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("reader.bin")
+        engine.write_bytes_to_path(path, b"0123456789")
+
+        with engine.open_reader(path) as reader:
+            reader.seek(7)
+            assert reader.read() == b"789"
+
+    def test_map_path_gives_a_read_only_view(self, temp_repo_path: pathlib.Path):
+        """Test that a mapped file can be sliced without copying and cannot be written to."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("mapped.bin")
+        data = b"ftypisom" + b"\x00" * 10000
+        engine.write_bytes_to_path(path, data)
+
+        with engine.map_path(path) as view:
+            assert len(view) == len(data)
+            assert view.readonly
+            with view[:8] as header:
+                assert header == b"ftypisom"
+
+    def test_map_empty_file(self, temp_repo_path: pathlib.Path):
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("empty.bin")
+        engine.write_bytes_to_path(path, b"")
+
+        with engine.map_path(path) as view:
+            assert len(view) == 0
+
+    def test_digest_is_computed_while_writing(self, temp_repo_path: pathlib.Path):
+        """Test that streaming returns and records a digest of the data, without reading the file back."""
+        engine = LocalStorageEngine(repository=temp_repo_path, digest_algorithm="blake2b", digest_sidecars=True)
+        path = pathlib.Path("job/video.mp4")
+        data = b"frame" * 10000
+
+        result = engine.write_stream_with_digest(path, io.BytesIO(data), chunk_size=1000)
+
+        assert (result.size, result.algorithm) == (len(data), "blake2b")
+        assert result.digest == hashlib.blake2b(data).hexdigest()
+        assert engine.get_digest(path) == result
+        assert engine.verify_path(path)
+        assert [p.name for p in engine.canonicalize_path(pathlib.Path("job")).iterdir()] == ["video.mp4"]
+
+    def test_every_write_records_a_digest(self, temp_repo_path: pathlib.Path):
+        engine = LocalStorageEngine(repository=temp_repo_path, digest_sidecars=True)
+        path = pathlib.Path("data.bin")
+
+        engine.write_bytes_to_path(path, b"bytes")
+        assert engine.get_digest(path).digest == hashlib.sha256(b"bytes").hexdigest()
+        assert engine.write_stream_with_digest(path, [b"other"], algorithm="md5").algorithm == "md5"
+        assert engine.get_digest(path).digest == hashlib.md5(b"other").hexdigest()
+
+        with engine.open_writer(path) as writer:
+            writer.write(b"unhashed")
+        assert engine.get_digest(path) is None
+        with pytest.raises(LookupError):
+            engine.verify_path(path)
+
+    def test_verify_detects_corruption(self, temp_repo_path: pathlib.Path):
+        engine = LocalStorageEngine(repository=temp_repo_path, digest_sidecars=True)
+        path = pathlib.Path("data.bin")
+        engine.write_bytes_to_path(path, b"original")
+
+        engine.canonicalize_path(path).write_bytes(b"corrupt!")
+
+        assert not engine.verify_path(path)
+        engine.canonicalize_path(path).write_bytes(b"truncated")
+        assert engine.get_digest(path) is None
+
+    def test_writes_store_only_the_file_by_default(self, temp_repo_path: pathlib.Path):
+        """Test that without an index or digest sidecars, a write creates nothing besides the file."""
+        engine = LocalStorageEngine(repository=temp_repo_path)
+        path = pathlib.Path("data.bin")
+
+        engine.write_bytes_to_path(path, b"data")
+
+        assert list(temp_repo_path.iterdir()) == [temp_repo_path / "data.bin"]
+        assert engine.get_digest(path) is None
+
+    def test_delete_forgets_the_digest(self, temp_repo_path: pathlib.Path):
+        engine = LocalStorageEngine(repository=temp_repo_path, digest_sidecars=True)
+        path = pathlib.Path("data.bin")
+        engine.write_bytes_to_path(path, b"data")
+
+        engine.delete_path(path)
+        engine.canonicalize_path(path).write_bytes(b"data")
+
+        assert engine.get_digest(path) is None
+
+    def test_unknown_digest_algorithm_raises_value_error(self, temp_repo_path: pathlib.Path):
+        with pytest.raises(ValueError):
+            LocalStorageEngine(repository=temp_repo_path, digest_algorithm="not-a-digest")
+
+    @pytest.mark.parametrize("index", [False, True])
+    def test_listing_and_sizes(self, temp_repo_path: pathlib.Path, index: bool):
+        """Test that the index answers like a walk of the repository."""
+        engine = LocalStorageEngine(repository=temp_repo_path, index=index)
+        engine.write_bytes_to_path(pathlib.Path("job/a.mp4"), b"a" * 10)
+        with engine.open_writer(pathlib.Path("job/sub/b.mp4")) as f:
+            f.write(b"b" * 5)
+        engine.write_bytes_to_path(pathlib.Path("job2/c.mp4"), b"c")
+        engine.delete_path(pathlib.Path("job2/c.mp4"))
+
+        assert engine.list_paths(pathlib.Path("job")) == [pathlib.Path("job/a.mp4"), pathlib.Path("job/sub/b.mp4")]
+        assert engine.list_paths() == engine.list_paths(pathlib.Path("job"))
+        assert engine.total_size(pathlib.Path("job")) == 15
+        assert engine.total_size(pathlib.Path("job2")) == 0
+        assert engine.exists(pathlib.Path("job/a.mp4"))
+        assert not engine.exists(pathlib.Path("job2/c.mp4"))
+        assert not engine.exists(pathlib.Path("job"))
+
+    def test_index_is_used_instead_of_the_filesystem(self, temp_repo_path: pathlib.Path):
+        engine = LocalStorageEngine(repository=temp_repo_path, index=True)
+        path = pathlib.Path("job/video.mp4")
+        engine.write_bytes_to_path(path, b"video")
+
+        shutil.rmtree(temp_repo_path / "job")
+
+        metadata = engine.index.get(path) if engine.index is not None else None
+        assert metadata is not None and metadata.job_id == "job"
+        assert metadata.digest is not None and metadata.digest.size == 5
+        assert engine.exists(path)
+        assert engine.total_size(pathlib.Path("job")) == 5
+        engine.rebuild_index()
+        assert not engine.exists(path)
+
+    @pytest.mark.parametrize("engine_type", [LocalStorageEngine, ContentAddressedStorageEngine])
+    def test_write_is_indexed_once(
+        self, temp_repo_path: pathlib.Path, engine_type: type[LocalStorageEngine], monkeypatch: pytest.MonkeyPatch
+    ):
+        """Test that recording a digest only adds it to the record made for the write."""
+        engine = engine_type(repository=temp_repo_path, index=True)
+        calls: list[str] = []
+        monkeypatch.setattr(MetadataIndex, "put", _counting(calls, MetadataIndex.put))
+        monkeypatch.setattr(MetadataIndex, "set_digest", _counting(calls, MetadataIndex.set_digest))
+
+        result = engine.write_stream_with_digest(pathlib.Path("job/video.mp4"), [b"video"])
+
+        assert calls == ["put", "set_digest"]
+        metadata = engine.index.get(pathlib.Path("job/video.mp4")) if engine.index is not None else None
+        assert metadata is not None and metadata.size == 5 and metadata.digest == result
+
+    def test_index_keeps_the_digests(self, temp_repo_path: pathlib.Path):
+        """Test that an indexed repository keeps digests in the index rather than in files of their own."""
+        engine = LocalStorageEngine(repository=temp_repo_path, index=True)
+        path = pathlib.Path("job/video.mp4")
+        result = engine.write_stream_with_digest(path, [b"video"])
+
+        assert not (temp_repo_path / ".digests").exists()
+        assert engine.get_digest(path) == result
+        assert engine.verify_path(path)
+        engine.rebuild_index()
+        assert engine.get_digest(path) == result
+
+        (temp_repo_path / "job/video.mp4").write_bytes(b"changed")
+        assert engine.get_digest(path) is None
+
+    def test_index_is_built_from_existing_files(self, temp_repo_path: pathlib.Path):
+        without_index = LocalStorageEngine(repository=temp_repo_path, digest_sidecars=True)
+        without_index.write_bytes_to_path(pathlib.Path("job/video.mp4"), b"video")
+
+        engine = LocalStorageEngine(repository=temp_repo_path, index=True)
+
+        metadata = engine.index.get(pathlib.Path("job/video.mp4")) if engine.index is not None else None
+        assert metadata is not None and metadata.size == 5 and metadata.digest is not None
+        assert engine.list_paths() == [pathlib.Path("job/video.mp4")]
+        assert not (temp_repo_path / ".digests/job/video.mp4.json").exists()
+        assert engine.verify_path(pathlib.Path("job/video.mp4"))
+
+
+def _counting(calls: list[str], method: Callable[..., Any]) -> Callable[..., Any]:
+    def counted(*args: Any, **kwargs: Any) -> Any:
+        calls.append(method.__name__)
+        return method(*args, **kwargs)
+
+    return counted
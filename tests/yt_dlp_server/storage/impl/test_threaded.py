@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import pathlib
+import threading
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+from pydantic import PrivateAttr
+
+from yt_dlp_server.storage.compression import is_compressed
+from yt_dlp_server.storage.digest import WriteResult
+from yt_dlp_server.storage.impl.compressed import CompressedStorageEngine
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.storage.impl.threaded import ThreadedStorageEngine
+
+
+class CountingEngine(LocalStorageEngine):
+    """Records the threads the engine is called from."""
+
+    _threads: list[threading.Thread] = PrivateAttr(default_factory=list)
+
+    def delete_path(self, path: pathlib.Path) -> None:
+        self._threads.append(threading.current_thread())
+        super().delete_path(path)
+
+
+@pytest.fixture
+def local(tmp_path: pathlib.Path) -> LocalStorageEngine:
+    return LocalStorageEngine(repository=tmp_path, digest_sidecars=True)
+
+
+async def produce(chunks: list[bytes], fail: bool = False) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        await asyncio.sleep(0)
+        yield chunk
+    if fail:
+        raise RuntimeError("producer failed")
+
+
+def test_round_trip(local: LocalStorageEngine):
+    async def main() -> None:
+        async with ThreadedStorageEngine(local) as engine:
+            assert await engine.write_text_to_path(pathlib.Path("job/a.txt"), "hello") == 5
+            assert await engine.read_text_from_path(pathlib.Path("job/a.txt")) == "hello"
+            assert bytes(await engine.read_range(pathlib.Path("job/a.txt"), 1, 3)) == b"ell"
+            assert await engine.exists(pathlib.Path("job/a.txt"))
+            await engine.delete_path(pathlib.Path("job/a.txt"))
+            assert not await engine.exists(pathlib.Path("job/a.txt"))
+
+    asyncio.run(main())
+
+
+def test_stream_write_gathers_chunks_and_records_the_digest(local: LocalStorageEngine):
+    chunks = [bytes([i]) * 100 for i in range(50)]
+
+    async def main() -> None:
+        async with ThreadedStorageEngine(local) as engine:
+            result = await engine.write_stream_with_digest(pathlib.Path("video.mp4"), produce(chunks), chunk_size=1000)
+            assert [len(chunk) async for chunk in engine.iter_path(pathlib.Path("video.mp4"), 1000)] == [1000] * 5
+            assert await engine.write_stream_to_path(pathlib.Path("copy.mp4"), chunks) == 5000
+
+        assert result.size == 5000
+        assert result.digest == hashlib.sha256(b"".join(chunks)).hexdigest()
+
+    asyncio.run(main())
+    assert local.get_digest(pathlib.Path("video.mp4")) is not None
+    assert local.verify_path(pathlib.Path("video.mp4"))
+    assert local.read_bytes_from_path(pathlib.Path("copy.mp4")) == b"".join(chunks)
+
+
+def test_stream_write_is_done_by_the_wrapped_engine(local: LocalStorageEngine):
+    compressed = CompressedStorageEngine(local)
+    info = b'{"id": "abc", "formats": []}' * 100
+    path = pathlib.Path("job/a.info.json")
+
+    async def main() -> None:
+        async with ThreadedStorageEngine(compressed) as engine:
+            await engine.write_stream_with_digest(path, produce([info[:1000], info[1000:]]), chunk_size=100)
+
+    asyncio.run(main())
+    assert is_compressed(local.read_bytes_from_path(path))
+    assert compressed.read_bytes_from_path(path) == info
+    assert compressed.get_digest(path) is not None
+    assert compressed.verify_path(path)
+
+
+def test_streams_copied_within_the_engine_do_not_starve_the_pool(local: LocalStorageEngine):
+    sources = [pathlib.Path(f"source-{i}.mp4") for i in range(4)]
+    for i, source in enumerate(sources):
+        local.write_bytes_to_path(source, bytes([i]) * 10_000)
+
+    async def main() -> None:
+        async with ThreadedStorageEngine(local, max_workers=1) as engine:
+
+            async def copy(source: pathlib.Path) -> int:
+                return await engine.write_stream_to_path(source.with_suffix(".copy"), engine.iter_path(source, 1000))
+
+            copies = asyncio.gather(*(copy(source) for source in sources))
+            assert await asyncio.wait_for(copies, timeout=10) == [10_000] * 4
+
+    asyncio.run(main())
+    assert all(
+        local.read_bytes_from_path(source.with_suffix(".copy")) == bytes([i]) * 10_000
+        for i, source in enumerate(sources)
+    )
+
+
+def test_failed_stream_writes_nothing(local: LocalStorageEngine):
+    async def main() -> None:
+        async with ThreadedStorageEngine(local) as engine:
+            with pytest.raises(RuntimeError, match="producer failed"):
+                await engine.write_stream_to_path(pathlib.Path("video.mp4"), produce([b"x" * 10] * 3, fail=True), 10)
+
+    asyncio.run(main())
+    assert list(local.repository.iterdir()) == []
+
+
+def test_engine_failure_ends_the_stream(local: LocalStorageEngine):
+    class FailingEngine(LocalStorageEngine):
+        def write_stream_with_digest(self, *args: Any, **kwargs: Any) -> WriteResult:
+            raise OSError("disk full")
+
+    async def main() -> None:
+        async with ThreadedStorageEngine(FailingEngine(repository=local.repository)) as engine:
+            with pytest.raises(OSError, match="disk full"):
+                await engine.write_stream_to_path(pathlib.Path("video.mp4"), [b"x" * 10] * 100, 10)
+
+    asyncio.run(main())
+
+
+def test_iteration_can_stop_early(local: LocalStorageEngine):
+    local.write_bytes_to_path(pathlib.Path("video.mp4"), b"x" * 100)
+
+    async def main() -> None:
+        async with ThreadedStorageEngine(local) as engine:
+            async for chunk in engine.iter_path(pathlib.Path("video.mp4"), 10):
+                assert chunk == b"x" * 10
+                break
+
+    asyncio.run(main())
+
+
+def test_small_operations_are_batched(tmp_path: pathlib.Path):
+    local = CountingEngine(repository=tmp_path)
+    paths = [pathlib.Path(f"job/{i}") for i in range(20)]
+    for path in paths:
+        local.write_bytes_to_path(path, b"x")
+
+    async def main() -> None:
+        async with ThreadedStorageEngine(local, max_workers=4) as engine:
+            await asyncio.gather(*(engine.delete_path(path) for path in paths))
+
+    asyncio.run(main())
+    assert len(local._threads) == 20
+    # All the deletes were issued in one turn of the event loop, so they ran as one batch in one thread.
+    assert len(set(local._threads)) == 1
+    assert local.list_paths() == []
+
+
+def test_errors_reach_only_their_operation(local: LocalStorageEngine):
+    local.write_bytes_to_path(pathlib.Path("present"), b"data")
+
+    async def main() -> None:
+        async with ThreadedStorageEngine(local) as engine:
+            results = await asyncio.gather(
+                engine.read_range(pathlib.Path("missing"), 0, 4),
+                engine.read_range(pathlib.Path("present"), 0, 4),
+                return_exceptions=True,
+            )
+        assert isinstance(results[0], FileNotFoundError)
+        assert isinstance(results[1], memoryview) and bytes(results[1]) == b"data"
+
+    asyncio.run(main())
+
+
+def test_event_loop_is_not_blocked(local: LocalStorageEngine):
+    data = b"x" * (4 * 1024 * 1024)
+
+    async def main() -> None:
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        async with ThreadedStorageEngine(local) as engine:
+            await engine.write_stream_to_path(pathlib.Path("video.mp4"), [data] * 8, chunk_size=len(data))
+        ticker.cancel()
+        assert ticks > 1
+
+    asyncio.run(main())
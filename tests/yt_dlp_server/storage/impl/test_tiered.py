@@ -0,0 +1,211 @@
+import concurrent.futures
+import pathlib
+import threading
+from collections.abc import Iterator
+
+import pytest
+
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.storage.impl.tiered import TieredStorageEngine
+
+
+class FailingEngine(LocalStorageEngine):
+    def open_writer(self, path: pathlib.Path):
+        raise OSError("The slow tier is unavailable")
+
+
+@pytest.fixture
+def fast(tmp_path: pathlib.Path) -> LocalStorageEngine:
+    return LocalStorageEngine(repository=tmp_path / "fast", index=True)
+
+
+@pytest.fixture
+def slow(tmp_path: pathlib.Path) -> LocalStorageEngine:
+    return LocalStorageEngine(repository=tmp_path / "slow", index=True)
+
+
+@pytest.fixture
+def engine(fast: LocalStorageEngine, slow: LocalStorageEngine) -> Iterator[TieredStorageEngine[pathlib.Path]]:
+    engine = TieredStorageEngine(fast, slow, capacity=30)
+    yield engine
+    engine.close()
+
+
+def test_writes_land_on_the_fast_tier_and_are_demoted(engine, fast, slow):
+    path = pathlib.Path("job/video.mp4")
+
+    engine.write_bytes_to_path(path, b"video")
+
+    assert fast.read_bytes_from_path(path) == b"video"
+    engine.flush()
+    assert slow.read_bytes_from_path(path) == b"video"
+    assert engine.read_bytes_from_path(path) == b"video"
+    assert engine.verify_path(path)
+    assert engine.stats().demotions == 1
+    assert engine.repository == slow.repository
+
+
+def test_reads_promote(engine, fast, slow):
+    path = pathlib.Path("job/video.mp4")
+    slow.write_bytes_to_path(path, b"archived")
+
+    assert not fast.exists(path)
+    assert engine.read_bytes_from_path(path) == b"archived"
+    assert fast.read_bytes_from_path(path) == b"archived"
+    with engine.open_reader(path) as reader:
+        assert reader.read() == b"archived"
+    assert bytes(engine.read_range(path, 2, 3)) == b"chi"
+
+    stats = engine.stats()
+    assert (stats.misses, stats.promotions, stats.hits, stats.resident_bytes) == (1, 1, 2, 8)
+
+
+def test_files_larger_than_the_fast_tier_are_not_promoted(engine, fast, slow):
+    path = pathlib.Path("job/video.mp4")
+    slow.write_bytes_to_path(path, b"x" * 31)
+
+    assert engine.read_bytes_from_path(path) == b"x" * 31
+    assert not fast.exists(path)
+
+
+def test_lru_eviction(engine, fast):
+    paths = [pathlib.Path(f"job/{i}") for i in range(4)]
+    for path in paths[:3]:
+        engine.write_bytes_to_path(path, b"x" * 10)
+    engine.flush()
+    engine.read_bytes_from_path(paths[0])
+
+    engine.write_bytes_to_path(paths[3], b"x" * 10)
+
+    assert fast.list_paths() == [paths[0], paths[2], paths[3]]
+    assert engine.stats().evictions == 1
+    assert engine.read_bytes_from_path(paths[1]) == b"x" * 10
+    assert engine.stats().resident_bytes <= 30
+
+
+def test_lfu_eviction(fast, slow):
+    engine = TieredStorageEngine(fast, slow, capacity=30, policy="lfu")
+    paths = [pathlib.Path(f"job/{i}") for i in range(4)]
+    for path in paths[:3]:
+        engine.write_bytes_to_path(path, b"x" * 10)
+    engine.flush()
+    for _ in range(3):
+        engine.read_bytes_from_path(paths[0])
+    engine.read_bytes_from_path(paths[1])
+    engine.read_bytes_from_path(paths[2])
+    engine.read_bytes_from_path(paths[1])
+
+    engine.write_bytes_to_path(paths[3], b"x" * 10)
+    engine.close()
+
+    assert fast.list_paths() == [paths[0], paths[1], paths[3]]
+
+
+def test_files_are_not_evicted_before_they_are_demoted(fast, slow):
+    engine = TieredStorageEngine(fast, FailingEngine(repository=slow.repository), capacity=10)
+    paths = [pathlib.Path(f"job/{i}") for i in range(3)]
+    for path in paths:
+        engine.write_bytes_to_path(path, b"x" * 10)
+
+    with pytest.raises(OSError, match="3 files could not be demoted"):
+        engine.flush()
+    assert fast.list_paths() == paths
+    assert all(engine.read_bytes_from_path(path) == b"x" * 10 for path in paths)
+    with pytest.raises(OSError):
+        engine.close()
+
+
+def test_delete_removes_both_tiers(engine, fast, slow):
+    path = pathlib.Path("job/video.mp4")
+    engine.write_bytes_to_path(path, b"video")
+
+    engine.delete_path(path)
+    engine.flush()
+
+    assert not engine.exists(path)
+    assert not fast.exists(path) and not slow.exists(path)
+    assert engine.stats().resident_bytes == 0
+
+
+def test_concurrent_use(fast, slow):
+    engine = TieredStorageEngine(fast, slow, capacity=100, demotion_workers=2)
+
+    def work(worker: int) -> None:
+        for i in range(20):
+            path = pathlib.Path(f"job-{worker}/{i % 5}")
+            engine.write_bytes_to_path(path, f"{worker}:{i}".encode())
+            assert engine.read_bytes_from_path(path) == f"{worker}:{i}".encode()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(work, range(4)))
+    engine.close()
+
+    for worker in range(4):
+        for i in range(15, 20):
+            assert slow.read_bytes_from_path(pathlib.Path(f"job-{worker}/{i % 5}")) == f"{worker}:{i}".encode()
+    assert engine.stats().resident_bytes <= 100
+
+
+def test_invalid_arguments_raise_value_error(fast, slow):
+    with pytest.raises(ValueError):
+        TieredStorageEngine(fast, slow, capacity=-1)
+    with pytest.raises(ValueError):
+        TieredStorageEngine(fast, slow, capacity=10, policy="fifo")  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        TieredStorageEngine(fast, slow, capacity=10, max_dirty_bytes=-1)
+
+
+def test_evicted_files_are_deleted_without_holding_the_engine_lock(tmp_path, slow):
+    locked_while_deleting = []
+
+    class RecordingEngine(LocalStorageEngine):
+        def delete_path(self, path: pathlib.Path) -> None:
+            locked_while_deleting.append(engine._lock.locked())
+            super().delete_path(path)
+
+    engine = TieredStorageEngine(RecordingEngine(repository=tmp_path / "fast", index=True), slow, capacity=10)
+    for i in range(3):
+        engine.write_bytes_to_path(pathlib.Path(f"job/{i}"), b"x" * 10)
+        engine.flush()
+    engine.close()
+
+    assert locked_while_deleting == [False, False]
+    assert engine.fast.list_paths() == [pathlib.Path("job/2")]
+    assert engine.stats().evictions == 2
+
+
+def test_writes_wait_for_demotions_over_max_dirty_bytes(fast, slow):
+    demoting = threading.Event()
+
+    class GatedEngine(LocalStorageEngine):
+        def write_stream_to_path(self, path, stream):
+            demoting.wait()
+            return super().write_stream_to_path(path, stream)
+
+    engine = TieredStorageEngine(fast, GatedEngine(repository=slow.repository), capacity=100, max_dirty_bytes=10)
+    engine.write_bytes_to_path(pathlib.Path("job/0"), b"x" * 10)
+    engine.write_bytes_to_path(pathlib.Path("job/1"), b"x" * 10)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        writing = executor.submit(engine.write_bytes_to_path, pathlib.Path("job/2"), b"x" * 10)
+        with pytest.raises(concurrent.futures.TimeoutError):
+            writing.result(timeout=0.2)
+        assert not fast.exists(pathlib.Path("job/2"))
+        demoting.set()
+        assert writing.result(timeout=10) == 10
+    engine.close()
+
+    assert engine.stats().dirty_bytes == 0
+    assert slow.read_bytes_from_path(pathlib.Path("job/2")) == b"x" * 10
+
+
+def test_writes_fail_when_files_over_max_dirty_bytes_cannot_be_demoted(fast, slow):
+    engine = TieredStorageEngine(fast, FailingEngine(repository=slow.repository), capacity=100, max_dirty_bytes=0)
+    engine.write_bytes_to_path(pathlib.Path("job/0"), b"x" * 10)
+
+    with pytest.raises(OSError, match="10 bytes could not be demoted"):
+        engine.write_bytes_to_path(pathlib.Path("job/1"), b"x" * 10)
+    assert engine.read_bytes_from_path(pathlib.Path("job/0")) == b"x" * 10
+    engine.delete_path(pathlib.Path("job/0"))
+    assert engine.stats().dirty_bytes == 0
+    engine.close()
@@ -0,0 +1,35 @@
+import hashlib
+import importlib
+import sys
+
+import pytest
+
+from yt_dlp_server.storage.digest import XXHASH_ALGORITHMS, new_hasher
+
+
+@pytest.mark.parametrize("algorithm", ["sha256", "blake2b", "md5"])
+def test_hashlib_algorithms(algorithm):
+    hasher = new_hasher(algorithm)
+    hasher.update(b"hello ")
+    hasher.update(b"world")
+    assert hasher.hexdigest() == hashlib.new(algorithm, b"hello world").hexdigest()
+
+
+def test_unknown_algorithm_raises_value_error():
+    with pytest.raises(ValueError):
+        new_hasher("not-a-digest")
+
+
+@pytest.mark.parametrize("algorithm", XXHASH_ALGORITHMS)
+def test_xxhash_algorithms(algorithm):
+    xxhash = importlib.import_module("xxhash")
+    hasher = new_hasher(algorithm)
+    hasher.update(b"hello ")
+    hasher.update(b"world")
+    assert hasher.hexdigest() == getattr(xxhash, algorithm)(b"hello world").hexdigest()
+
+
+def test_xxhash_without_the_package_raises_value_error(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setitem(sys.modules, "xxhash", None)
+    with pytest.raises(ValueError, match="xxhash"):
+        new_hasher("xxh3_64")
@@ -0,0 +1,89 @@
+import pathlib
+import threading
+
+import pytest
+
+from yt_dlp_server.storage.digest import WriteResult
+from yt_dlp_server.storage.index import MetadataIndex
+
+
+@pytest.fixture
+def index(tmp_path: pathlib.Path):
+    index = MetadataIndex(tmp_path / "index.sqlite3")
+    yield index
+    index.close()
+
+
+def test_put_and_get(index: MetadataIndex):
+    digest = WriteResult(5, "sha256", "abc")
+    index.put(pathlib.PurePath("job/video.mp4"), 5, 1.5, digest)
+    index.put(pathlib.PurePath("loose.txt"), 3, 2.5)
+
+    video = index.get(pathlib.PurePath("job/video.mp4"))
+    loose = index.get(pathlib.PurePath("loose.txt"))
+
+    assert video is not None and (video.size, video.mtime, video.job_id, video.digest) == (5, 1.5, "job", digest)
+    assert loose is not None and (loose.job_id, loose.digest) == (None, None)
+    assert index.get(pathlib.PurePath("missing")) is None
+
+
+def test_put_replaces_and_remove_forgets(index: MetadataIndex):
+    path = pathlib.PurePath("job/video.mp4")
+    index.put(path, 5, 1.0)
+    index.put(path, 7, 2.0)
+
+    assert index.total_size() == 7
+    index.remove(path)
+    assert not index.exists(path)
+    assert index.total_size() == 0
+
+
+def test_prefix_matches_whole_components(index: MetadataIndex):
+    for path, size in [("job/a.mp4", 1), ("job/sub/b.mp4", 2), ("job.old/c.mp4", 4), ("job2/d.mp4", 8), ("job", 16)]:
+        index.put(pathlib.PurePath(path), size, 0.0)
+
+    assert index.list_paths(pathlib.PurePath("job")) == [
+        pathlib.PurePath(path) for path in ["job", "job/a.mp4", "job/sub/b.mp4"]
+    ]
+    assert index.total_size(pathlib.PurePath("job")) == 19
+    assert index.total_size(pathlib.PurePath("job/sub")) == 2
+    assert index.total_size() == 31
+    assert len(index.list_paths()) == 5
+
+
+def test_persists_across_connections(tmp_path: pathlib.Path):
+    first = MetadataIndex(tmp_path / "index.sqlite3")
+    first.put(pathlib.PurePath("job/video.mp4"), 5, 0.0)
+    first.close()
+
+    second = MetadataIndex(tmp_path / "index.sqlite3")
+    assert second.exists(pathlib.PurePath("job/video.mp4"))
+    second.close()
+
+
+def test_concurrent_writers(index: MetadataIndex):
+    def write(worker: int) -> None:
+        for i in range(50):
+            index.put(pathlib.PurePath(f"job-{worker}/{i}"), 1, 0.0)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert index.total_size() == 200
+    assert len(index.list_paths(pathlib.PurePath("job-3"))) == 50
+
+
+def test_set_digest_keeps_the_rest_of_the_record(index: MetadataIndex):
+    path = pathlib.PurePath("job/video.mp4")
+    assert not index.set_digest(path, WriteResult(5, "sha256", "ab"))
+
+    index.put(path, 5, 1.0)
+    assert index.set_digest(path, WriteResult(5, "sha256", "ab"))
+
+    metadata = index.get(path)
+    assert metadata is not None
+    assert (metadata.size, metadata.mtime, metadata.job_id) == (5, 1.0, "job")
+    assert metadata.digest == WriteResult(5, "sha256", "ab")
@@ -0,0 +1,102 @@
+import json
+import pathlib
+
+import pytest
+
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.storage.layout import FlatLayout, ShardedLayout, main, migrate_layout, parse_layout
+
+
+def test_sharded_layout_maps_both_ways():
+    layout = ShardedLayout(levels=2, width=2)
+    logical = pathlib.PurePath("job/video.mp4")
+
+    physical = layout.physical(logical)
+
+    assert physical.parts[2:] == ("job", "video.mp4")
+    assert all(len(part) == 2 and int(part, 16) >= 0 for part in physical.parts[:2])
+    assert layout.logical(physical) == logical
+    assert layout.contains(physical)
+    assert layout.logical(pathlib.PurePath("job/video.mp4")) is None
+    wrong_shards = pathlib.PurePath("zz", "zz", "job", "video.mp4")
+    assert layout.logical(wrong_shards) is None
+    assert not layout.contains(wrong_shards)
+
+
+def test_sharding_spreads_files():
+    layout = ShardedLayout(levels=1, width=1)
+    shards = {layout.physical(pathlib.PurePath(f"job/{i}.mp4")).parts[0] for i in range(1000)}
+    assert len(shards) == 16
+
+
+@pytest.mark.parametrize(
+    ("spec", "layout"),
+    [("flat", FlatLayout()), ("sharded", ShardedLayout()), ("sharded:3x1", ShardedLayout(levels=3, width=1))],
+)
+def test_parse_layout(spec, layout):
+    assert parse_layout(spec) == layout
+
+
+@pytest.mark.parametrize("spec", ["nested", "sharded:0x2", "sharded:2x9"])
+def test_parse_invalid_layout_raises_value_error(spec):
+    with pytest.raises(ValueError):
+        parse_layout(spec)
+
+
+def test_sharded_engine_is_transparent(tmp_path: pathlib.Path):
+    engine = LocalStorageEngine(repository=tmp_path, layout=ShardedLayout(), digest_sidecars=True)
+    path = pathlib.Path("job/video.mp4")
+
+    engine.write_bytes_to_path(path, b"video")
+
+    assert engine.read_bytes_from_path(path) == b"video"
+    assert engine.verify_path(path)
+    assert not (tmp_path / "job").exists()
+    assert (tmp_path / ShardedLayout().physical(path)).read_bytes() == b"video"
+    engine.delete_path(path)
+    assert not (tmp_path / ShardedLayout().physical(path)).exists()
+
+
+def test_online_migration(tmp_path: pathlib.Path):
+    """Test that a repository stays readable while it is moved to a sharded layout, and back."""
+    flat = LocalStorageEngine(repository=tmp_path, digest_sidecars=True)
+    paths = [pathlib.Path(f"job-{i % 3}/video-{i}.mp4") for i in range(20)]
+    for path in paths:
+        flat.write_bytes_to_path(path, path.name.encode())
+    migrating = LocalStorageEngine(
+        repository=tmp_path, layout=ShardedLayout(), previous_layout=FlatLayout(), digest_sidecars=True
+    )
+
+    assert all(migrating.read_bytes_from_path(path) == path.name.encode() for path in paths)
+    stats = migrate_layout(tmp_path, FlatLayout(), ShardedLayout())
+
+    assert (stats.moved, stats.skipped, stats.failed) == (20, 0, 0)
+    assert all(migrating.read_bytes_from_path(path) == path.name.encode() for path in paths)
+    assert all(migrating.verify_path(path) for path in paths)
+    assert not any((tmp_path / f"job-{i}").exists() for i in range(3))
+    assert migrate_layout(tmp_path, FlatLayout(), ShardedLayout()).moved == 0
+
+    assert migrate_layout(tmp_path, ShardedLayout(), FlatLayout()).moved == 20
+    assert all(flat.read_bytes_from_path(path) == path.name.encode() for path in paths)
+    assert all(flat.verify_path(path) for path in paths)
+
+
+def test_migration_leaves_internal_files_alone(tmp_path: pathlib.Path):
+    engine = LocalStorageEngine(repository=tmp_path, digest_sidecars=True)
+    engine.write_bytes_to_path(pathlib.Path("video.mp4"), b"video")
+    (tmp_path / ".cas").mkdir()
+    (tmp_path / ".cas" / "object").write_bytes(b"object")
+
+    migrate_layout(tmp_path, FlatLayout(), ShardedLayout())
+
+    assert (tmp_path / ".cas" / "object").exists()
+    assert (tmp_path / ".digests" / f"{ShardedLayout().physical(pathlib.PurePath('video.mp4'))}.json").exists()
+
+
+def test_main_reports_a_dry_run(tmp_path: pathlib.Path, capsys):
+    LocalStorageEngine(repository=tmp_path).write_bytes_to_path(pathlib.Path("video.mp4"), b"video")
+
+    assert main([str(tmp_path), "--dry-run"]) == 0
+
+    assert json.loads(capsys.readouterr().out) == {"moved": 1, "skipped": 0, "failed": 0}
+    assert (tmp_path / "video.mp4").exists()
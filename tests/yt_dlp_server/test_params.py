@@ -0,0 +1,202 @@
+import pydantic
+import pytest
+import yt_dlp
+
+from yt_dlp_server import params as params_module
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.params import IGNORED, PASSTHROUGH, RENAMED, build_ytdl_params, ytdl_params
+
+# Settings translated by dedicated logic in build_ytdl_params.
+TRANSLATED = {
+    "use_extractors",
+    "wait_for_video",
+    "no_colors",
+    "force_colors",
+    "source_address",
+    "force_ip",
+    "playlist_items",
+    "date",
+    "datebefore",
+    "dateafter",
+    "match_filters",
+    "break_on_match",
+    "subpart",
+    "retries",
+    "fragment_retries",
+    "extractor_retries",
+    "external_downloader",
+    "external_downloader_args",
+    "outtmpl",
+    "trim_file_name",
+    "nooverwrites",
+    "cookiesfrombrowser",
+    "dumpjson",
+    "print_json",
+    "print_to_file",
+    "user_agent",
+    "referer",
+    "http_headers",
+    "extractor_args",
+    "youtube_include_dash_manifest",
+    "youtube_include_hls_manifest",
+    "extractaudio",
+    "audioformat",
+    "audioquality",
+    "remuxvideo",
+    "recodevideo",
+    "nopostoverwrites",
+    "embedsubtitles",
+    "embedthumbnail",
+    "addmetadata",
+    "addchapters",
+    "embedinfojson",
+    "parse_metadata",
+    "replace_in_metadata",
+    "xattrs",
+    "concat_playlist",
+    "exec",
+    "convertsubtitles",
+    "sponsorblock_mark",
+    "sponsorblock_remove",
+    "sponsorblock_chapter_title",
+    "no_sponsorblock",
+    "sponsorblock_api",
+}
+
+
+def test_every_setting_is_translated():
+    """Test that no setting is silently dropped from the translation."""
+    handled = set(PASSTHROUGH) | set(RENAMED) | set(IGNORED) | TRANSLATED
+    assert set(YtDlpSettings.model_fields) == handled
+
+
+def test_defaults_translate():
+    params = build_ytdl_params(YtDlpSettings())
+    assert params["format"] == "bestvideo+bestaudio/best"
+    assert params["allowed_extractors"] == ["default"]
+    assert params["retries"] == 10
+    assert params["playlist_items"] is None
+    assert params["wait_for_video"] is None
+    assert params["concurrent_fragment_downloads"] == 1
+    assert "outtmpl" not in params
+
+
+def test_renamed_and_derived_settings():
+    settings = YtDlpSettings(
+        concurrentfragments=4,
+        retries="infinite",
+        force_ip="6",
+        outtmpl="%(id)s.%(ext)s",
+        user_agent="agent",
+        http_headers={"X-Test": "1"},
+        extractor_args={"youtube": {"player_client": "web,android"}},
+        youtube_include_hls_manifest=False,
+        playlist_items="1:3",
+    )
+    params = build_ytdl_params(settings)
+    assert params["concurrent_fragment_downloads"] == 4
+    assert params["retries"] == float("inf")
+    assert params["source_address"] == "::"
+    assert params["outtmpl"] == "%(id)s.%(ext)s"
+    assert params["http_headers"] == {"X-Test": "1", "User-Agent": "agent"}
+    assert params["extractor_args"] == {"youtube": {"player_client": ["web", "android"], "skip": ["hls"]}}
+    assert params["playlist_items"] == "1:3"
+
+
+def test_postprocessors():
+    settings = YtDlpSettings(
+        extractaudio=True,
+        audioformat="mp3",
+        recodevideo="mp4",
+        embedsubtitles=True,
+        addchapters=False,
+        parse_metadata=["title:%(artist)s - %(title)s"],
+        exec=["echo done"],
+    )
+    keys = [pp["key"] for pp in build_ytdl_params(settings)["postprocessors"]]
+    assert keys == ["MetadataParser", "FFmpegExtractAudio", "FFmpegVideoConvertor", "FFmpegEmbedSubtitle", "Exec"]
+
+
+def test_params_construct_youtube_dl():
+    """Test that the translated params are accepted by YoutubeDL."""
+    settings = YtDlpSettings(
+        quiet=True,
+        match_filters=["duration > 60"],
+        date="20240101",
+        subpart=(10, 20),
+        extractaudio=True,
+        sponsorblock_remove=["sponsor"],
+    )
+    with yt_dlp.YoutubeDL(build_ytdl_params(settings)) as ydl:
+        assert ydl.params["daterange"].start is not None
+
+
+def test_settings_are_immutable():
+    settings = YtDlpSettings()
+    with pytest.raises(pydantic.ValidationError):
+        settings.quiet = True
+    assert settings.model_copy(update={"quiet": True}).quiet
+
+
+def test_content_hash_is_stable_and_content_based():
+    assert YtDlpSettings().content_hash() == YtDlpSettings().content_hash()
+    assert YtDlpSettings().content_hash() != YtDlpSettings(quiet=True).content_hash()
+
+
+def test_params_are_built_once_per_distinct_settings(monkeypatch):
+    built = []
+
+    def counting_build(settings):
+        built.append(settings)
+        return build_ytdl_params(settings)
+
+    monkeypatch.setattr(params_module, "build_ytdl_params", counting_build)
+    monkeypatch.setattr(params_module, "_params_cache", type(params_module._params_cache)())
+    settings = YtDlpSettings(ratelimit=123)
+
+    first = settings.to_ytdl_params()
+    second = YtDlpSettings(ratelimit=123).to_ytdl_params()
+    YtDlpSettings(ratelimit=456).to_ytdl_params()
+
+    assert len(built) == 2
+    assert first == build_ytdl_params(settings)
+    # Nested structures are shared, not copied.
+    assert first["http_headers"] is second["http_headers"]
+    assert first["postprocessor_args"] is second["postprocessor_args"]
+
+
+def test_overrides_and_writes_do_not_leak_between_overlays():
+    settings = YtDlpSettings(quiet=True)
+    overlay = ytdl_params(settings, {"paths": {"home": "/tmp/job"}})
+
+    overlay["quiet"] = False
+    overlay["new"] = 1
+
+    fresh = ytdl_params(settings)
+    assert overlay["paths"] == {"home": "/tmp/job"}
+    assert fresh["paths"] == {}
+    assert fresh["quiet"] is True
+    assert "new" not in fresh
+
+
+def test_params_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(params_module, "_params_cache", type(params_module._params_cache)())
+    monkeypatch.setattr(params_module, "PARAMS_CACHE_SIZE", 2)
+
+    for ratelimit in range(5):
+        ytdl_params(YtDlpSettings(ratelimit=ratelimit))
+
+    assert len(params_module._params_cache) == 2
+
+
+def test_overlay_params_construct_youtube_dl():
+    """Test that YoutubeDL accepts an overlay and keeps its own writes out of the shared params."""
+    settings = YtDlpSettings(quiet=True, outtmpl="%(id)s.%(ext)s", http_headers={"X-Test": "1"})
+
+    with yt_dlp.YoutubeDL(settings.to_ytdl_params()) as ydl:
+        assert ydl.params["outtmpl"]["default"] == "%(id)s.%(ext)s"
+        assert ydl.params["http_headers"]["X-Test"] == "1"
+
+    shared = ytdl_params(settings)
+    assert shared["outtmpl"] == "%(id)s.%(ext)s"
+    assert shared["http_headers"] == {"X-Test": "1"}
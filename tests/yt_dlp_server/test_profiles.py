@@ -0,0 +1,83 @@
+import json
+import pathlib
+
+import pydantic
+import pytest
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.profiles import ProfileMatcher, ProfileRule, extractor_key
+
+
+@pytest.fixture
+def matcher() -> ProfileMatcher:
+    return ProfileMatcher(
+        [
+            ProfileRule(hosts=["example.com"], settings={"concurrentfragments": 4, "buffersize": 1024}),
+            ProfileRule(hosts=["cdn.example.com"], settings={"concurrentfragments": 16}),
+            ProfileRule(hosts=["example.org", "EXAMPLE.net."], settings={"http_chunk_size": 10485760}),
+            ProfileRule(extractors=["Youtube"], settings={"sleep_requests": 0.5, "concurrentfragments": 8}),
+        ],
+        base=YtDlpSettings(),
+    )
+
+
+def test_hosts_match_themselves_and_their_subdomains(matcher):
+    assert matcher.overrides_for("https://example.com/a", extractor="Generic") == {
+        "concurrentfragments": 4,
+        "buffersize": 1024,
+    }
+    assert matcher.overrides_for("https://www.Example.com:8080/a", extractor="Generic") == {
+        "concurrentfragments": 4,
+        "buffersize": 1024,
+    }
+    assert matcher.overrides_for("https://a.example.net/b", extractor="Generic") == {"http_chunk_size": 10485760}
+    assert matcher.overrides_for("https://notexample.com/a", extractor="Generic") == {}
+    assert matcher.overrides_for("https://com/a", extractor="Generic") == {}
+
+
+def test_more_specific_hosts_and_extractors_win(matcher):
+    assert matcher.overrides_for("https://edge.cdn.example.com/a", extractor="Generic") == {
+        "concurrentfragments": 16,
+        "buffersize": 1024,
+    }
+    assert matcher.overrides_for("https://cdn.example.com/a", extractor="youtube") == {
+        "concurrentfragments": 8,
+        "buffersize": 1024,
+        "sleep_requests": 0.5,
+    }
+
+
+def test_extractor_is_determined_from_the_url(matcher):
+    assert extractor_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ") == "Youtube"
+    assert matcher.match("https://www.youtube.com/watch?v=dQw4w9WgXcQ") == [matcher.rules[3]]
+
+
+def test_extractor_keys_are_cached_per_url(monkeypatch):
+    extractor_key.cache_clear()
+    extractor_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    monkeypatch.setattr("yt_dlp_server.profiles._extractor_classes", lambda: pytest.fail("extractors scanned"))
+
+    assert extractor_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ") == "Youtube"
+
+
+def test_extractor_is_not_determined_without_extractor_rules(monkeypatch):
+    monkeypatch.setattr("yt_dlp_server.profiles.extractor_key", lambda url: pytest.fail("extractor looked up"))
+    matcher = ProfileMatcher([ProfileRule(hosts=["example.com"], settings={"buffersize": 1})], base=YtDlpSettings())
+
+    assert matcher.overrides_for("https://example.com/a") == {"buffersize": 1}
+
+
+def test_invalid_rule_settings_raise_validation_error():
+    with pytest.raises(pydantic.ValidationError):
+        ProfileMatcher([ProfileRule(hosts=["example.com"], settings={"concurrentfragments": "many"})])
+    with pytest.raises(pydantic.ValidationError):
+        ProfileMatcher([ProfileRule(hosts=["example.com"], settings={"no_such_setting": 1})])
+
+
+def test_rules_load_from_json(tmp_path: pathlib.Path):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps([{"hosts": ["example.com"], "settings": {"buffersize": 2048}}]))
+
+    matcher = ProfileMatcher.from_file(path, base=YtDlpSettings())
+
+    assert matcher.overrides_for("https://example.com/a") == {"buffersize": 2048}
@@ -0,0 +1,98 @@
+import os
+import pathlib
+import signal
+import time
+
+import pytest
+
+from yt_dlp_server import config
+from yt_dlp_server.config import YtDlpSettings, derive_settings, get_settings, reload_settings
+from yt_dlp_server.params import ytdl_params
+from yt_dlp_server.reload import SettingsReloader
+from yt_dlp_server.workers.download import INFO_CACHE, YTDL_POOL
+
+
+@pytest.fixture(autouse=True)
+def restore_settings():
+    previous = config._settings
+    yield
+    config._settings = previous
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        time.sleep(0.01)
+
+
+def test_reload_settings_swaps_the_global_settings():
+    old = get_settings()
+    new = YtDlpSettings(ratelimit=1000)
+    derived = derive_settings({"format": "worst"}, old)
+
+    assert reload_settings(new) is old
+    assert get_settings() is new
+    assert config.SETTINGS is new
+    assert old.ratelimit is None
+    assert derive_settings({"format": "worst"}, old) is not derived
+
+
+def test_reloader_reads_the_watched_file(tmp_path: pathlib.Path, monkeypatch):
+    monkeypatch.delenv("YT_DLP_RATELIMIT", raising=False)
+    path = tmp_path / "settings.env"
+    path.write_text("YT_DLP_RATELIMIT=1000\n")
+    reloader = SettingsReloader(path)
+
+    assert not reloader.check()
+    reloader.reload()
+    assert get_settings().ratelimit == 1000
+
+    path.write_text("YT_DLP_RATELIMIT=2000\nYT_DLP_PROXY=http://proxy.example:3128\n")
+    os.utime(path, ns=(time.time_ns() + 10**9,) * 2)
+    assert reloader.check()
+    assert (get_settings().ratelimit, get_settings().proxy) == (2000, "http://proxy.example:3128")
+    assert not reloader.check()
+
+
+def test_invalid_file_keeps_the_current_settings(tmp_path: pathlib.Path):
+    path = tmp_path / "settings.env"
+    path.write_text("YT_DLP_SOCKET_TIMEOUT=soon\n")
+    current = get_settings()
+
+    assert SettingsReloader(path).reload() is None
+    assert get_settings() is current
+
+
+def test_reload_invalidates_derived_state():
+    params = ytdl_params(get_settings())
+    INFO_CACHE.put("https://example.com/a", get_settings(), {"id": "a"})
+    with YTDL_POOL.lease(YtDlpSettings()) as ydl:
+        pass
+
+    SettingsReloader(loader=lambda: YtDlpSettings(proxy="http://proxy.example:3128")).reload()
+
+    assert ytdl_params(YtDlpSettings()).maps[-1] is not params.maps[-1]
+    assert INFO_CACHE.stats().entries == 0
+    assert ydl.params.get("proxy") is None
+    assert YTDL_POOL.stats().idle == 0
+
+
+def test_signal_triggers_a_reload_on_the_watcher_thread():
+    reloaded = []
+    reloader = SettingsReloader(
+        interval=60,
+        loader=lambda: YtDlpSettings(ratelimit=1234),
+        on_reload=lambda previous, settings: reloaded.append(settings),
+    )
+    reloader.install_signal_handler(signal.SIGUSR1)
+    reloader.start()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        wait_for(lambda: reloaded)
+    finally:
+        reloader.stop()
+
+    assert get_settings().ratelimit == 1234
+    assert signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL
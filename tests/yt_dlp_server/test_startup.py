@@ -0,0 +1,91 @@
+"""Startup benchmark: importing yt_dlp_server modules must stay cheap."""
+
+import concurrent.futures
+import json
+import os
+import pkgutil
+import subprocess
+import sys
+
+import pytest
+
+import yt_dlp_server
+
+# Modules that are only imported when they are used.
+HEAVY_MODULES = ("yt_dlp", "pydantic_settings")
+
+# Import budgets in seconds, generous enough for slow CI machines. The package
+# root is what CLI commands and health checks pay for before doing anything.
+ROOT_BUDGET = 0.05
+MODULE_BUDGET = 1.0
+
+# Imports are timed in CPU time, which unlike wall-clock time does not depend
+# on how many probes share the machine's cores.
+_PROBE = """
+import json, sys, time
+started = time.process_time()
+import {module}
+elapsed = time.process_time() - started
+print(json.dumps({{"seconds": elapsed, "heavy": sorted(set(sys.modules) & set({heavy!r}))}}))
+"""
+
+
+def all_modules() -> list[str]:
+    return [yt_dlp_server.__name__] + sorted(
+        info.name for info in pkgutil.walk_packages(yt_dlp_server.__path__, f"{yt_dlp_server.__name__}.")
+    )
+
+
+def measure_import(module: str) -> dict:
+    """Import `module` in a fresh interpreter and report how long it took and which heavy modules it loaded."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+@pytest.fixture(scope="module")
+def import_costs() -> dict[str, dict]:
+    modules = all_modules()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        return dict(zip(modules, executor.map(measure_import, modules), strict=True))
+
+
+def test_no_module_imports_yt_dlp(import_costs):
+    assert [module for module, cost in import_costs.items() if "yt_dlp" in cost["heavy"]] == []
+
+
+def test_only_config_imports_pydantic_settings(import_costs):
+    importers = [module for module, cost in import_costs.items() if "pydantic_settings" in cost["heavy"]]
+    assert importers == ["yt_dlp_server.config"]
+
+
+def test_import_times_are_within_budget(import_costs):
+    assert import_costs["yt_dlp_server"]["seconds"] < ROOT_BUDGET
+    slow = {module: cost["seconds"] for module, cost in import_costs.items() if cost["seconds"] >= MODULE_BUDGET}
+    assert slow == {}
+
+
+def test_settings_are_built_on_first_access():
+    code = (
+        "import yt_dlp_server.config as config\n"
+        "assert config._settings is None\n"
+        "settings = config.SETTINGS\n"
+        "assert settings is config.get_settings()\n"
+        "from yt_dlp_server.config import SETTINGS\n"
+        "assert SETTINGS is settings\n"
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path), "YT_DLP_FORMAT": "worst"}
+    subprocess.run([sys.executable, "-c", code + "assert settings.format == 'worst'\n"], env=env, check=True)
+
+
+def test_unknown_config_attribute_raises_attribute_error():
+    import yt_dlp_server.config as config
+
+    with pytest.raises(AttributeError):
+        _ = config.NOT_A_SETTING
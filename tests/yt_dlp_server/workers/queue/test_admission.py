@@ -0,0 +1,158 @@
+import pytest
+
+from yt_dlp_server.workers.queue.admission import AdmissionControlledQueue, AdmissionRejectedError
+from yt_dlp_server.workers.queue.base import FullError
+from yt_dlp_server.workers.queue.impl.stl import STLQueue
+from yt_dlp_server.workers.task import Task
+
+
+class FakeClock:
+    """A manually advanced clock for deterministic rate measurements."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def task() -> Task:
+    """Provides a simple Task instance for tests."""
+    return Task(url="https://example.com/video.mp4")
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    """Provides a fake clock starting at zero."""
+    return FakeClock()
+
+
+def make_queue(clock: FakeClock, **kwargs) -> AdmissionControlledQueue:
+    options = {"target_latency": 2.0, "interval": 1.0, "smoothing": 1.0}
+    options.update(kwargs)
+    return AdmissionControlledQueue(STLQueue(), clock=clock, **options)
+
+
+def drain_at_rate(queue: AdmissionControlledQueue, clock: FakeClock, task: Task, per_second: int) -> None:
+    """Run one full measurement window in which `per_second` items are consumed."""
+    for _ in range(per_second):
+        queue.put(task)
+        queue.get()
+        queue.task_done()
+    clock.advance(1.0)
+
+
+def test_admits_everything_before_drain_rate_is_known(clock: FakeClock, task: Task):
+    """Test that puts are admitted while no drain rate has been measured."""
+    q = make_queue(clock)
+    for _ in range(100):
+        q.put_nowait(task)
+    assert q.qsize() == 100
+    assert q.drain_rate is None
+    assert q.backlog_limit is None
+
+
+def test_backlog_limit_follows_drain_rate(clock: FakeClock, task: Task):
+    """Test that the backlog limit is the drain rate times the target latency."""
+    q = make_queue(clock)
+    drain_at_rate(q, clock, task, per_second=5)
+    assert q.drain_rate == pytest.approx(5.0)
+    assert q.backlog_limit == 10
+
+
+def test_backlog_limit_respects_min_and_max(clock: FakeClock, task: Task):
+    """Test that the backlog limit is clamped to min_backlog and max_backlog."""
+    q = make_queue(clock, min_backlog=3, max_backlog=8)
+    assert q.backlog_limit == 8
+    drain_at_rate(q, clock, task, per_second=1)
+    assert q.backlog_limit == 3
+    drain_at_rate(q, clock, task, per_second=10)
+    assert q.backlog_limit == 8
+
+
+def test_bursts_are_absorbed_for_one_interval(clock: FakeClock, task: Task):
+    """Test that a backlog above the limit is tolerated until a full interval has passed."""
+    q = make_queue(clock)
+    drain_at_rate(q, clock, task, per_second=1)
+    assert q.backlog_limit == 2
+    for _ in range(5):
+        q.put_nowait(task)
+    clock.advance(0.5)
+    q.put_nowait(task)
+    clock.advance(0.5)
+    with pytest.raises(AdmissionRejectedError):
+        q.put_nowait(task)
+
+
+def test_rejection_is_fast_and_carries_retry_after(clock: FakeClock, task: Task):
+    """Test that a blocking put is rejected immediately with a retry-after hint."""
+    q = make_queue(clock, max_backlog=2)
+    drain_at_rate(q, clock, task, per_second=4)
+    q.put(task)
+    q.put(task)
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        q.put(task, block=True, timeout=None)
+    assert exc_info.value.retry_after > 0
+    assert isinstance(exc_info.value, FullError)
+
+
+def test_overload_clears_when_backlog_drains(clock: FakeClock, task: Task):
+    """Test that admission resumes once the estimated delay falls below target."""
+    q = make_queue(clock)
+    drain_at_rate(q, clock, task, per_second=1)
+    for _ in range(3):
+        q.put_nowait(task)
+    clock.advance(1.0)
+    with pytest.raises(AdmissionRejectedError):
+        q.put_nowait(task)
+    q.get()
+    q.get()
+    clock.advance(1.0)
+    assert q.backlog_limit == 4
+    q.put_nowait(task)
+    assert q.qsize() == 2
+
+
+def test_stalled_consumers_decay_drain_rate(clock: FakeClock, task: Task):
+    """Test that the drain rate decays when consumers stop taking items."""
+    q = make_queue(clock, smoothing=0.5)
+    drain_at_rate(q, clock, task, per_second=8)
+    assert q.drain_rate == pytest.approx(8.0)
+    clock.advance(1.0)
+    assert q.drain_rate == pytest.approx(4.0)
+
+
+def test_long_idle_periods_decay_drain_rate_per_window(clock: FakeClock, task: Task):
+    """Test that the drain rate decays once for every window that passed while idle."""
+    q = make_queue(clock, smoothing=0.5)
+    drain_at_rate(q, clock, task, per_second=8)
+    assert q.drain_rate == pytest.approx(8.0)
+    clock.advance(3.0)
+    assert q.drain_rate == pytest.approx(1.0)
+
+
+def test_delegates_to_wrapped_queue(clock: FakeClock, task: Task):
+    """Test that get, qsize, task_done and join are delegated to the wrapped queue."""
+    inner = STLQueue()
+    q = AdmissionControlledQueue(inner, clock=clock)
+    q.put(task)
+    assert inner.qsize() == 1
+    assert q.get() is task
+    q.task_done()
+    q.join()
+    with pytest.raises(ValueError):
+        q.task_done()
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"target_latency": 0}, {"interval": -1}, {"smoothing": 0}, {"smoothing": 1.5}],
+)
+def test_invalid_parameters_raise_value_error(kwargs):
+    """Test that invalid tuning parameters are rejected."""
+    with pytest.raises(ValueError):
+        AdmissionControlledQueue(STLQueue(), **kwargs)
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from yt_dlp_server.workers.queue.benchmark import (
+    SCENARIOS,
+    BenchmarkConfig,
+    discover_queues,
+    main,
+    run_benchmarks,
+    summarize,
+)
+from yt_dlp_server.workers.queue.impl.stl import STLQueue
+
+
+@pytest.fixture
+def config() -> BenchmarkConfig:
+    """Provides a configuration small enough to run in the unit test suite."""
+    return BenchmarkConfig(
+        iterations=200,
+        batch_size=10,
+        producers=2,
+        consumers=3,
+        wakeup_rounds=5,
+        wakeup_delay=0.001,
+        warmup=10,
+    )
+
+
+def test_discover_queues_finds_stl_queue():
+    """Test that concrete implementations in the impl package are discovered."""
+    queues = discover_queues()
+    assert queues["STLQueue"] is STLQueue
+
+
+def test_summarize_percentiles():
+    """Test nearest-rank percentiles, reported in microseconds."""
+    summary = summarize([i * 1000 for i in range(1, 101)])
+    assert summary["p50"] == 50
+    assert summary["p90"] == 90
+    assert summary["p99"] == 99
+    assert summary["p99.9"] == 100
+    assert summary["max"] == 100
+
+
+def test_summarize_empty():
+    """Test that summarizing no samples yields an empty summary."""
+    assert summarize([]) == {}
+
+
+def test_run_benchmarks_reports_every_scenario(config: BenchmarkConfig):
+    """Test that every scenario runs and produces a JSON-serializable report."""
+    report = run_benchmarks(config, {"STLQueue": STLQueue})
+    json.dumps(report)
+    assert report["config"]["iterations"] == 200
+    results = report["results"]["STLQueue"]
+    assert [r["scenario"] for r in results] == list(SCENARIOS)
+    by_scenario = {r["scenario"]: r for r in results}
+    assert by_scenario["single"]["operations"] == 400
+    assert by_scenario["batched"]["operations"] == 400
+    assert by_scenario["mpmc"]["operations"] == 400
+    assert by_scenario["wakeup"]["operations"] == 5
+    for result in results:
+        assert result["ops_per_second"] > 0
+        assert result["latency_us"]["max"] >= result["latency_us"]["p50"]
+
+
+def test_main_writes_json(capsys):
+    """Test the command-line entry point."""
+    main(["--iterations", "50", "--warmup", "0", "--scenario", "single", "--queue", "STLQueue"])
+    report = json.loads(capsys.readouterr().out)
+    assert [r["scenario"] for r in report["results"]["STLQueue"]] == ["single"]
+
+
+def test_main_rejects_unknown_queue():
+    """Test that an unknown queue name is a usage error."""
+    with pytest.raises(SystemExit):
+        main(["--queue", "NoSuchQueue"])
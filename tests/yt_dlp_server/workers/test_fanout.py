@@ -0,0 +1,172 @@
+import pathlib
+
+import pytest
+from yt_dlp.utils import OnDemandPagedList
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.db.impl.sqlite import SQLiteDB
+from yt_dlp_server.db.models import Task as DBTask
+from yt_dlp_server.db.models import TaskStatus
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.workers.fanout import fan_out, walk_entries
+from yt_dlp_server.workers.pool import WorkerPool
+from yt_dlp_server.workers.queue.impl.stl import STLQueue
+
+
+@pytest.fixture
+def db():
+    database = SQLiteDB()
+    database.connect(":memory:")
+    database.create_tables()
+    yield database
+    if database.connection:
+        database.connection.close()
+
+
+@pytest.fixture
+def queue() -> STLQueue:
+    return STLQueue()
+
+
+def drain(queue: STLQueue) -> list:
+    items = []
+    while queue.qsize():
+        items.append(queue.get())
+        queue.task_done()
+    return items
+
+
+def test_fan_out_adds_and_enqueues_every_entry(db, queue):
+    urls = [f"https://example.com/{i}" for i in range(25)]
+
+    added = fan_out("https://example.com/list", "job", db, queue, chunk_size=10, lister=lambda u, s: urls)
+
+    assert added == 25
+    tasks = drain(queue)
+    assert [t.url for t in tasks] == urls
+    assert {t.job_id for t in tasks} == {"job"}
+    assert all(db.get_task(DBTask(job_id="job", url=url)) is not None for url in urls)
+
+
+def test_fan_out_enqueues_before_listing_finishes(db, queue):
+    """Test that early chunks are enqueued while later entries are still being listed."""
+    seen_in_queue = []
+
+    def slow_lister(url, settings):
+        for i in range(30):
+            seen_in_queue.append(queue.qsize())
+            yield f"https://example.com/{i}"
+
+    fan_out("https://example.com/list", "job", db, queue, chunk_size=10, lister=slow_lister)
+
+    assert seen_in_queue[9] == 0
+    assert seen_in_queue[10] == 10
+    assert seen_in_queue[29] == 20
+    assert queue.qsize() == 30
+
+
+def test_fan_out_skips_existing_entries(db, queue):
+    urls = [f"https://example.com/{i}" for i in range(5)]
+    fan_out("https://example.com/list", "job", db, queue, lister=lambda u, s: urls[:3])
+    drain(queue)
+
+    added = fan_out("https://example.com/list", "job", db, queue, lister=lambda u, s: urls)
+
+    assert added == 2
+    assert [t.url for t in drain(queue)] == urls[3:]
+
+
+def test_fan_out_lists_with_and_carries_overrides(db, queue):
+    listed_with = []
+
+    def lister(url, settings):
+        listed_with.append(settings.format)
+        return ["https://example.com/0", "https://example.com/1"]
+
+    fan_out("https://example.com/list", "job", db, queue, lister=lister, overrides={"format": "worst"})
+
+    assert listed_with == ["worst"]
+    assert [t.settings for t in drain(queue)] == [{"format": "worst"}] * 2
+
+
+def test_fanned_out_tasks_are_run_by_another_worker(db, queue, tmp_path):
+    """Test that a worker other than the one fanning out claims and runs the tasks."""
+    urls = [f"https://example.com/{i}" for i in range(3)]
+    fan_out("https://example.com/list", "job", db, queue, lister=lambda u, s: urls)
+
+    def fake_download(url: str, settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+        (output_dir / f"{url.rsplit('/', 1)[-1]}.mp4").write_bytes(url.encode())
+
+    storage = LocalStorageEngine(repository=tmp_path / "repository")
+    pool = WorkerPool(queue, db, storage, worker_id=222, scratch_dir=tmp_path / "scratch", downloader=fake_download)
+    pool.run(stop_when_idle=True)
+
+    queue.join()
+    for url in urls:
+        record = db.get_task(DBTask(job_id="job", url=url))
+        assert record is not None
+        assert (record.status, record.claimed_by) == (TaskStatus.COMPLETED, 222)
+
+
+def test_fan_out_rejects_invalid_chunk_size(db, queue):
+    with pytest.raises(ValueError):
+        fan_out("https://example.com/list", "job", db, queue, chunk_size=0, lister=lambda u, s: [])
+
+
+class FakeYoutubeDL:
+    def __init__(self, results: dict) -> None:
+        self.results = results
+
+    def extract_info(self, url, download=True, process=True, ie_key=None):
+        return self.results[url]
+
+
+def test_walk_entries_reads_paged_lists_lazily():
+    fetched = []
+
+    def page(n):
+        fetched.append(n)
+        if n >= 3:
+            return []
+        return [{"_type": "url", "url": f"https://example.com/{n}-{i}"} for i in range(2)]
+
+    entries = OnDemandPagedList(page, 2)
+    walker = walk_entries(FakeYoutubeDL({}), {"_type": "playlist", "entries": entries})
+
+    assert next(walker) == "https://example.com/0-0"
+    assert fetched == [0]
+    assert next(walker) == "https://example.com/0-1"
+    assert fetched == [0]
+    assert list(walker)[-1] == "https://example.com/2-1"
+    assert fetched == [0, 1, 2, 3]
+
+
+def test_walk_entries_follows_redirects_and_nested_playlists():
+    ydl = FakeYoutubeDL(
+        {
+            "https://example.com/channel/videos": {
+                "_type": "playlist",
+                "entries": iter(
+                    [
+                        {"_type": "url", "url": "https://example.com/a", "webpage_url": "https://example.com/watch/a"},
+                        None,
+                        {"_type": "playlist", "entries": [{"_type": "url", "url": "https://example.com/b"}]},
+                    ]
+                ),
+            },
+        }
+    )
+    redirect = {"_type": "url", "url": "https://example.com/channel/videos"}
+
+    assert list(walk_entries(ydl, redirect)) == ["https://example.com/watch/a", "https://example.com/b"]
+
+
+def test_walk_entries_single_video():
+    result = {"id": "x", "webpage_url": "https://example.com/watch/x", "url": "https://cdn.example.com/x.mp4"}
+    assert list(walk_entries(FakeYoutubeDL({}), result)) == ["https://example.com/watch/x"]
+
+
+def test_walk_entries_redirect_loop_is_bounded():
+    loop = {"_type": "url", "url": "https://example.com/loop"}
+    with pytest.raises(RuntimeError):
+        list(walk_entries(FakeYoutubeDL({"https://example.com/loop": loop}), loop))
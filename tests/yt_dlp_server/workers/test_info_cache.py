@@ -0,0 +1,222 @@
+import pathlib
+
+import pytest
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.workers import download
+from yt_dlp_server.workers.info_cache import (
+    EXTRACTION_FIELDS,
+    InfoCache,
+    cache_key,
+    media_url_expiry,
+    normalize_url,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def info(video_id: str = "a", **extra) -> dict:
+    formats = [{"url": f"https://cdn.example.com/{video_id}"}]
+    return {"id": video_id, "title": f"Video {video_id}", "formats": formats, **extra}
+
+
+def test_extraction_fields_exist():
+    assert set(EXTRACTION_FIELDS) <= set(YtDlpSettings.model_fields)
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.COM:443/watch?v=1&a=2#t=10") == "https://example.com/watch?a=2&v=1"
+    assert normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+
+def test_cache_key_ignores_settings_applied_after_extraction():
+    url = "https://example.com/watch?v=1"
+    assert cache_key(url, YtDlpSettings()) == cache_key(url, YtDlpSettings(format="worst", outtmpl="x"))
+    assert cache_key(url, YtDlpSettings()) != cache_key(url, YtDlpSettings(proxy="http://proxy:3128"))
+    assert cache_key(url, YtDlpSettings()) != cache_key("https://example.com/watch?v=2", YtDlpSettings())
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ("https://r1.googlevideo.com/videoplayback?expire=1700003600&id=x", 1700003600.0),
+        ("https://r1.googlevideo.com/videoplayback/expire/1700003600/id/x/file.mp4", 1700003600.0),
+        ("https://d1.cloudfront.net/a.mp4?Expires=1700000100&Signature=x", 1700000100.0),
+        ("https://b.s3.amazonaws.com/a.mp4?X-Amz-Date=20231114T221320Z&X-Amz-Expires=600", 1700000000.0 + 600),
+        ("https://example.com/a.mp4", None),
+        ("https://example.com/a.mp4?expire=soon", None),
+    ],
+)
+def test_media_url_expiry(url, expected):
+    assert media_url_expiry(url) == expected
+
+
+def test_get_returns_a_fresh_copy(clock):
+    cache = InfoCache(clock=clock)
+    settings = YtDlpSettings()
+    assert cache.put("https://example.com/a", settings, info())
+
+    first = cache.get("https://example.com/a", settings)
+    assert first == info()
+    first["title"] = "changed"
+    assert cache.get("https://example.com/a", settings) == info()
+    assert cache.get("https://example.com/b", settings) is None
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (2, 1, 1)
+
+
+def test_values_json_cannot_represent_are_kept(clock):
+    """Test that callables, such as the lazy fragments of a format, come back as they were put."""
+    cache = InfoCache(clock=clock)
+    settings = YtDlpSettings()
+
+    def fragments(ctx):
+        return []
+
+    assert cache.put("https://example.com/a", settings, info(formats=[{"url": "x", "fragments": fragments}]))
+
+    cached = cache.get("https://example.com/a", settings)
+    assert cached is not None
+    assert cached["formats"][0]["fragments"] is fragments
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = InfoCache(ttl=10, clock=clock)
+    settings = YtDlpSettings()
+    cache.put("https://example.com/a", settings, info())
+
+    clock.now += 9
+    assert cache.get("https://example.com/a", settings) is not None
+    clock.now += 1
+    assert cache.get("https://example.com/a", settings) is None
+    assert cache.stats().expired == 1
+    assert cache.stats().entries == 0
+
+
+def test_entries_expire_before_their_media_urls(clock):
+    cache = InfoCache(ttl=3600, expiry_margin=60, clock=clock)
+    settings = YtDlpSettings()
+    expiring = {"url": f"https://cdn.example.com/a?expire={int(clock.now) + 300}"}
+    cache.put("https://example.com/a", settings, info(formats=[{"url": "https://cdn.example.com/b"}, expiring]))
+
+    clock.now += 239
+    assert cache.get("https://example.com/a", settings) is not None
+    clock.now += 1
+    assert cache.get("https://example.com/a", settings) is None
+
+
+def test_already_expired_media_urls_are_not_cached(clock):
+    cache = InfoCache(expiry_margin=60, clock=clock)
+    expired = info(url=f"https://cdn.example.com/a?expire={int(clock.now) + 30}")
+
+    assert not cache.put("https://example.com/a", YtDlpSettings(), expired)
+    assert cache.stats().entries == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = InfoCache(max_entries=2, clock=clock)
+    settings = YtDlpSettings()
+    cache.put("https://example.com/a", settings, info("a"))
+    cache.put("https://example.com/b", settings, info("b"))
+    cache.get("https://example.com/a", settings)
+
+    cache.put("https://example.com/c", settings, info("c"))
+
+    assert cache.get("https://example.com/a", settings) is not None
+    assert cache.get("https://example.com/b", settings) is None
+    assert cache.get("https://example.com/c", settings) is not None
+    assert cache.stats().evictions == 1
+
+
+def test_size_is_bounded_by_compressed_bytes(clock):
+    cache = InfoCache(max_bytes=200, clock=clock)
+    settings = YtDlpSettings()
+    for i in range(10):
+        cache.put(f"https://example.com/{i}", settings, info(str(i)))
+
+    stats = cache.stats()
+    assert 0 < stats.size <= 200
+    assert stats.entries < 10
+    assert cache.get("https://example.com/9", settings) is not None
+
+
+def test_invalidate_and_clear(clock):
+    cache = InfoCache(clock=clock)
+    settings = YtDlpSettings()
+    cache.put("https://example.com/a", settings, info("a"))
+    cache.put("https://example.com/b", settings, info("b"))
+
+    cache.invalidate("https://example.com/a", settings)
+    assert cache.get("https://example.com/a", settings) is None
+    cache.clear()
+    assert cache.stats().entries == 0
+    assert cache.stats().size == 0
+
+
+def test_invalid_parameters_raise_value_error():
+    with pytest.raises(ValueError):
+        InfoCache(max_entries=0)
+
+
+def test_download_reuses_cached_metadata(tmp_path: pathlib.Path, monkeypatch):
+    """Test that a second download of a local file:// URL skips extraction, even with a different format."""
+    monkeypatch.setattr(download, "INFO_CACHE", InfoCache())
+    media = tmp_path / "clip.mp4"
+    media.write_bytes(b"\x00" * 1024)
+    settings = YtDlpSettings(enable_file_urls=True, quiet=True, no_warnings=True, outtmpl="%(id)s.%(ext)s")
+
+    download.download(media.as_uri(), settings, tmp_path / "first")
+    download.download(media.as_uri(), settings.model_copy(update={"format": "worst"}), tmp_path / "second")
+
+    stats = download.INFO_CACHE.stats()
+    assert (stats.hits, stats.entries) == (1, 1)
+    assert (tmp_path / "second" / "clip.mp4").read_bytes() == media.read_bytes()
+    assert download.extract(media.as_uri(), settings)["id"] == "clip"
+    assert download.INFO_CACHE.stats().hits == 2
+
+
+def test_download_gets_callable_fields_from_the_cache(tmp_path: pathlib.Path, monkeypatch):
+    """Test that a cached info dict with a callable field reaches the next download intact."""
+    import yt_dlp
+
+    monkeypatch.setattr(download, "INFO_CACHE", InfoCache())
+    media = tmp_path / "clip.mp4"
+    media.write_bytes(b"\x00" * 1024)
+    settings = YtDlpSettings(enable_file_urls=True, quiet=True, no_warnings=True, outtmpl="%(id)s.%(ext)s")
+
+    def lazy_field():
+        return "value"
+
+    extract_info = yt_dlp.YoutubeDL.extract_info
+    process_ie_result = yt_dlp.YoutubeDL.process_ie_result
+    processed = []
+
+    def extract_with_lazy_field(self, *args, **kwargs):
+        result = extract_info(self, *args, **kwargs)
+        result["lazy_field"] = lazy_field
+        return result
+
+    def record_process_ie_result(self, ie_result, *args, **kwargs):
+        processed.append(ie_result.get("lazy_field"))
+        return process_ie_result(self, ie_result, *args, **kwargs)
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_with_lazy_field)
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "process_ie_result", record_process_ie_result)
+
+    download.download(media.as_uri(), settings, tmp_path / "first")
+    download.download(media.as_uri(), settings, tmp_path / "second")
+
+    assert download.INFO_CACHE.stats().hits == 1
+    assert processed == [lazy_field, lazy_field]
+    assert (tmp_path / "second" / "clip.mp4").read_bytes() == media.read_bytes()
@@ -0,0 +1,227 @@
+import pathlib
+import threading
+
+import pytest
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.db.impl.sqlite import SQLiteDB
+from yt_dlp_server.db.models import Task as DBTask
+from yt_dlp_server.db.models import TaskProgress, TaskStatus
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.workers import download
+from yt_dlp_server.workers.info_cache import InfoCache
+from yt_dlp_server.workers.pipeline import PipelinedWorkerPool, Stages
+from yt_dlp_server.workers.progress import ProgressTracker
+from yt_dlp_server.workers.queue.impl.stl import STLQueue
+from yt_dlp_server.workers.task import Task
+
+
+def fake_extract(url: str, settings: YtDlpSettings) -> dict:
+    return {"url": url, "name": url.rsplit("/", 1)[-1]}
+
+
+def fake_download(info: dict, settings: YtDlpSettings, output_dir: pathlib.Path) -> dict:
+    path = output_dir / f"{info['name']}.mp4"
+    path.write_bytes(info["url"].encode())
+    return {**info, "filepath": str(path)}
+
+
+def fake_postprocess(info: dict, settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+    pathlib.Path(info["filepath"] + ".processed").write_bytes(b"done")
+
+
+@pytest.fixture
+def db():
+    database = SQLiteDB()
+    database.connect(":memory:")
+    database.create_tables()
+    yield database
+    if database.connection:
+        database.connection.close()
+
+
+@pytest.fixture
+def storage(tmp_path: pathlib.Path) -> LocalStorageEngine:
+    return LocalStorageEngine(repository=tmp_path / "repository")
+
+
+@pytest.fixture
+def queue() -> STLQueue:
+    return STLQueue()
+
+
+def make_pool(queue, db, storage, tmp_path, **kwargs) -> PipelinedWorkerPool:
+    options = {
+        "worker_id": 1,
+        "scratch_dir": tmp_path / "scratch",
+        "stages": Stages(fake_extract, fake_download, fake_postprocess),
+        "extract_concurrency": 2,
+        "download_concurrency": 2,
+        "postprocess_concurrency": 1,
+        "poll_interval": 0.01,
+    }
+    options.update(kwargs)
+    return PipelinedWorkerPool(queue, db, storage, **options)
+
+
+def status_of(db: SQLiteDB, url: str) -> TaskStatus:
+    record = db.get_task(DBTask(job_id="job", url=url))
+    assert record is not None
+    return record.status
+
+
+def test_tasks_flow_through_every_stage(queue, db, storage, tmp_path):
+    urls = [f"https://example.com/video{i}" for i in range(10)]
+    for url in urls:
+        queue.put(Task(url=url, job_id="job"))
+
+    make_pool(queue, db, storage, tmp_path).run(stop_when_idle=True)
+
+    queue.join()
+    for i, url in enumerate(urls):
+        assert status_of(db, url) == TaskStatus.COMPLETED
+        assert storage.read_bytes_from_path(pathlib.Path(f"job/video{i}.mp4")) == url.encode()
+        assert storage.read_bytes_from_path(pathlib.Path(f"job/video{i}.mp4.processed")) == b"done"
+
+
+def test_downloads_continue_while_postprocessing_is_busy(queue, db, storage, tmp_path):
+    """Test that a slow post-processing stage does not stall downloads of other tasks."""
+    downloaded: list[str] = []
+    all_downloaded = threading.Event()
+    urls = [f"https://example.com/video{i}" for i in range(4)]
+
+    def recording_download(info, settings, output_dir):
+        result = fake_download(info, settings, output_dir)
+        downloaded.append(info["url"])
+        if len(downloaded) == len(urls):
+            all_downloaded.set()
+        return result
+
+    def blocking_postprocess(info, settings, output_dir):
+        # The first task's post-processing only finishes once every download has.
+        assert all_downloaded.wait(timeout=5)
+        fake_postprocess(info, settings, output_dir)
+
+    for url in urls:
+        queue.put(Task(url=url, job_id="job"))
+    stages = Stages(fake_extract, recording_download, blocking_postprocess)
+
+    make_pool(queue, db, storage, tmp_path, stages=stages).run(stop_when_idle=True)
+
+    assert all(status_of(db, url) == TaskStatus.COMPLETED for url in urls)
+
+
+@pytest.mark.parametrize("failing_stage", ["extract", "download", "postprocess"])
+def test_failure_in_any_stage_marks_task_failed(queue, db, storage, tmp_path, failing_stage):
+    def fail(*args):
+        raise RuntimeError("stage failed")
+
+    stages = Stages(
+        fail if failing_stage == "extract" else fake_extract,
+        fail if failing_stage == "download" else fake_download,
+        fail if failing_stage == "postprocess" else fake_postprocess,
+    )
+    queue.put(Task(url="https://example.com/broken", job_id="job"))
+    queue.put(Task(url="https://example.com/other", job_id="job"))
+
+    make_pool(queue, db, storage, tmp_path, stages=stages).run(stop_when_idle=True)
+
+    queue.join()
+    assert status_of(db, "https://example.com/broken") == TaskStatus.FAILED
+    assert status_of(db, "https://example.com/other") == TaskStatus.FAILED
+    assert list((tmp_path / "scratch").iterdir()) == []
+
+
+def test_stage_sizes(queue, db, storage):
+    pool = PipelinedWorkerPool(
+        queue, db, storage, extract_concurrency=8, download_concurrency=4, postprocess_concurrency=2
+    )
+    assert pool.capacity == 28
+    pool = PipelinedWorkerPool(queue, db, storage, stage_queue_size=1, postprocess_concurrency=1)
+    assert pool.capacity == 4 + 4 + 1 + 3
+
+
+@pytest.mark.parametrize("kwargs", [{"extract_concurrency": 0}, {"stage_queue_size": 0}])
+def test_invalid_parameters_raise_value_error(queue, db, storage, kwargs):
+    with pytest.raises(ValueError):
+        PipelinedWorkerPool(queue, db, storage, **kwargs)
+
+
+def test_pipeline_runs_yt_dlp_end_to_end(queue, db, storage, tmp_path):
+    """Test a real yt-dlp download of a local file:// URL, with an Exec postprocessor."""
+    media = tmp_path / "media" / "clip.mp4"
+    media.parent.mkdir()
+    media.write_bytes(b"\x00" * 4096)
+    settings = YtDlpSettings(
+        enable_file_urls=True,
+        quiet=True,
+        no_warnings=True,
+        addchapters=False,
+        outtmpl="%(id)s.%(ext)s",
+        exec=["cp {} {}.processed"],
+    )
+    queue.put(Task(url=media.as_uri(), job_id="job"))
+
+    make_pool(queue, db, storage, tmp_path, settings=settings, stages=Stages()).run(stop_when_idle=True)
+
+    assert status_of(db, media.as_uri()) == TaskStatus.COMPLETED
+    assert storage.read_bytes_from_path(pathlib.Path("job/clip.mp4")) == media.read_bytes()
+    assert storage.read_bytes_from_path(pathlib.Path("job/clip.mp4.processed")) == media.read_bytes()
+
+
+def test_download_stage_reports_progress(queue, db, storage, tmp_path):
+    def reporting_download(info, settings, output_dir, progress_hook):
+        for downloaded in (1, 2, 3):
+            progress_hook({"status": "downloading", "downloaded_bytes": downloaded, "total_bytes": 3})
+        return fake_download(info, settings, output_dir)
+
+    queue.put(Task(url="https://example.com/video", job_id="job"))
+    stages = Stages(fake_extract, reporting_download, fake_postprocess)
+
+    make_pool(queue, db, storage, tmp_path, stages=stages, progress=ProgressTracker()).run(stop_when_idle=True)
+
+    record = db.get_task(DBTask(job_id="job", url="https://example.com/video"))
+    assert record.progress == TaskProgress(status="downloading", downloaded_bytes=3, total_bytes=3)
+
+
+def test_extract_stage_hands_the_download_stage_an_unsanitized_info_dict(tmp_path: pathlib.Path, monkeypatch):
+    """Test that values JSON cannot represent, such as callable fragments, reach the download stage."""
+    import yt_dlp
+
+    monkeypatch.setattr(download, "INFO_CACHE", InfoCache())
+    media = tmp_path / "clip.mp4"
+    media.write_bytes(b"\x00" * 1024)
+    settings = YtDlpSettings(enable_file_urls=True, quiet=True, no_warnings=True, outtmpl="%(id)s.%(ext)s")
+
+    def lazy_field():
+        return "value"
+
+    extract_info = yt_dlp.YoutubeDL.extract_info
+
+    def extract_with_lazy_field(self, *args, **kwargs):
+        result = extract_info(self, *args, **kwargs)
+        result["lazy_field"] = lazy_field
+        return result
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_with_lazy_field)
+
+    info = download.extract(media.as_uri(), settings)
+    assert info["lazy_field"] is lazy_field
+    result = download.download_info(info, settings, tmp_path / "output")
+    assert result["lazy_field"] is lazy_field
+    assert (tmp_path / "output" / "clip.mp4").read_bytes() == media.read_bytes()
+
+
+def test_postprocessors_run_in_the_postprocess_stage_only(tmp_path: pathlib.Path, monkeypatch):
+    monkeypatch.setattr(download, "INFO_CACHE", InfoCache())
+    media = tmp_path / "clip.mp4"
+    media.write_bytes(b"\x00" * 1024)
+    marker = tmp_path / "marker"
+    settings = YtDlpSettings(
+        enable_file_urls=True, quiet=True, no_warnings=True, outtmpl="%(id)s.%(ext)s", exec=[f"touch {marker}"]
+    )
+
+    info = download.download_info(download.extract(media.as_uri(), settings), settings, tmp_path / "output")
+    assert not marker.exists()
+    download.postprocess_info(info, settings, tmp_path / "output")
+    assert marker.exists()
@@ -0,0 +1,267 @@
+import concurrent.futures
+import pathlib
+import threading
+import time
+
+import pytest
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.db.impl.sqlite import SQLiteDB
+from yt_dlp_server.db.models import Task as DBTask
+from yt_dlp_server.db.models import TaskStatus
+from yt_dlp_server.profiles import ProfileMatcher, ProfileRule
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.workers.download import download
+from yt_dlp_server.workers.pool import WorkerPool
+from yt_dlp_server.workers.queue.impl.stl import STLQueue
+from yt_dlp_server.workers.task import Task
+
+WORKER_ID = 7
+
+
+def fake_download(url: str, settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+    """Write a small file named after the URL, like a real download would."""
+    name = url.rsplit("/", 1)[-1]
+    (output_dir / f"{name}.mp4").write_bytes(url.encode())
+    (output_dir / f"{name}.mp4.part").write_bytes(b"partial")
+
+
+def failing_download(url: str, settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+    raise RuntimeError(f"cannot download {url}")
+
+
+@pytest.fixture
+def db():
+    database = SQLiteDB()
+    database.connect(":memory:")
+    database.create_tables()
+    yield database
+    if database.connection:
+        database.connection.close()
+
+
+@pytest.fixture
+def storage(tmp_path: pathlib.Path) -> LocalStorageEngine:
+    return LocalStorageEngine(repository=tmp_path / "repository")
+
+
+@pytest.fixture
+def queue() -> STLQueue:
+    return STLQueue()
+
+
+def make_pool(queue, db, storage, tmp_path, **kwargs) -> WorkerPool:
+    options = {
+        "worker_id": WORKER_ID,
+        "scratch_dir": tmp_path / "scratch",
+        "downloader": fake_download,
+        "concurrency": 2,
+        "poll_interval": 0.01,
+    }
+    options.update(kwargs)
+    return WorkerPool(queue, db, storage, **options)
+
+
+def status_of(db: SQLiteDB, job_id: str, url: str) -> TaskStatus:
+    record = db.get_task(DBTask(job_id=job_id, url=url))
+    assert record is not None
+    return record.status
+
+
+@pytest.mark.parametrize("executor", ["thread", "process", "zygote"])
+def test_pool_downloads_and_stores_results(queue, db, storage, tmp_path, executor):
+    """Test that every task is downloaded, stored under its job and marked completed."""
+    urls = [f"https://example.com/video{i}" for i in range(5)]
+    for url in urls:
+        queue.put(Task(url=url, job_id="job"))
+
+    make_pool(queue, db, storage, tmp_path, executor=executor).run(stop_when_idle=True)
+
+    queue.join()
+    for i, url in enumerate(urls):
+        assert status_of(db, "job", url) == TaskStatus.COMPLETED
+        assert storage.read_bytes_from_path(pathlib.Path(f"job/video{i}.mp4")) == url.encode()
+        assert not storage.canonicalize_path(pathlib.Path(f"job/video{i}.mp4.part")).exists()
+    assert list((tmp_path / "scratch").iterdir()) == []
+
+
+def test_failed_download_is_marked_failed(queue, db, storage, tmp_path):
+    """Test that a download that raises is recorded as failed and acknowledged."""
+    queue.put(Task(url="https://example.com/broken", job_id="job"))
+
+    make_pool(queue, db, storage, tmp_path, downloader=failing_download).run(stop_when_idle=True)
+
+    queue.join()
+    assert status_of(db, "job", "https://example.com/broken") == TaskStatus.FAILED
+
+
+def test_task_claimed_by_another_worker_is_skipped(queue, db, storage, tmp_path):
+    """Test that a task with a live claim from another worker is not run."""
+    task = DBTask(job_id="job", url="https://example.com/taken")
+    db.add_task(task, claimed_by=WORKER_ID + 1)
+    queue.put(Task(url=task.url, job_id=task.job_id))
+
+    make_pool(queue, db, storage, tmp_path).run(stop_when_idle=True)
+
+    queue.join()
+    assert status_of(db, "job", task.url) == TaskStatus.PENDING
+
+
+def test_completed_task_is_not_run_again(queue, db, storage, tmp_path):
+    """Test that redelivered tasks that already completed are skipped."""
+    task = DBTask(job_id="job", url="https://example.com/done")
+    db.add_task(task, claimed_by=WORKER_ID)
+    db.update_task(task, TaskStatus.COMPLETED)
+    queue.put(Task(url=task.url, job_id=task.job_id))
+
+    make_pool(queue, db, storage, tmp_path, downloader=failing_download).run(stop_when_idle=True)
+
+    queue.join()
+    assert status_of(db, "job", task.url) == TaskStatus.COMPLETED
+
+
+def test_task_without_job_id_is_skipped(queue, db, storage, tmp_path):
+    """Test that tasks without a job_id are acknowledged without running."""
+    queue.put(Task(url="https://example.com/orphan"))
+
+    make_pool(queue, db, storage, tmp_path).run(stop_when_idle=True)
+
+    queue.join()
+    assert db.get_task(DBTask(job_id="", url="https://example.com/orphan")) is None
+
+
+def test_task_settings_override_the_pool_settings(queue, db, storage, tmp_path):
+    """Test that tasks with the same overrides are downloaded with one shared settings object."""
+    seen = []
+
+    def recording_download(url: str, settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+        seen.append(settings)
+        fake_download(url, settings, output_dir)
+
+    for i in range(3):
+        queue.put(Task(url=f"https://example.com/video{i}", job_id="job", settings={"format": "worst"}))
+    queue.put(Task(url="https://example.com/plain", job_id="job"))
+    settings = YtDlpSettings()
+
+    make_pool(queue, db, storage, tmp_path, settings=settings, downloader=recording_download).run(stop_when_idle=True)
+
+    overridden = [s for s in seen if s is not settings]
+    assert len(overridden) == 3
+    assert overridden[0].format == "worst"
+    assert all(s is overridden[0] for s in overridden)
+
+
+def test_profiles_apply_below_task_overrides(queue, db, storage, tmp_path):
+    seen = {}
+
+    def recording_download(url: str, settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+        seen[url] = (settings.concurrentfragments, settings.buffersize)
+        fake_download(url, settings, output_dir)
+
+    profiles = ProfileMatcher(
+        [ProfileRule(hosts=["cdn.example.com"], settings={"concurrentfragments": 8, "buffersize": 4096})],
+        base=YtDlpSettings(),
+    )
+    queue.put(Task(url="https://cdn.example.com/a", job_id="job"))
+    queue.put(Task(url="https://cdn.example.com/b", job_id="job", settings={"buffersize": 512}))
+    queue.put(Task(url="https://example.com/c", job_id="job"))
+
+    make_pool(
+        queue, db, storage, tmp_path, settings=YtDlpSettings(), downloader=recording_download, profiles=profiles
+    ).run(stop_when_idle=True)
+
+    assert seen == {
+        "https://cdn.example.com/a": (8, 4096),
+        "https://cdn.example.com/b": (8, 512),
+        "https://example.com/c": (1, 1024),
+    }
+
+
+def test_task_with_invalid_settings_fails(queue, db, storage, tmp_path):
+    queue.put(Task(url="https://example.com/bad", job_id="job", settings={"socket_timeout": "soon"}))
+    queue.put(Task(url="https://example.com/unknown", job_id="job", settings={"no_such_setting": 1}))
+
+    make_pool(queue, db, storage, tmp_path, downloader=failing_download).run(stop_when_idle=True)
+
+    queue.join()
+    assert status_of(db, "job", "https://example.com/bad") == TaskStatus.FAILED
+    assert status_of(db, "job", "https://example.com/unknown") == TaskStatus.FAILED
+
+
+def test_stop_from_another_thread(queue, db, storage, tmp_path):
+    """Test that stop() ends a pool that would otherwise wait for tasks forever."""
+    pool = make_pool(queue, db, storage, tmp_path)
+    runner = threading.Thread(target=pool.run)
+    runner.start()
+    pool.stop()
+    runner.join(timeout=5)
+    assert not runner.is_alive()
+
+
+@pytest.mark.parametrize("downloader", [fake_download, failing_download])
+def test_same_url_across_jobs_is_downloaded_once(queue, db, storage, tmp_path, downloader):
+    """Test that tasks of other jobs wait on a download in flight and share its outcome."""
+    calls: list[str] = []
+
+    def slow_download(url: str, settings: YtDlpSettings, output_dir: pathlib.Path) -> None:
+        calls.append(url)
+        # Long enough for the other jobs' tasks to be claimed while this runs.
+        time.sleep(0.2)
+        downloader(url, settings, output_dir)
+
+    url = "https://example.com/video"
+    for job_id in ("a", "b", "c"):
+        queue.put(Task(url=url, job_id=job_id))
+    queue.put(Task(url="https://example.com/other", job_id="a"))
+
+    make_pool(queue, db, storage, tmp_path, downloader=slow_download, concurrency=4).run(stop_when_idle=True)
+
+    queue.join()
+    assert sorted(calls) == ["https://example.com/other", url]
+    expected = TaskStatus.COMPLETED if downloader is fake_download else TaskStatus.FAILED
+    for job_id in ("a", "b", "c"):
+        assert status_of(db, job_id, url) == expected
+        if expected == TaskStatus.COMPLETED:
+            assert storage.read_bytes_from_path(pathlib.Path(f"{job_id}/video.mp4")) == url.encode()
+    assert list((tmp_path / "scratch").iterdir()) == []
+
+
+def test_task_fails_when_executor_rejects_it(queue, db, storage, tmp_path, monkeypatch):
+    """Test that a task the executor cannot take is failed, and later tasks for its URL are not left waiting."""
+
+    def broken_submit(self, *args, **kwargs):
+        raise concurrent.futures.BrokenExecutor("executor is broken")
+
+    monkeypatch.setattr(concurrent.futures.ThreadPoolExecutor, "submit", broken_submit)
+    url = "https://example.com/video"
+    for job_id in ("a", "b"):
+        queue.put(Task(url=url, job_id=job_id))
+
+    make_pool(queue, db, storage, tmp_path).run(stop_when_idle=True)
+
+    queue.join()
+    assert status_of(db, "a", url) == TaskStatus.FAILED
+    assert status_of(db, "b", url) == TaskStatus.FAILED
+    assert list((tmp_path / "scratch").iterdir()) == []
+
+
+@pytest.mark.parametrize("kwargs", [{"concurrency": 0}, {"executor": "fiber"}, {"worker_id": 0}])
+def test_invalid_parameters_raise_value_error(queue, db, storage, kwargs):
+    with pytest.raises(ValueError):
+        WorkerPool(queue, db, storage, **kwargs)
+
+
+def test_pool_runs_yt_dlp_end_to_end(queue, db, storage, tmp_path):
+    """Test a real yt-dlp download of a local file:// URL."""
+    media = tmp_path / "media" / "clip.mp4"
+    media.parent.mkdir()
+    media.write_bytes(b"\x00" * 4096)
+    settings = YtDlpSettings(enable_file_urls=True, quiet=True, no_warnings=True, addchapters=False)
+    queue.put(Task(url=media.as_uri(), job_id="job"))
+
+    make_pool(queue, db, storage, tmp_path, settings=settings, downloader=download).run(stop_when_idle=True)
+
+    assert status_of(db, "job", media.as_uri()) == TaskStatus.COMPLETED
+    stored = list(storage.canonicalize_path(pathlib.Path("job")).iterdir())
+    assert [path.suffix for path in stored] == [".mp4"]
+    assert stored[0].read_bytes() == media.read_bytes()
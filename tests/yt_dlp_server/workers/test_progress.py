@@ -0,0 +1,189 @@
+import pathlib
+
+import pytest
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.db.base import BaseDB
+from yt_dlp_server.db.impl.sqlite import SQLiteDB
+from yt_dlp_server.db.models import Task as DBTask
+from yt_dlp_server.db.models import TaskProgress
+from yt_dlp_server.storage.impl.local import LocalStorageEngine
+from yt_dlp_server.workers.download import download
+from yt_dlp_server.workers.pool import WorkerPool
+from yt_dlp_server.workers.progress import ProgressTracker
+from yt_dlp_server.workers.queue.impl.stl import STLQueue
+from yt_dlp_server.workers.task import Task
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def db():
+    database = SQLiteDB()
+    database.connect(":memory:")
+    database.create_tables()
+    yield database
+    if database.connection:
+        database.connection.close()
+
+
+def event(downloaded: int, total: int = 1000, status: str = "downloading") -> dict:
+    return {"status": status, "downloaded_bytes": downloaded, "total_bytes": total, "speed": 100.0, "eta": 3}
+
+
+def test_events_are_coalesced_into_one_snapshot_per_interval(clock):
+    tracker = ProgressTracker(interval=1.0, clock=clock)
+    task = DBTask(job_id="job", url="https://example.com/a")
+    hook = tracker.start(task)
+    assert hook is not None
+
+    for downloaded in range(0, 500, 10):
+        hook(event(downloaded))
+    assert tracker.publish() == [
+        (task, TaskProgress(status="downloading", downloaded_bytes=490, total_bytes=1000, speed=100.0, eta=3))
+    ]
+
+    hook(event(600))
+    clock.now += 0.5
+    assert tracker.publish() == []
+    clock.now += 0.5
+    assert [progress.downloaded_bytes for _, progress in tracker.publish()] == [600]
+    clock.now += 1
+    assert tracker.publish() == []
+
+
+def test_only_changed_tasks_are_published(clock):
+    tracker = ProgressTracker(interval=0, clock=clock)
+    first = DBTask(job_id="job", url="https://example.com/a")
+    second = DBTask(job_id="job", url="https://example.com/b")
+    first_hook, second_hook = tracker.start(first), tracker.start(second)
+    first_hook(event(1))
+    second_hook(event(2))
+    tracker.publish()
+
+    second_hook(event(3))
+
+    assert [task for task, _ in tracker.publish()] == [second]
+    assert len(tracker.snapshot()) == 2
+
+
+def test_estimated_totals_are_used(clock):
+    tracker = ProgressTracker(interval=0, clock=clock)
+    hook = tracker.start(DBTask(job_id="job", url="https://example.com/a"))
+    hook({"status": "downloading", "downloaded_bytes": 10.0, "total_bytes_estimate": 2048.7})
+
+    [(_, progress)] = tracker.publish()
+    assert (progress.downloaded_bytes, progress.total_bytes, progress.speed) == (10, 2048, None)
+
+
+def test_finished_tasks_are_published_once_more_then_released(clock):
+    tracker = ProgressTracker(capacity=1, interval=0, clock=clock)
+    first = DBTask(job_id="job", url="https://example.com/a")
+    second = DBTask(job_id="job", url="https://example.com/b")
+    tracker.start(first)(event(1000, status="finished"))
+    tracker.finish(first)
+
+    assert tracker.start(second) is None
+    assert [progress.status for _, progress in tracker.publish()] == ["finished"]
+    assert tracker.snapshot() == []
+    assert tracker.start(second) is not None
+
+
+def test_subscribers_receive_snapshots(clock):
+    tracker = ProgressTracker(interval=0, clock=clock)
+    received = []
+    unsubscribe = tracker.subscribe(received.append)
+    tracker.subscribe(lambda snapshot: 1 / 0)
+    hook = tracker.start(DBTask(job_id="job", url="https://example.com/a"))
+
+    hook(event(1))
+    tracker.publish()
+    unsubscribe()
+    hook(event(2))
+    tracker.publish()
+
+    assert [[progress.downloaded_bytes for _, progress in snapshot] for snapshot in received] == [[1]]
+
+
+def test_snapshots_are_written_to_the_database(db, clock):
+    tracker = ProgressTracker(interval=0, clock=clock)
+    task = DBTask(job_id="job", url="https://example.com/a")
+    db.add_task(task, 1)
+    tracker.start(task)(event(250))
+
+    tracker.publish(db)
+
+    assert db.get_task(task).progress == TaskProgress(
+        status="downloading", downloaded_bytes=250, total_bytes=1000, speed=100.0, eta=3
+    )
+
+
+def test_databases_without_progress_support_ignore_snapshots(clock):
+    class NoProgressDB(SQLiteDB):
+        update_progress = BaseDB.update_progress
+
+    db = NoProgressDB()
+    db.connect(":memory:")
+    db.create_tables()
+    tracker = ProgressTracker(interval=0, clock=clock)
+    task = DBTask(job_id="job", url="https://example.com/a")
+    db.add_task(task, 1)
+    tracker.start(task)(event(250))
+
+    tracker.publish(db)
+
+    assert db.get_task(task).progress is None
+
+
+def test_invalid_capacity_raises_value_error():
+    with pytest.raises(ValueError):
+        ProgressTracker(capacity=0)
+
+
+def test_pool_records_progress_of_real_downloads(db, tmp_path: pathlib.Path):
+    """Test that a worker pool publishes the final progress of a local file:// download."""
+    media = tmp_path / "media" / "clip.mp4"
+    media.parent.mkdir()
+    media.write_bytes(b"\x00" * 4096)
+    settings = YtDlpSettings(enable_file_urls=True, quiet=True, no_warnings=True, addchapters=False)
+    queue = STLQueue()
+    queue.put(Task(url=media.as_uri(), job_id="job"))
+    pool = WorkerPool(
+        queue,
+        db,
+        LocalStorageEngine(repository=tmp_path / "repository"),
+        settings=settings,
+        downloader=download,
+        scratch_dir=tmp_path / "scratch",
+        poll_interval=0.01,
+        progress=ProgressTracker(),
+    )
+
+    pool.run(stop_when_idle=True)
+
+    record = db.get_task(DBTask(job_id="job", url=media.as_uri()))
+    assert record.progress is not None
+    assert record.progress.status == "finished"
+    assert record.progress.total_bytes == 4096
+
+
+def test_process_executor_cannot_track_progress(db, tmp_path: pathlib.Path):
+    with pytest.raises(ValueError):
+        WorkerPool(
+            STLQueue(),
+            db,
+            LocalStorageEngine(repository=tmp_path),
+            executor="process",
+            progress=ProgressTracker(),
+        )
@@ -0,0 +1,46 @@
+import os
+import pathlib
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.workers.singleflight import SingleFlight, flight_key, link_outputs
+
+
+def test_first_caller_leads_and_later_callers_wait():
+    flight: SingleFlight[str, int] = SingleFlight()
+
+    assert flight.join("a", 1)
+    assert not flight.join("a", 2)
+    assert not flight.join("a", 3)
+    assert flight.join("b", 4)
+    assert "a" in flight
+    assert len(flight) == 2
+
+    assert flight.finish("a") == [2, 3]
+    assert "a" not in flight
+    assert flight.finish("b") == []
+    assert flight.join("a", 5)
+
+
+def test_flight_key_depends_on_url_and_settings():
+    url = "https://example.com/v?a=2&b=1"
+    settings = YtDlpSettings()
+    assert flight_key("https://Example.com/v?b=1&a=2", settings) == flight_key(url, settings)
+    assert flight_key(url, settings) != flight_key(url, YtDlpSettings(format="worst"))
+
+
+def test_link_outputs_hardlinks_finished_files(tmp_path: pathlib.Path):
+    source = tmp_path / "source"
+    (source / "sub").mkdir(parents=True)
+    (source / "video.mp4").write_bytes(b"video")
+    (source / "sub" / "video.en.vtt").write_bytes(b"subs")
+    (source / "video.mp4.part").write_bytes(b"partial")
+    target = tmp_path / "target"
+    target.mkdir()
+
+    link_outputs(source, target)
+
+    assert sorted(p.relative_to(target).as_posix() for p in target.rglob("*") if p.is_file()) == [
+        "sub/video.en.vtt",
+        "video.mp4",
+    ]
+    assert os.path.samefile(source / "video.mp4", target / "video.mp4")
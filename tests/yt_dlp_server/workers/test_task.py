@@ -13,10 +13,18 @@ def test_task_json_serialization():
     url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
     task = Task(url=url)
     json_data = task.model_dump_json()
-    expected_json = f'{{"url":"{url}"}}'
+    expected_json = f'{{"url":"{url}","job_id":null,"settings":null}}'
     assert json_data == expected_json
 
 
+def test_task_creation_with_job_id():
+    """Test that a Task can carry the job it belongs to."""
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    task = Task(url=url, job_id="job-1")
+    assert task.job_id == "job-1"
+    assert Task(url=url).job_id is None
+
+
 def test_task_json_deserialization():
     """Test that a Task can be deserialized from JSON."""
     url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
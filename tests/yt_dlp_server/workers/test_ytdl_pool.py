@@ -0,0 +1,227 @@
+import threading
+from typing import Any
+
+import pytest
+
+from yt_dlp_server.config import YtDlpSettings
+from yt_dlp_server.workers.ytdl_pool import YoutubeDLPool, settings_key
+
+
+class FakeYoutubeDL:
+    """Records construction and closing, with the attributes the pool resets."""
+
+    created: list["FakeYoutubeDL"] = []
+
+    def __init__(self, params: dict[str, Any]) -> None:
+        self.params = params
+        self.closed = False
+        self._progress_hooks: list[Any] = []
+        self._postprocessor_hooks: list[Any] = []
+        self._download_retcode = 0
+        self._num_downloads = 0
+        self._num_videos = 0
+        self._playlist_level = 0
+        self._playlist_urls: set[str] = set()
+        FakeYoutubeDL.created.append(self)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def reset_created():
+    FakeYoutubeDL.created = []
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def make_pool(clock: FakeClock, **kwargs) -> YoutubeDLPool:
+    return YoutubeDLPool(factory=FakeYoutubeDL, clock=clock, **kwargs)
+
+
+def test_settings_key_is_stable_and_content_based():
+    assert settings_key(YtDlpSettings()) == settings_key(YtDlpSettings())
+    assert settings_key(YtDlpSettings()) != settings_key(YtDlpSettings(ratelimit=1000))
+
+
+def test_instances_are_reused_for_equal_settings(clock):
+    pool = make_pool(clock)
+    with pool.lease(YtDlpSettings()) as first:
+        pass
+    with pool.lease(YtDlpSettings()) as second:
+        pass
+    assert first is second
+    stats = pool.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+
+
+def test_different_settings_get_different_instances(clock):
+    pool = make_pool(clock)
+    with pool.lease(YtDlpSettings()) as first:
+        pass
+    with pool.lease(YtDlpSettings(ratelimit=1000)) as second:
+        pass
+    assert first is not second
+    assert first.params["ratelimit"] is None
+    assert second.params["ratelimit"] == 1000
+
+
+def test_leases_are_exclusive(clock):
+    pool = make_pool(clock)
+    with pool.lease(YtDlpSettings()) as first, pool.lease(YtDlpSettings()) as second:
+        assert first is not second
+
+
+def test_overrides_and_hooks_are_reset_between_leases(clock):
+    pool = make_pool(clock)
+    with pool.lease(YtDlpSettings(), {"paths": {"home": "/tmp/task"}}) as ydl:
+        assert ydl.params["paths"] == {"home": "/tmp/task"}
+        ydl._progress_hooks.append(print)
+        ydl._num_downloads = 3
+        ydl._playlist_urls.add("https://example.com/list")
+    with pool.lease(YtDlpSettings()) as ydl:
+        assert ydl.params["paths"] == {}
+        assert ydl._progress_hooks == []
+        assert ydl._num_downloads == 0
+        assert ydl._playlist_urls == set()
+
+
+def test_instances_can_be_built_without_some_postprocessors(clock):
+    pool = make_pool(clock)
+    settings = YtDlpSettings(exec=["echo"], sponsorblock_remove=["sponsor"])
+    with pool.lease(settings, skip_postprocessors=("post_process", "after_move")) as skipping:
+        assert [pp["key"] for pp in skipping.params["postprocessors"]] == ["SponsorBlock"]
+    with pool.lease(settings) as full:
+        keys = [pp["key"] for pp in full.params["postprocessors"]]
+        assert keys[0] == "SponsorBlock" and "ModifyChapters" in keys and "Exec" in keys
+    assert skipping is not full
+    with pool.lease(settings, skip_postprocessors=("after_move", "post_process")) as again:
+        assert again is skipping
+
+
+def test_lru_instance_is_evicted_when_full(clock):
+    pool = make_pool(clock, max_size=2)
+    settings = [YtDlpSettings(ratelimit=i + 1) for i in range(3)]
+    with pool.lease(settings[0]) as oldest:
+        pass
+    with pool.lease(settings[1]):
+        pass
+    with pool.lease(settings[2]):
+        pass
+    assert oldest.closed
+    stats = pool.stats()
+    assert stats.evictions == 1
+    assert stats.idle == 2
+    assert settings_key(settings[0]) not in stats.by_key
+
+
+def test_overflow_when_every_instance_is_leased(clock):
+    pool = make_pool(clock, max_size=1)
+    with pool.lease(YtDlpSettings()) as pooled, pool.lease(YtDlpSettings()) as overflow:
+        pass
+    assert overflow.closed
+    assert not pooled.closed
+    stats = pool.stats()
+    assert stats.overflows == 1
+    assert stats.idle == 1
+
+
+def test_instances_are_recycled_after_max_uses(clock):
+    pool = make_pool(clock, max_uses=2)
+    for _ in range(2):
+        with pool.lease(YtDlpSettings()) as ydl:
+            pass
+    assert ydl.closed
+    with pool.lease(YtDlpSettings()) as fresh:
+        pass
+    assert fresh is not ydl
+    assert pool.stats().recycled == 1
+
+
+def test_instances_are_recycled_after_max_age(clock):
+    pool = make_pool(clock, max_age=10)
+    with pool.lease(YtDlpSettings()) as ydl:
+        pass
+    clock.now = 11
+    pool.prune()
+    assert ydl.closed
+    assert pool.stats().idle == 0
+
+
+def test_close_closes_idle_instances(clock):
+    pool = make_pool(clock)
+    with pool.lease(YtDlpSettings()) as ydl:
+        pass
+    pool.close()
+    assert ydl.closed
+
+
+def test_invalidate_retires_idle_and_leased_instances(clock):
+    pool = make_pool(clock)
+    with pool.lease(YtDlpSettings()) as leased:
+        with pool.lease(YtDlpSettings()) as idle:
+            pass
+        pool.invalidate()
+        assert idle.closed
+        assert not leased.closed
+    assert leased.closed
+    with pool.lease(YtDlpSettings()) as fresh:
+        assert fresh is not leased
+    assert pool.stats().idle == 1
+
+
+def test_factory_failure_releases_slot(clock):
+    def broken_factory(params):
+        raise RuntimeError("boom")
+
+    pool = YoutubeDLPool(factory=broken_factory, clock=clock, max_size=1)
+    with pytest.raises(RuntimeError), pool.lease(YtDlpSettings()):
+        pass
+    assert pool.stats().leased == 0
+
+
+def test_concurrent_leases_never_share_an_instance(clock):
+    pool = make_pool(clock, max_size=4)
+    in_use: set[int] = set()
+    lock = threading.Lock()
+    errors: list[str] = []
+
+    def worker():
+        for _ in range(50):
+            with pool.lease(YtDlpSettings()) as ydl:
+                with lock:
+                    if id(ydl) in in_use:
+                        errors.append("shared")
+                    in_use.add(id(ydl))
+                with lock:
+                    in_use.discard(id(ydl))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert pool.stats().leased == 0
+
+
+def test_real_youtube_dl_is_reused():
+    pool = YoutubeDLPool()
+    settings = YtDlpSettings(quiet=True)
+    with pool.lease(settings) as first:
+        pass
+    with pool.lease(settings) as second:
+        pass
+    assert first is second
+    pool.close()
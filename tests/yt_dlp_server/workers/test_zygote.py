@@ -0,0 +1,64 @@
+import concurrent.futures
+import json
+import sys
+
+import pytest
+
+from yt_dlp_server.workers import zygote
+from yt_dlp_server.workers.zygote import WorkerStartup, measure_startup, savings_per_worker, start_zygote
+
+
+def loaded_modules() -> list[str]:
+    """Return which of the preloaded modules a worker has imported by the time it runs a task."""
+    return [name for name in zygote.PRELOAD_MODULES if name in sys.modules]
+
+
+def test_zygote_workers_start_with_yt_dlp_imported():
+    context = start_zygote()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        assert executor.submit(loaded_modules).result() == list(zygote.PRELOAD_MODULES)
+
+
+def settings_were_inherited() -> bool:
+    from yt_dlp_server import config
+
+    return config._settings is not None
+
+
+def test_zygote_workers_start_with_settings_parsed():
+    context = start_zygote()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        assert executor.submit(settings_were_inherited).result()
+
+
+def test_measure_startup_reports_each_worker():
+    results = measure_startup("zygote", workers=2)
+
+    assert [result.method for result in results] == ["zygote", "zygote"]
+    for result in results:
+        assert result.startup_seconds > 0
+        if sys.platform == "linux":
+            assert result.rss_bytes > 0
+            assert 0 < result.private_bytes <= result.rss_bytes
+
+
+def test_savings_per_worker():
+    spawn = [WorkerStartup("spawn", 0.5, 100, 80), WorkerStartup("spawn", 0.3, 100, 60)]
+    forked = [WorkerStartup("zygote", 0.1, 90, 10), WorkerStartup("zygote", 0.1, 90, 10)]
+
+    savings = savings_per_worker(spawn, forked)
+    assert savings == {"startup_seconds": pytest.approx(0.3), "rss_bytes": 10, "private_bytes": 60}
+    forked[0].rss_bytes = None
+    assert savings_per_worker(spawn, forked)["rss_bytes"] is None
+
+
+def test_main_prints_a_json_report(capsys, monkeypatch):
+    def fake_measure(method, workers):
+        return [WorkerStartup(method, 0.2 if method == "spawn" else 0.05, 100, 50 if method == "spawn" else 5)]
+
+    monkeypatch.setattr(zygote, "measure_startup", fake_measure)
+
+    assert zygote.main(["--workers", "1"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert set(report) == {"spawn", "zygote", "savings_per_worker"}
+    assert report["savings_per_worker"]["private_bytes"] == 45